@@ -0,0 +1,241 @@
+import math
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+from flask import g, jsonify, request
+
+from config.settings import ADMISSION_CONTROL, REQUEST_DEADLINES, RED_FLAG
+from ..core.deadline import Deadline, set_deadline, current_deadline, finish_deadline
+from ..core.redflag import detect_red_flags, safety_response
+
+logger = logging.getLogger(__name__)
+
+
+def endpoint_name(endpoint: Optional[str]) -> str:
+    """Strip the blueprint prefix from a Flask endpoint name"""
+    if not endpoint:
+        return "default"
+    return endpoint.rsplit(".", 1)[-1]
+
+
+def parse_request_start(value: Optional[str]) -> Optional[float]:
+    """Parse an X-Request-Start header set by the proxy into epoch seconds"""
+    if not value:
+        return None
+    try:
+        # nginx sends "t=<seconds>.<millis>", other proxies send ms or µs integers
+        stamp = float(value.strip().lstrip("t="))
+    except ValueError:
+        return None
+    if not math.isfinite(stamp):
+        return None
+    if stamp > 1e14:
+        return stamp / 1e6
+    if stamp > 1e11:
+        return stamp / 1e3
+    return stamp
+
+
+def queued_for(now: Optional[float] = None) -> float:
+    """Seconds the current request waited between the proxy and this worker"""
+    started = parse_request_start(request.headers.get("X-Request-Start"))
+    if started is None:
+        return 0.0
+    return max(0.0, (now or time.time()) - started)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, endpoint_max_in_flight: Dict[str, int] = None,
+                 max_queue_time: float = 5.0, ewma_alpha: float = 0.2, reserved_priority: int = 0):
+        """Track in-flight requests per endpoint and shed load past the budgets"""
+        self.max_in_flight = max_in_flight
+        # Slots only the priority lane (red-flag requests) may use
+        self.reserved_priority = min(reserved_priority, max_in_flight)
+        self.endpoint_max_in_flight = endpoint_max_in_flight or {}
+        self.max_queue_time = max_queue_time
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._in_flight_total = 0
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def _endpoint(self, name: str) -> Dict[str, Any]:
+        stats = self._endpoints.get(name)
+        if stats is None:
+            stats = {
+                "in_flight": 0,
+                "accepted": 0,
+                "shed_concurrency": 0,
+                "shed_queue_time": 0,
+                "priority_accepted": 0,
+                "priority_shed": 0,
+                "service_time_ewma": 0.0,
+            }
+            self._endpoints[name] = stats
+        return stats
+
+    def _retry_after(self, stats: Dict[str, Any]) -> int:
+        """Estimate when a slot frees up from the recent service time"""
+        backlog = stats["service_time_ewma"] * max(1, self._in_flight_total) / max(1, self.max_in_flight)
+        return max(1, int(math.ceil(backlog)))
+
+    def try_acquire(self, name: str, waited: float = 0.0, priority: bool = False) -> Tuple[bool, int]:
+        """Admit a request or return (False, retry_after_seconds)"""
+        with self._lock:
+            stats = self._endpoint(name)
+            if priority:
+                # Urgent requests skip the queue-time and per-endpoint budgets
+                # and may use the reserved slots
+                if self._in_flight_total >= self.max_in_flight:
+                    stats["priority_shed"] += 1
+                    return False, self._retry_after(stats)
+                stats["priority_accepted"] += 1
+            else:
+                if waited > self.max_queue_time:
+                    stats["shed_queue_time"] += 1
+                    return False, self._retry_after(stats)
+                limit = self.endpoint_max_in_flight.get(name, self.max_in_flight)
+                if (self._in_flight_total >= self.max_in_flight - self.reserved_priority
+                        or stats["in_flight"] >= limit):
+                    stats["shed_concurrency"] += 1
+                    return False, self._retry_after(stats)
+            stats["in_flight"] += 1
+            stats["accepted"] += 1
+            self._in_flight_total += 1
+            return True, 0
+
+    def release(self, name: str, service_time: float) -> None:
+        """Release a slot and fold the service time into the endpoint average"""
+        with self._lock:
+            stats = self._endpoint(name)
+            stats["in_flight"] = max(0, stats["in_flight"] - 1)
+            self._in_flight_total = max(0, self._in_flight_total - 1)
+            if stats["service_time_ewma"] == 0.0:
+                stats["service_time_ewma"] = service_time
+            else:
+                stats["service_time_ewma"] += self.ewma_alpha * (service_time - stats["service_time_ewma"])
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the admission counters"""
+        with self._lock:
+            return {
+                "in_flight": self._in_flight_total,
+                "max_in_flight": self.max_in_flight,
+                "reserved_priority": self.reserved_priority,
+                "max_queue_time": self.max_queue_time,
+                "endpoints": {name: dict(stats) for name, stats in self._endpoints.items()},
+            }
+
+
+# Global admission controller instance
+_controller = None
+
+
+def initialize_admission(config: Dict[str, Any] = None) -> AdmissionController:
+    """Initialize the global admission controller"""
+    global _controller
+    if _controller is None or config is not None:
+        config = config or ADMISSION_CONTROL
+        _controller = AdmissionController(
+            max_in_flight=config["max_in_flight"],
+            endpoint_max_in_flight=config.get("endpoint_max_in_flight"),
+            max_queue_time=config["max_queue_time"],
+            ewma_alpha=config.get("ewma_alpha", 0.2),
+            reserved_priority=config.get("reserved_priority", 0),
+        )
+    return _controller
+
+
+def admission_stats() -> Dict[str, Any]:
+    """Admission counters for the metrics endpoint"""
+    return initialize_admission().stats()
+
+
+def request_text() -> Optional[str]:
+    """The "text" field of a JSON request body, if any"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        return data.get("text")
+    return None
+
+
+def urgent_response(name: str, red_flags, degraded: bool = False):
+    """Immediate safety answer shaped like the endpoint's normal response"""
+    urgent = safety_response(red_flags)
+    if name == "chat":
+        body = {"response": urgent["message"], "suggestions": [], "context": {}}
+    else:
+        body = {"predictions": [], "processed_text": None}
+    body["urgent"] = urgent
+    if degraded:
+        body["degraded"] = True
+    return jsonify(body)
+
+
+def admit_request():
+    """before_request hook: reject early with 503 once a budget is exceeded"""
+    name = endpoint_name(request.endpoint)
+    if name in ADMISSION_CONTROL["exempt_endpoints"]:
+        return None
+    # Cheap red-flag scan before any NLP work
+    scan = RED_FLAG["enabled"] and name in RED_FLAG["endpoints"]
+    red_flags = detect_red_flags(request_text()) if scan else []
+    g.red_flags = red_flags
+    if red_flags and RED_FLAG["short_circuit"]:
+        return urgent_response(name, red_flags)
+    if not ADMISSION_CONTROL["enabled"]:
+        return None
+    controller = initialize_admission()
+    # Anyone can type an emergency word, so only trusted clients' red flags skip the budgets
+    priority = bool(red_flags) and request.headers.get("X-API-Key", "") in ADMISSION_CONTROL["priority_api_keys"]
+    admitted, retry_after = controller.try_acquire(name, queued_for(), priority=priority)
+    if not admitted:
+        if red_flags:
+            # Even a saturated worker answers urgent messages with safety advice (no pipeline work)
+            return urgent_response(name, red_flags, degraded=True)
+        logger.warning(f"Shedding request to {name}, retry after {retry_after}s")
+        response = jsonify({"error": "Service overloaded, please retry later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(retry_after)
+        return response
+    g.admission_endpoint = name
+    g.admission_started = time.monotonic()
+    return None
+
+
+def release_request(exc=None):
+    """teardown_request hook: free the slot taken by admit_request"""
+    name = g.pop("admission_endpoint", None)
+    if name is None:
+        return
+    initialize_admission().release(name, time.monotonic() - g.pop("admission_started"))
+
+
+def start_deadline():
+    """before_request hook: derive the request deadline from headers or endpoint defaults"""
+    name = endpoint_name(request.endpoint)
+    if name in ADMISSION_CONTROL["exempt_endpoints"]:
+        return None
+    budget = REQUEST_DEADLINES.get(name, REQUEST_DEADLINES["default"])
+    header = request.headers.get("X-Request-Timeout")
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = None
+        # nan, inf and non-positive budgets are ignored; longer ones are clamped to the endpoint's limit
+        if requested is not None and math.isfinite(requested) and requested > 0:
+            budget = min(requested, max(budget, REQUEST_DEADLINES["max"]))
+        else:
+            logger.debug(f"Ignoring invalid X-Request-Timeout: {header}")
+    # The clock starts when the proxy accepted the request, not when a worker picked it up
+    arrived = parse_request_start(request.headers.get("X-Request-Start")) or time.time()
+    set_deadline(Deadline(name, arrived + budget))
+    return None
+
+
+def finish_request_deadline(exc=None):
+    """teardown_request hook: record completion and clear the deadline"""
+    finish_deadline(current_deadline())
+    set_deadline(None)
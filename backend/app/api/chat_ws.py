@@ -0,0 +1,207 @@
+import asyncio
+import json
+import math
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from config.settings import CHAT_WS, RATE_LIMIT, RATE_LIMIT_SETTINGS
+from ..core.chatbot import get_chatbot_response
+from ..core.predictor import new_prediction_state, predict_with_state
+from ..core.redflag import detect_red_flags, safety_response
+from ..utils.helpers import forwarded_client, rate_limit_key
+from .ratelimit import initialize_rate_limiter, parse_rate_limit
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSession:
+    def __init__(self, session_id: str = None, context: Dict[str, Any] = None):
+        """Conversation state kept server-side for the life of one connection"""
+        self.session_id = session_id or uuid.uuid4().hex
+        self.context = context or {}
+        self.turns = 0
+        self.created = time.time()
+        self.prediction_state = None
+        self.tokens = None
+        self.updated = 0.0
+
+    def take_turn(self, per_minute: float, now: float) -> float:
+        """Token bucket of the connection: 0 when the turn may run, else seconds until it may"""
+        rate = per_minute / 60.0
+        tokens = per_minute if self.tokens is None else min(per_minute, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if tokens < 1.0:
+            self.tokens = tokens
+            return (1.0 - tokens) / rate
+        self.tokens = tokens - 1.0
+        return 0.0
+
+    def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one chat turn; the client only sends the new text"""
+        if message.get("reset"):
+            self.context = {}
+            self.prediction_state = None
+        text = message.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return {"type": "error", "error": "No message provided"}
+
+        response = get_chatbot_response(text, context=self.context)
+        self.context = response.get("context", {})
+        self.turns += 1
+
+        reply = {
+            "type": "reply",
+            "turn": self.turns,
+            "response": response["response"],
+            "suggestions": response["suggestions"],
+            "medical_terms": self.context.get("medical_terms", [])
+        }
+        if message.get("predict"):
+            reply["predictions"] = self.predict(reply["medical_terms"])
+        red_flags = detect_red_flags(text)
+        if red_flags:
+            reply["urgent"] = safety_response(red_flags)
+        return reply
+
+    def predict(self, medical_terms):
+        """Re-predict after a turn by applying only the terms that changed"""
+        if not medical_terms:
+            return []
+        if self.prediction_state is None:
+            self.prediction_state = new_prediction_state()
+        return predict_with_state(self.prediction_state, medical_terms)
+
+
+def client_address(websocket) -> str:
+    """The connection's client address, as get_client_address() finds it for HTTP requests"""
+    request = getattr(websocket, "request", None)
+    headers = request.headers if request is not None else getattr(websocket, "request_headers", {})
+    peer = websocket.remote_address[0] if websocket.remote_address else None
+    return forwarded_client(headers.get("X-Forwarded-For", ""), peer, RATE_LIMIT_SETTINGS["trusted_proxies"])
+
+
+class ChatServer:
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 300.0, turns_per_minute: float = 30.0,
+                 workers: int = 4, max_pending: int = 64):
+        """Multiplexes chat sessions over one asyncio event loop.
+
+        Turns run on a pool of `workers` threads, since a turn with "predict"
+        (and the first model load) takes milliseconds to seconds and would
+        stall every other connection on the loop. Before a turn is queued it
+        must pass the connection's own turns_per_minute bucket, the shared
+        per-client "chat" rate limit of the HTTP API, and the max_pending cap
+        on turns waiting for the pool; otherwise the client gets an error
+        frame with retry_after.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.turns_per_minute = turns_per_minute
+        self.workers = workers
+        self.max_pending = max_pending
+        self.sessions: Dict[str, ChatSession] = {}
+        self.stats = {"connections": 0, "rejected": 0, "turns": 0, "limited": 0, "shed": 0}
+        # Turns are counted on pool threads, the rest on the event loop
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+
+    async def handler(self, websocket) -> None:
+        """Serve one connection until the client leaves or goes idle"""
+        if len(self.sessions) >= self.max_sessions:
+            self._count("rejected")
+            await websocket.close(1013, "Too many sessions")
+            return
+        session = ChatSession()
+        self.sessions[session.session_id] = session
+        self._count("connections")
+        client = client_address(websocket)
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="chat-ws")
+        try:
+            await websocket.send(json.dumps({"type": "session", "session_id": session.session_id}))
+            while True:
+                try:
+                    raw = await asyncio.wait_for(websocket.recv(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await websocket.close(1000, "Idle timeout")
+                    return
+                reply = self.admit(session, client)
+                if reply is None:
+                    self._pending += 1
+                    try:
+                        reply = await loop.run_in_executor(self._executor, self.handle_frame, session, raw)
+                    finally:
+                        self._pending -= 1
+                await websocket.send(json.dumps(reply, ensure_ascii=False))
+        except Exception as e:
+            # Normal disconnects surface as ConnectionClosed from recv/send
+            logger.debug(f"Chat session {session.session_id} ended: {str(e)}")
+        finally:
+            del self.sessions[session.session_id]
+
+    def admit(self, session: ChatSession, client: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """None when the turn may run, else the error frame to answer it with"""
+        now = time.time() if now is None else now
+        retry_after = session.take_turn(self.turns_per_minute, now)
+        if not retry_after and RATE_LIMIT_SETTINGS["enabled"]:
+            capacity, period = parse_rate_limit(RATE_LIMIT.get("chat", RATE_LIMIT["default"]))
+            state = initialize_rate_limiter().hit(rate_limit_key(client, "chat"), capacity, period, now)
+            retry_after = state["retry_after"]
+        if retry_after:
+            self._count("limited")
+            return {"type": "error", "error": "Rate limit exceeded", "retry_after": max(1, math.ceil(retry_after))}
+        if self._pending >= self.max_pending:
+            self._count("shed")
+            return {"type": "error", "error": "Service overloaded, please retry later", "retry_after": 1}
+        return None
+
+    def handle_frame(self, session: ChatSession, raw) -> Dict[str, Any]:
+        """Decode one frame and run the turn (on a pool thread when serving)"""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return {"type": "error", "error": "Invalid JSON"}
+        if not isinstance(message, dict):
+            return {"type": "error", "error": "No message provided"}
+        try:
+            reply = session.handle(message)
+        except Exception as e:
+            logger.error(f"Error in chat session {session.session_id}: {str(e)}")
+            return {"type": "error", "error": str(e)}
+        if reply["type"] == "reply":
+            self._count("turns")
+        return reply
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, active_sessions=len(self.sessions), pending=self._pending)
+
+
+async def serve(host: Optional[str] = None, port: Optional[int] = None,
+                server: Optional[ChatServer] = None, ready: Optional[asyncio.Future] = None) -> None:
+    """Run the WebSocket chat server until cancelled"""
+    try:
+        import websockets
+    except ImportError:
+        raise RuntimeError("The WebSocket chat server requires the 'websockets' package")
+
+    server = server or ChatServer(CHAT_WS["max_sessions"], CHAT_WS["idle_timeout"], CHAT_WS["turns_per_minute"],
+                                  CHAT_WS["workers"], CHAT_WS["max_pending"])
+    host = host or CHAT_WS["host"]
+    port = CHAT_WS["port"] if port is None else port
+    async with websockets.serve(server.handler, host, port, max_size=CHAT_WS["max_message_bytes"]) as ws_server:
+        bound_port = ws_server.sockets[0].getsockname()[1]
+        logger.info(f"WebSocket chat listening on {host}:{bound_port}")
+        if ready is not None:
+            ready.set_result(bound_port)
+        await asyncio.Future()
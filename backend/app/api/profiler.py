@@ -0,0 +1,22 @@
+from flask import g, request
+
+from ..core.profiler import initialize_profiler
+from .admission import endpoint_name
+
+
+def start_request_profile():
+    """before_request hook: start this worker's job thread, and cProfile the request if a job selects it"""
+    control = initialize_profiler()
+    if control is None or not control.requests.armed:
+        return None
+    profile = control.requests.start(endpoint_name(request.endpoint))
+    if profile is not None:
+        g.request_profile = profile
+    return None
+
+
+def finish_request_profile(exc=None):
+    """teardown_request hook: add the request's profile to the job's report"""
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        initialize_profiler().requests.finish(profile)
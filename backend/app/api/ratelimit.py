@@ -0,0 +1,171 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import logging
+from typing import Dict, Any, Tuple
+
+from flask import g, jsonify, request
+
+from config.settings import RATE_LIMIT, RATE_LIMIT_SETTINGS
+from ..utils.helpers import get_client_address, rate_limit_key
+from .admission import endpoint_name
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+_MAGIC = b"BCRL"
+_HEADER = struct.Struct("<4sII")  # magic, version, slot count
+_SLOT = struct.Struct("<Qdd")     # key hash, tokens, last update (epoch seconds)
+_PROBES = 8
+
+
+def parse_rate_limit(limit: str) -> Tuple[int, int]:
+    """Parse a limit such as '50/hour' into (requests, period_seconds)"""
+    try:
+        count, period = limit.split('/')
+        return int(count), PERIODS[period.strip().lower()]
+    except (ValueError, KeyError):
+        raise ValueError(f'Invalid rate limit: {limit}')
+
+
+def _hash_key(key: str) -> int:
+    """Stable 64-bit key hash, identical in every worker process"""
+    digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest or 1  # 0 marks an empty slot
+
+
+class SharedRateLimiter:
+    def __init__(self, path: str, slots: int = 65536):
+        """Token buckets kept in an mmap'd file shared by all workers on the host"""
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self) -> None:
+        """Map the bucket table, once per process (flock is per open file)"""
+        size = _HEADER.size + self.slots * _SLOT.size
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, _HEADER.size, 0)
+            if len(header) < _HEADER.size or _HEADER.unpack(header) != (_MAGIC, 1, self.slots):
+                logger.info(f"Creating rate limit table at {self.path} with {self.slots} slots")
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, 1, self.slots), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    def hit(self, key: str, capacity: int, period: float, now: float = None) -> Dict[str, Any]:
+        """Take one token from the key's bucket and report the bucket state"""
+        now = time.time() if now is None else now
+        rate = capacity / period
+        key_hash = _hash_key(key)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset, tokens = self._find_slot(key_hash, capacity, rate, now)
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                _SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return {
+            'allowed': allowed,
+            'limit': capacity,
+            'remaining': int(tokens),
+            'reset': now + (capacity - tokens) / rate,
+            'retry_after': 0 if allowed else (1.0 - tokens) / rate
+        }
+
+    def _find_slot(self, key_hash: int, capacity: int, rate: float, now: float) -> Tuple[int, float]:
+        """Return the slot offset for the key and its refilled token count"""
+        oldest_offset, oldest_time = None, None
+        for probe in range(_PROBES):
+            offset = _HEADER.size + ((key_hash + probe) % self.slots) * _SLOT.size
+            slot_hash, tokens, updated = _SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset, min(float(capacity), tokens + (now - updated) * rate)
+            if slot_hash == 0:
+                return offset, float(capacity)
+            if oldest_time is None or updated < oldest_time:
+                oldest_offset, oldest_time = offset, updated
+        # Probe window is full: evict the least recently used bucket
+        return oldest_offset, float(capacity)
+
+
+# Global rate limiter instance
+_limiter = None
+_counters: Dict[str, Dict[str, int]] = {}
+# Request threads of a gthread worker update the counters concurrently
+_counters_lock = threading.Lock()
+
+
+def initialize_rate_limiter(path: str = None, slots: int = None) -> SharedRateLimiter:
+    """Initialize the global shared rate limiter"""
+    global _limiter
+    if _limiter is None or path is not None:
+        _limiter = SharedRateLimiter(
+            path or RATE_LIMIT_SETTINGS['storage'],
+            slots or RATE_LIMIT_SETTINGS['slots']
+        )
+    return _limiter
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Allowed/limited counters of this worker for the metrics endpoint"""
+    with _counters_lock:
+        return {name: dict(counts) for name, counts in _counters.items()}
+
+
+def check_rate_limit():
+    """before_request hook: enforce RATE_LIMIT per endpoint and client"""
+    name = endpoint_name(request.endpoint)
+    if not RATE_LIMIT_SETTINGS['enabled'] or name in RATE_LIMIT_SETTINGS['exempt_endpoints']:
+        return None
+    capacity, period = parse_rate_limit(RATE_LIMIT.get(name, RATE_LIMIT['default']))
+    key = rate_limit_key(get_client_address(request, RATE_LIMIT_SETTINGS['trusted_proxies']), name)
+    state = initialize_rate_limiter().hit(key, capacity, period)
+    g.rate_limit = state
+
+    with _counters_lock:
+        counts = _counters.setdefault(name, {'allowed': 0, 'limited': 0})
+        counts['allowed' if state['allowed'] else 'limited'] += 1
+    if state['allowed']:
+        return None
+    logger.warning(f"Rate limit exceeded for {key}")
+    response = jsonify({"error": "Rate limit exceeded"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(math.ceil(state['retry_after']))))
+    return response
+
+
+def add_rate_limit_headers(response):
+    """after_request hook: expose the bucket state as X-RateLimit-* headers"""
+    state = g.get('rate_limit')
+    if state is not None:
+        response.headers['X-RateLimit-Limit'] = str(state['limit'])
+        response.headers['X-RateLimit-Remaining'] = str(state['remaining'])
+        response.headers['X-RateLimit-Reset'] = str(int(math.ceil(state['reset'])))
+    return response
@@ -1,21 +1,137 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, g, jsonify, request, stream_with_context
+import json
 import logging
+import os
+import re
 import traceback
-from ..core.predictor import predict_disease
+from config.settings import ADMIN_API_KEYS, CHAT_BATCH, CLINICIAN_API_KEYS, COALESCING, PROFILER, STREAMING
+from ..core.predictor import (
+    cascade_stats,
+    case_index_stats,
+    find_similar_cases,
+    has_model,
+    known_diagnoses,
+    model_stats,
+    predict_conversation,
+    predict_disease,
+    predict_disease_batch,
+    prediction_table_stats,
+    shadow_stats
+)
 from ..nlp.engine import process_symptoms
-from ..core.chatbot import get_chatbot_response
+from ..utils.helpers import validate_api_key
+from ..core.chatbot import get_chatbot_response, get_chatbot_responses
+from ..core.eventlog import event_log_stats, log_feedback, log_prediction
+from ..core.rollups import query_rollups, record_prediction, rollup_stats
+from ..core.outbreaks import check_outbreaks, current_outbreaks, outbreak_stats
+from ..core.drift import current_drift, drift_stats, observe_terms
+from ..core.tracing import span, tracing_stats
+from ..core.slowlog import slow_request_stats, slow_requests
+from ..core.profiler import MODES, profile_job, profiler_stats, profiler_workers, start_profile
+from ..core.deadline import DeadlineExceeded, abandon_deadline, check_deadline, current_deadline, deadline_stats
+from ..core.singleflight import SingleFlight
+from ..core.redflag import detect_red_flags, safety_response
+from .admission import (
+    admit_request,
+    release_request,
+    admission_stats,
+    start_deadline,
+    finish_request_deadline
+)
+from .ratelimit import check_rate_limit, add_rate_limit_headers, rate_limit_stats
+from .tracing import start_request_trace, add_trace_headers, finish_request_trace
+from .profiler import start_request_profile, finish_request_profile
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 api_bp = Blueprint("api", __name__)
+# The trace opens first and closes last (teardown hooks run in reverse order)
+api_bp.before_request(start_request_trace)
+api_bp.before_request(start_request_profile)
+api_bp.before_request(check_rate_limit)
+api_bp.before_request(admit_request)
+api_bp.before_request(start_deadline)
+api_bp.after_request(add_rate_limit_headers)
+api_bp.after_request(add_trace_headers)
+api_bp.teardown_request(finish_request_trace)
+api_bp.teardown_request(release_request)
+api_bp.teardown_request(finish_request_deadline)
+api_bp.teardown_request(finish_request_profile)
+
+PREDICTION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Concurrent identical prediction requests share one pipeline run
+_prediction_flight = SingleFlight(private_errors=(DeadlineExceeded,))
 
 @api_bp.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "message": "API is running"})
 
+@api_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Load-shedding and runtime counters for this worker"""
+    return jsonify({
+        "admission": admission_stats(),
+        "rate_limit": rate_limit_stats(),
+        "deadlines": deadline_stats(),
+        "coalescing": _prediction_flight.stats(),
+        "prediction_table": prediction_table_stats(),
+        "cascade": cascade_stats(),
+        "models": model_stats(),
+        "shadow": shadow_stats(),
+        "case_index": case_index_stats(),
+        "event_log": event_log_stats(),
+        "rollups": rollup_stats(),
+        "outbreaks": outbreak_stats(),
+        "drift": drift_stats(),
+        "tracing": tracing_stats(),
+        "slow_requests": slow_request_stats(),
+        "profiler": profiler_stats()
+    })
+
+def _coalesce_key(text):
+    """Normalize input the way NLPEngine.clean_text does, so equal keys give equal results"""
+    return " ".join(re.sub(r"[^a-z\s]", " ", text.lower()).split())
+
+def _run_prediction(text, model=None, explain=False):
+    """Run the NLP pipeline and the classifier for one symptom text"""
+    # Process the input text
+    with span("process_symptoms"):
+        processed_text = process_symptoms(text)
+    logger.debug(f"Processed text: {processed_text}")
+    
+    # Get predictions
+    with span("predict_disease", model=model or "default"):
+        predictions = predict_disease(processed_text, model, explain)
+    logger.debug(f"Predictions: {predictions}")
+    return processed_text, predictions
+
+def _predict_coalesced(text, model=None, explain=False):
+    """Run the prediction, sharing the work with identical in-flight requests"""
+    if not COALESCING["enabled"]:
+        return _run_prediction(text, model, explain)
+    deadline = current_deadline()
+    timeout = max(0.0, deadline.remaining()) if deadline else None
+    try:
+        # A request that joined another one's run gets this span without stage children
+        with span("predict.coalesced"):
+            processed_text, predictions = _prediction_flight.do(
+                (model, explain, _coalesce_key(text)),
+                lambda: _run_prediction(text, model, explain),
+                timeout=timeout
+            )
+    except TimeoutError:
+        # The wait was bounded by the deadline, so a timeout means the request ran out of time
+        raise abandon_deadline("predict.coalesced")
+    # Copies, so no request can mutate what another one received
+    return dict(processed_text, original_text=text), [dict(p) for p in predictions]
+
+def _known_model(model):
+    return model is None or (isinstance(model, str) and has_model(model))
+
 @api_bp.route("/predict", methods=["POST"])
 def predict():
     """
@@ -31,12 +147,27 @@ def predict():
             text:
               type: string
               description: Description of symptoms in Bahasa Indonesia
+            model:
+              type: string
+              description: Named model from MODEL_REGISTRY (default model when omitted)
+            explain:
+              type: boolean
+              description: Fill each prediction's symptoms with the input terms that drove it
+            similar_cases:
+              type: integer
+              description: Also return this many similar past cases (true for the default count)
+            region:
+              type: string
+              description: Region the patient is in, for the /rollups counts (one of ROLLUP_REGIONS, else counted as unknown)
     responses:
       200:
         description: Prediction results
         schema:
           type: object
           properties:
+            prediction_id:
+              type: string
+              description: Identifier to quote when posting the confirmed diagnosis to /feedback
             predictions:
               type: array
               items:
@@ -50,31 +181,568 @@ def predict():
                     type: array
                     items:
                       type: string
+                  stage:
+                    type: string
+                    description: What scored this prediction (table, first_stage or full_model)
+                  symptom_weights:
+                    type: array
+                    description: Contribution of each symptom to the score (with explain)
+                    items:
+                      type: number
     """
     try:
         data = request.get_json()
         if not data or "text" not in data:
             return jsonify({"error": "No symptoms provided"}), 400
 
+        model = data.get("model")
+        if not _known_model(model):
+            return jsonify({"error": f"Unknown model: {model}"}), 404
+        region = data.get("region")
+        if region is not None and (not isinstance(region, str) or len(region) > 64):
+            return jsonify({"error": "region must be a string of at most 64 characters"}), 400
+
         logger.debug(f"Received symptoms: {data['text']}")
+        processed_text, predictions = _predict_coalesced(data["text"], model, bool(data.get("explain")))
+        observe_terms(processed_text["medical_terms"])
+        region = region.strip() if region else None
+        record_prediction(predictions, region)
+        check_outbreaks()
         
-        # Process the input text
-        processed_text = process_symptoms(data["text"])
-        logger.debug(f"Processed text: {processed_text}")
-        
-        # Get predictions
-        predictions = predict_disease(processed_text)
-        logger.debug(f"Predictions: {predictions}")
-        
-        return jsonify({
+        body = {
+            "prediction_id": log_prediction(data["text"], processed_text["medical_terms"], predictions, model),
             "predictions": predictions,
             "processed_text": processed_text
-        })
+        }
+        similar = data.get("similar_cases")
+        if similar:
+            k = similar if isinstance(similar, int) and not isinstance(similar, bool) else None
+            body["similar_cases"] = find_similar_cases(processed_text["medical_terms"], k, model)
+        if g.get("red_flags"):
+            body["urgent"] = safety_response(g.red_flags)
+        with span("json.encode"):
+            return jsonify(body)
+    except DeadlineExceeded as e:
+        return jsonify({"error": "Request deadline exceeded", "stage": e.stage}), 504
     except Exception as e:
         logger.error(f"Error in predict endpoint: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e), "details": traceback.format_exc()}), 500
 
+@api_bp.route("/similar", methods=["POST"])
+def similar():
+    """
+    Most similar past labeled cases for a symptom description
+    ---
+    parameters:
+      - name: query
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            text:
+              type: string
+              description: Description of symptoms in Bahasa Indonesia
+            k:
+              type: integer
+              description: Number of cases (default CASE_INDEX_TOP_K)
+            model:
+              type: string
+              description: Named model from MODEL_REGISTRY (default model when omitted)
+    responses:
+      200:
+        description: >
+          {"cases": [{"case_id", "disease", "symptoms", "similarity"}], "partial",
+          "medical_terms"}; partial is true when the search budget ran out
+      503:
+        description: No case index is available for the model
+    """
+    try:
+        data = request.get_json()
+        if not data or "text" not in data:
+            return jsonify({"error": "No symptoms provided"}), 400
+        model = data.get("model")
+        if not _known_model(model):
+            return jsonify({"error": f"Unknown model: {model}"}), 404
+        k = data.get("k")
+        if k is not None and (not isinstance(k, int) or isinstance(k, bool) or k < 1):
+            return jsonify({"error": "k must be a positive integer"}), 400
+
+        processed_text = process_symptoms(data["text"])
+        result = find_similar_cases(processed_text["medical_terms"], k, model)
+        if result is None:
+            return jsonify({"error": "Similar case index not available"}), 503
+        return jsonify(dict(result, medical_terms=processed_text["medical_terms"]))
+    except DeadlineExceeded as e:
+        return jsonify({"error": "Request deadline exceeded", "stage": e.stage}), 504
+    except Exception as e:
+        logger.error(f"Error in similar endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({"error": str(e), "details": traceback.format_exc()}), 500
+
+@api_bp.route("/feedback", methods=["POST"])
+def feedback():
+    """
+    Attach the clinician-confirmed diagnosis to an earlier prediction
+    ---
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: One of CLINICIAN_API_KEYS or ADMIN_API_KEYS
+      - name: feedback
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            prediction_id:
+              type: string
+              description: prediction_id returned by /predict
+            diagnosis:
+              type: string
+              description: Confirmed disease, one of the default model's classes
+            note:
+              type: string
+    responses:
+      202:
+        description: Feedback queued for the event log
+      400:
+        description: Invalid feedback or a diagnosis the model does not know
+      401:
+        description: Missing or invalid API key
+      503:
+        description: The event log is disabled or its queue is full
+    """
+    if not validate_api_key(request.headers.get("X-API-Key", ""), CLINICIAN_API_KEYS + ADMIN_API_KEYS):
+        return jsonify({"error": "Invalid API key"}), 401
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "No feedback provided"}), 400
+    prediction_id = data.get("prediction_id")
+    diagnosis = data.get("diagnosis")
+    note = data.get("note")
+    if not isinstance(prediction_id, str) or not PREDICTION_ID.match(prediction_id):
+        return jsonify({"error": "prediction_id must be the id returned by /predict"}), 400
+    if not isinstance(diagnosis, str) or not diagnosis.strip():
+        return jsonify({"error": "diagnosis must be a non-empty string"}), 400
+    if note is not None and not isinstance(note, str):
+        return jsonify({"error": "note must be a string"}), 400
+    if diagnosis.strip() not in known_diagnoses():
+        return jsonify({"error": f"Unknown diagnosis: {diagnosis.strip()}"}), 400
+
+    if not log_feedback(prediction_id, diagnosis.strip(), note):
+        return jsonify({"error": "Feedback log unavailable"}), 503
+    return jsonify({"status": "accepted", "prediction_id": prediction_id}), 202
+
+@api_bp.route("/rollups", methods=["GET"])
+def rollups():
+    """
+    Prediction counts per disease and region over recent time windows
+    ---
+    parameters:
+      - name: window
+        in: query
+        description: Window length in seconds, a multiple of ROLLUP_BUCKET_SECONDS (default 3600)
+      - name: windows
+        in: query
+        description: Number of tumbling windows to return, newest last (default 24)
+      - name: disease
+        in: query
+        required: false
+      - name: region
+        in: query
+        required: false
+    responses:
+      200:
+        description: >
+          {"windows": [{"start", "total", "diseases", "regions"}], "sliding": the window
+          ending now, "confidence": {disease: {"mean", "histogram"}}, "workers"}
+      503:
+        description: Rollups are disabled
+    """
+    try:
+        window = int(request.args.get("window", 3600))
+        windows = int(request.args.get("windows", 24))
+        result = query_rollups(window, windows, request.args.get("disease"), request.args.get("region"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Rollups disabled"}), 503
+    return jsonify(result)
+
+@api_bp.route("/outbreaks", methods=["GET"])
+def outbreaks():
+    """
+    Outbreak anomaly scores per disease and region, and recent alerts
+    ---
+    parameters:
+      - name: disease
+        in: query
+        required: false
+      - name: region
+        in: query
+        required: false
+    responses:
+      200:
+        description: >
+          {"series": [{"disease", "region", "expected", "current_count", "current_z",
+          "last_z", "cusum", "warmed_up"}] highest CUSUM first, "alerts": [{"disease",
+          "region", "bucket_start", "observed", "expected", "z", "cusum"}], "workers"}
+      503:
+        description: Outbreak detection is disabled
+    """
+    result = current_outbreaks(request.args.get("disease"), request.args.get("region"))
+    if result is None:
+        return jsonify({"error": "Outbreak detection disabled"}), 503
+    return jsonify(result)
+
+@api_bp.route("/drift", methods=["GET"])
+def drift():
+    """
+    Live input terms compared with the training data
+    ---
+    parameters:
+      - name: top
+        in: query
+        description: Number of unknown tokens and shifted tokens to list (default 20)
+    responses:
+      200:
+        description: >
+          {"requests", "tokens", "unknown_rate", "no_known_tokens_rate", "top_unknown":
+          [{"token", "count", "error"}], "drift": {"psi", "js_divergence", "top_shifts":
+          [{"token", "training_share", "live_share"}]}, "workers"}
+      503:
+        description: Drift monitoring is disabled
+    """
+    try:
+        top = int(request.args.get("top", 20))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+    if not 1 <= top <= 1000:
+        return jsonify({"error": "top must be between 1 and 1000"}), 400
+    result = current_drift(top)
+    if result is None:
+        return jsonify({"error": "Drift monitoring disabled"}), 503
+    return jsonify(result)
+
+@api_bp.route("/admin/slow-requests", methods=["GET"])
+def slow_request_dump():
+    """
+    Slowest recent requests of all workers, with stage timings
+    ---
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: One of ADMIN_API_KEYS
+      - name: endpoint
+        in: query
+        type: string
+        description: Only this endpoint (e.g. predict, chat)
+      - name: limit
+        in: query
+        type: integer
+        description: At most this many requests, slowest first
+    responses:
+      200:
+        description: Captured requests, slowest first
+      400:
+        description: Invalid limit
+      401:
+        description: Missing or invalid API key
+      503:
+        description: Slow-request capture disabled
+    """
+    if not validate_api_key(request.headers.get("X-API-Key", ""), ADMIN_API_KEYS):
+        return jsonify({"error": "Invalid API key"}), 401
+    limit = request.args.get("limit")
+    try:
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    result = slow_requests(request.args.get("endpoint"), limit)
+    if result is None:
+        return jsonify({"error": "Slow-request capture disabled"}), 503
+    return jsonify(result)
+
+@api_bp.route("/admin/profile", methods=["GET"])
+def profile_workers():
+    """
+    Workers that can be profiled
+    ---
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: One of ADMIN_API_KEYS
+    responses:
+      200:
+        description: Pids of live workers and of the one answering
+      401:
+        description: Missing or invalid API key
+      503:
+        description: Profiling disabled
+    """
+    if not validate_api_key(request.headers.get("X-API-Key", ""), ADMIN_API_KEYS):
+        return jsonify({"error": "Invalid API key"}), 401
+    workers = profiler_workers()
+    if workers is None:
+        return jsonify({"error": "Profiling disabled"}), 503
+    return jsonify({"workers": workers, "pid": os.getpid()})
+
+def _positive_number(data, name, default, maximum, kind=float):
+    """A numeric field of a JSON body in (0, maximum], or raise ValueError"""
+    value = data.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and not isinstance(value, int)):
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    if not 0 < value <= maximum:
+        raise ValueError(f"{name} must be between 0 and {maximum}")
+    return kind(value)
+
+@api_bp.route("/admin/profile", methods=["POST"])
+def profile_start():
+    """
+    Profile a live worker
+    ---
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: One of ADMIN_API_KEYS
+      - name: job
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            mode:
+              type: string
+              enum: [sample, requests]
+              description: Sample every thread's stack for `seconds` (collapsed stacks), or cProfile the next `requests` requests (pstats)
+            pid:
+              type: integer
+              description: Worker to profile (default the one answering; see GET /admin/profile)
+            seconds:
+              type: number
+              description: Sampling time, or how long a request profile waits for its requests
+            interval_ms:
+              type: number
+              description: Sampling period
+            requests:
+              type: integer
+            endpoints:
+              type: array
+              items:
+                type: string
+              description: Endpoints whose requests are profiled (default predict and chat)
+    responses:
+      202:
+        description: Job queued; poll GET /admin/profile/<id>
+      400:
+        description: Invalid job
+      401:
+        description: Missing or invalid API key
+      404:
+        description: No live worker with that pid
+      409:
+        description: The worker already has a job
+      503:
+        description: Profiling disabled
+    """
+    if not validate_api_key(request.headers.get("X-API-Key", ""), ADMIN_API_KEYS):
+        return jsonify({"error": "Invalid API key"}), 401
+    data = request.get_json(silent=True) or {}
+    mode = data.get("mode")
+    if mode not in MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(MODES)}"}), 400
+    pid = data.get("pid", os.getpid())
+    endpoints = data.get("endpoints", PROFILER["endpoints"])
+    try:
+        if isinstance(pid, bool) or not isinstance(pid, int):
+            raise ValueError("pid must be an integer")
+        seconds = _positive_number(data, "seconds", 10 if mode == "sample" else 60, PROFILER["max_seconds"])
+        interval_ms = _positive_number(data, "interval_ms", PROFILER["interval_ms"], 1000)
+        requests = _positive_number(data, "requests", 20, PROFILER["max_requests"], int) if mode == "requests" else 0
+        if not isinstance(endpoints, list) or not endpoints or not set(endpoints) <= set(PROFILER["endpoints"]):
+            raise ValueError(f"endpoints must be a list of {', '.join(PROFILER['endpoints'])}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        job = start_profile(pid, mode, seconds, interval_ms, requests, endpoints)
+    except LookupError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except FileExistsError:
+        return jsonify({"error": f"Worker {pid} already has a profiling job"}), 409
+    if job is None:
+        return jsonify({"error": "Profiling disabled"}), 503
+    return jsonify(job), 202
+
+@api_bp.route("/admin/profile/<job_id>", methods=["GET"])
+def profile_result(job_id):
+    """
+    Result of a profiling job
+    ---
+    parameters:
+      - name: X-API-Key
+        in: header
+        type: string
+        required: true
+        description: One of ADMIN_API_KEYS
+      - name: raw
+        in: query
+        type: boolean
+        description: Return only the report as text/plain (e.g. to pipe collapsed stacks into flamegraph.pl)
+    responses:
+      200:
+        description: The report, with collapsed stacks or pstats text in "output"
+      202:
+        description: Still running
+      401:
+        description: Missing or invalid API key
+      404:
+        description: Unknown job
+      503:
+        description: Profiling disabled
+    """
+    if not validate_api_key(request.headers.get("X-API-Key", ""), ADMIN_API_KEYS):
+        return jsonify({"error": "Invalid API key"}), 401
+    if not re.match(r"^[0-9a-f]{16}$", job_id):
+        return jsonify({"error": "Unknown profiling job"}), 404
+    if profiler_workers() is None:
+        return jsonify({"error": "Profiling disabled"}), 503
+    result = profile_job(job_id)
+    if result is None:
+        return jsonify({"error": "Unknown profiling job"}), 404
+    if result["status"] != "done":
+        return jsonify(result), 202
+    if request.args.get("raw", "").lower() in ("1", "true"):
+        return Response(result["output"], mimetype="text/plain")
+    return jsonify(result)
+
+def _iter_stream_items(stream, raw_text):
+    """Yield (id, text, error) per line of an NDJSON (or plain text) request body"""
+    max_line = STREAMING["max_line_bytes"]
+    line_number = 0
+    while True:
+        line = stream.readline(max_line + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line and not line.endswith(b"\n"):
+            # Skip the rest of an oversized line without buffering it
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_line)
+            yield line_number, None, "Line too long"
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if raw_text:
+                yield line_number, line.decode("utf-8"), None
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                yield line_number, item, None
+            elif isinstance(item, dict) and isinstance(item.get("text"), str):
+                yield item.get("id", line_number), item["text"], None
+            else:
+                yield line_number, None, "No symptoms provided"
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+
+def _stream_predictions(items, model=None, explain=False):
+    """Score items in bounded chunks and yield one NDJSON line per result"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= STREAMING["chunk_size"]:
+            yield from _predict_chunk(chunk, model, explain)
+            chunk = []
+    if chunk:
+        yield from _predict_chunk(chunk, model, explain)
+
+def _predict_chunk(chunk, model=None, explain=False):
+    results = {}
+    processed = []
+    for position, (item_id, text, error) in enumerate(chunk):
+        if error is not None:
+            results[position] = {"id": item_id, "error": error}
+            continue
+        try:
+            processed.append((position, process_symptoms(text)))
+            observe_terms(processed[-1][1]["medical_terms"])
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            results[position] = {"id": item_id, "error": str(e)}
+    if processed:
+        batch = predict_disease_batch([p for _, p in processed], model, explain)
+        for (position, processed_text), predictions in zip(processed, batch):
+            results[position] = {
+                "id": chunk[position][0],
+                "predictions": predictions,
+                "medical_terms": processed_text["medical_terms"]
+            }
+    for position in range(len(chunk)):
+        yield json.dumps(results[position], ensure_ascii=False) + "\n"
+
+@api_bp.route("/predict/stream", methods=["POST"])
+def predict_stream():
+    """
+    Predict diseases for a large batch of symptom descriptions
+    ---
+    consumes:
+      - application/x-ndjson
+      - text/plain
+    parameters:
+      - name: items
+        in: body
+        required: true
+        description: >
+          One item per line, either {"id": ..., "text": ...} objects or JSON
+          strings (NDJSON), or raw text lines with Content-Type text/plain
+      - name: model
+        in: query
+        required: false
+        description: Named model from MODEL_REGISTRY (default model when omitted)
+      - name: explain
+        in: query
+        required: false
+        description: Set to true to fill each prediction's contributing symptoms
+    responses:
+      200:
+        description: >
+          NDJSON stream with one {"id", "predictions", "medical_terms"} or
+          {"id", "error"} line per input line, in input order
+    """
+    model = request.args.get("model")
+    explain = request.args.get("explain", "").lower() in ("1", "true", "yes")
+    if not _known_model(model):
+        return jsonify({"error": f"Unknown model: {model}"}), 404
+    raw_text = request.mimetype == "text/plain"
+    items = _iter_stream_items(request.stream, raw_text)
+
+    def generate():
+        try:
+            yield from _stream_predictions(items, model, explain)
+        except DeadlineExceeded as e:
+            yield json.dumps({"error": "Request deadline exceeded", "stage": e.stage}) + "\n"
+        except Exception as e:
+            logger.error(f"Error in predict stream: {str(e)}")
+            logger.error(traceback.format_exc())
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @api_bp.route("/chat", methods=["POST"])
 def chat():
     """
@@ -92,7 +760,10 @@ def chat():
               description: User message
             context:
               type: object
-              description: Chat context/history
+              description: Chat context/history (conversation_id keeps incremental prediction state)
+            predict:
+              type: boolean
+              description: Re-predict diseases from the conversation's medical terms
     responses:
       200:
         description: Chatbot response
@@ -111,12 +782,77 @@ def chat():
         if not data or "text" not in data:
             return jsonify({"error": "No message provided"}), 400
 
-        response = get_chatbot_response(
-            data["text"],
-            context=data.get("context", {})
-        )
-        return jsonify(response)
+        check_deadline("chat")
+        context = data.get("context", {})
+        with span("chatbot.respond"):
+            response = get_chatbot_response(
+                data["text"],
+                context=context
+            )
+        if data.get("predict"):
+            conversation_id = context.get("conversation_id")
+            terms = response["context"].get("medical_terms", [])
+            with span("predict_conversation"):
+                response["predictions"] = predict_conversation(conversation_id, terms) if terms else []
+            if conversation_id:
+                response["context"]["conversation_id"] = conversation_id
+        if g.get("red_flags"):
+            response = dict(response, urgent=safety_response(g.red_flags))
+        with span("json.encode"):
+            return jsonify(response)
+    except DeadlineExceeded as e:
+        return jsonify({"error": "Request deadline exceeded", "stage": e.stage}), 504
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         logger.error(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """
+    Answer many chat messages at once (SMS/WhatsApp gateway ingestion)
+    ---
+    parameters:
+      - name: batch
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                    description: Conversation id
+                  text:
+                    type: string
+                  context:
+                    type: object
+    responses:
+      200:
+        description: One result per item in input order, either a chat response or an error
+    """
+    try:
+        data = request.get_json()
+        items = data.get("items") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No messages provided"}), 400
+        if len(items) > CHAT_BATCH["max_items"]:
+            return jsonify({"error": f"Too many messages (max {CHAT_BATCH['max_items']})"}), 413
+
+        check_deadline("chat_batch")
+        results = get_chatbot_responses(items)
+        for item, result in zip(items, results):
+            red_flags = detect_red_flags(item.get("text")) if isinstance(item, dict) else []
+            if red_flags:
+                result["urgent"] = safety_response(red_flags)
+        return jsonify({"results": results})
+    except DeadlineExceeded as e:
+        return jsonify({"error": "Request deadline exceeded", "stage": e.stage}), 504
+    except Exception as e:
+        logger.error(f"Error in chat batch endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
@@ -0,0 +1,58 @@
+import logging
+
+from flask import g, request
+
+from config.settings import TRACING
+from ..core.tracing import end_trace, export_trace, start_trace
+from ..core.slowlog import capture_slow_request
+from .admission import endpoint_name, request_text
+
+logger = logging.getLogger(__name__)
+
+
+def start_request_trace():
+    """before_request hook: open the request's root span, continuing the caller's trace headers"""
+    if not TRACING["enabled"]:
+        return None
+    g.trace_root = start_trace(
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+        traceparent=request.headers.get("traceparent"),
+        request_id=request.headers.get("X-Request-ID"),
+        sample_rate=TRACING["sample_rate"],
+        max_spans=TRACING["max_spans"],
+        attributes={"http.method": request.method, "http.route": endpoint_name(request.endpoint)}
+    )
+    return None
+
+
+def add_trace_headers(response):
+    """after_request hook: return the request id and trace context to the caller"""
+    root = g.get("trace_root")
+    if root is not None:
+        root.set("http.status_code", response.status_code)
+        flags = "01" if root.trace.sampled else "00"
+        response.headers["X-Request-ID"] = root.trace.request_id
+        response.headers["traceresponse"] = f"00-{root.trace.trace_id}-{root.span_id:016x}-{flags}"
+    return response
+
+
+def finish_request_trace(exc=None):
+    """teardown_request hook: close the spans and hand the trace to the exporter"""
+    root = g.pop("trace_root", None)
+    if root is None:
+        return
+    if exc is not None:
+        root.error = f"{type(exc).__name__}: {exc}"
+    trace = end_trace(root)
+    error = exc is not None or root.attributes.get("http.status_code", 500) >= 500
+    try:
+        export_trace(trace, error)
+        capture_slow_request(trace, endpoint_name(request.endpoint), root.attributes.get("http.status_code"),
+                             _text, request.content_length)
+    except Exception as e:
+        logger.error(f"Trace export or slow-request capture failed: {e}")
+
+
+def _text():
+    text = request_text()
+    return text if isinstance(text, str) else None
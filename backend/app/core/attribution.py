@@ -0,0 +1,107 @@
+import math
+import logging
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .incremental import idf_weights
+
+logger = logging.getLogger(__name__)
+
+
+def class_weights(classifier) -> np.ndarray:
+    """Per-class coefficient rows; binary models store one row for the positive class"""
+    coef = np.asarray(classifier.coef_)
+    return np.vstack([-coef, coef]) if coef.shape[0] == 1 and len(classifier.classes_) == 2 else coef
+
+
+def feature_contributions(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                          coef: np.ndarray, top: np.ndarray) -> np.ndarray:
+    """x_j * w_cj for every non-zero feature of every row and each of the row's top classes.
+
+    indptr/indices/data are the CSR arrays of the TF-IDF rows and top (rows x k)
+    holds class indices; the result is aligned with data: (nnz, k). One
+    fancy-indexed gather covers the whole batch, so cost grows with the
+    non-zeros, not with the vocabulary.
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return data[:, np.newaxis] * coef[top[rows], indices[:, np.newaxis]]
+
+
+def tfidf_rows(vectorizer, batch: Sequence[List[str]]):
+    """CSR arrays (indptr, indices, data) of the joined terms' TF-IDF rows, plus each term's features.
+
+    Equivalent to vectorizer.transform for the unigram word analyzers that
+    linear_components accepts, but tokenizes each term once and skips
+    scikit-learn's and scipy's per-call validation, which dominate for short inputs.
+    """
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    idf = idf_weights(vectorizer)
+    sublinear = getattr(vectorizer, "sublinear_tf", False)
+    binary = getattr(vectorizer, "binary", False)
+    normalize = getattr(vectorizer, "norm", "l2") == "l2"
+
+    indptr, indices, data, term_features = [0], [], [], []
+    for terms in batch:
+        counts: Dict[int, int] = {}
+        features_per_term = []
+        for term in terms:
+            features = [vocabulary[token] for token in analyzer(term) if token in vocabulary]
+            for feature in features:
+                counts[feature] = counts.get(feature, 0) + 1
+            features_per_term.append(set(features))
+        weights = []
+        for feature, count in counts.items():
+            tf = 1.0 if binary else (1.0 + math.log(count) if sublinear else float(count))
+            weights.append(tf * idf[feature] if idf is not None else tf)
+        if normalize and weights:
+            norm = math.sqrt(sum(w * w for w in weights))
+            weights = [w / norm for w in weights]
+        indices.extend(counts)
+        data.extend(weights)
+        indptr.append(len(indices))
+        term_features.append(features_per_term)
+    return (np.asarray(indptr, dtype=np.intp), np.asarray(indices, dtype=np.intp),
+            np.asarray(data, dtype=np.float64), term_features)
+
+
+def attribute_terms(vectorizer, classifier, batch: Sequence[List[str]],
+                    predictions: Sequence[List[Dict]], limit: int = 5) -> None:
+    """Fill "symptoms" of each prediction with the input terms that raised its score most.
+
+    A term's weight is the summed contribution of its tokens (tokens shared by
+    several terms are split between them); only positive weights are kept.
+    """
+    if not batch:
+        return
+    class_index = {str(c): i for i, c in enumerate(classifier.classes_)}
+    k = max((len(p) for p in predictions), default=0)
+    if k == 0:
+        return
+    top = np.zeros((len(batch), k), dtype=np.intp)
+    for row, row_predictions in enumerate(predictions):
+        for column, prediction in enumerate(row_predictions):
+            top[row, column] = class_index[str(prediction["disease"])]
+
+    indptr, indices, data, term_features = tfidf_rows(vectorizer, batch)
+    contributions = feature_contributions(indptr, indices, data, class_weights(classifier), top)
+
+    for row, (terms, row_predictions) in enumerate(zip(batch, predictions)):
+        start, end = indptr[row], indptr[row + 1]
+        if not row_predictions or start == end:
+            continue
+        position = {int(feature): i for i, feature in enumerate(indices[start:end])}
+        # Term x row-feature incidence, each feature's contribution split across the terms using it
+        incidence = np.zeros((len(terms), end - start))
+        for t, features in enumerate(term_features[row]):
+            for feature in features:
+                incidence[t, position[feature]] = 1.0
+        shared = incidence.sum(axis=0)
+        incidence /= np.where(shared > 0, shared, 1.0)
+        scores = incidence @ contributions[start:end]  # terms x k
+        ranking = np.argsort(-scores, axis=0, kind="stable")[:limit]
+        for column, prediction in enumerate(row_predictions):
+            order = [t for t in ranking[:, column].tolist() if scores[t, column] > 0]
+            prediction["symptoms"] = [terms[t] for t in order]
+            prediction["symptom_weights"] = [float(scores[t, column]) for t in order]
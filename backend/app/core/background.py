@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundBatcher:
+    def __init__(self, process: Callable[[List[Any]], None], max_queue: int, batch_size: int,
+                 flush_interval: float, name: str):
+        """Hand work to a daemon thread that processes it in batches, never blocking the caller.
+
+        submit() drops the item (and counts it) when the bounded queue is full.
+        The thread starts on the first submit in each process, so workers forked
+        after import get their own queue and thread.
+        """
+        self.process = process
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stats = {"submitted": 0, "dropped": 0, "processed": 0, "batches": 0, "errors": 0}
+
+    def _ensure_started(self) -> "queue.Queue":
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.max_queue)
+                    threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def submit(self, item: Any) -> bool:
+        """Queue an item; False when it was dropped because the worker is behind"""
+        work = self._ensure_started()
+        try:
+            work.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def _run(self, work: "queue.Queue") -> None:
+        while True:
+            batch = [work.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.process(batch)
+                with self._lock:
+                    self._stats["processed"] += len(batch)
+                    self._stats["batches"] += 1
+            except Exception as e:
+                logger.error(f"Background batch in {self.name} failed: {str(e)}")
+                with self._lock:
+                    self._stats["errors"] += 1
+            finally:
+                for _ in batch:
+                    work.task_done()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is processed (tests, shutdown)"""
+        work = self._queue
+        if work is None or self._pid != os.getpid():
+            return True
+        end = time.monotonic() + timeout
+        with work.all_tasks_done:
+            while work.unfinished_tasks:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                work.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            depth = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+            return dict(self._stats, queue_depth=depth, queue_size=self.max_queue)
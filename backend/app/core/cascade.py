@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .prediction_table import model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def softmax(scores: np.ndarray) -> np.ndarray:
+    """Row-wise softmax of log-scores"""
+    scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return scores / scores.sum(axis=-1, keepdims=True)
+
+
+def margins(probabilities: np.ndarray) -> np.ndarray:
+    """Gap between the top two class probabilities of each row"""
+    top2 = np.sort(probabilities, axis=-1)[..., -2:]
+    return top2[..., 1] - top2[..., 0]
+
+
+def fit_temperature(scores: np.ndarray, reference: np.ndarray,
+                    grid: np.ndarray = np.geomspace(0.1, 100.0, 121)) -> float:
+    """Temperature whose softmax(scores / T) has the lowest cross-entropy against the reference probabilities"""
+    losses = []
+    for temperature in grid:
+        tempered = scores / temperature
+        tempered = tempered - tempered.max(axis=1, keepdims=True)
+        log_p = tempered - np.log(np.exp(tempered).sum(axis=1, keepdims=True))
+        losses.append(-(reference * log_p).sum(axis=1).mean())
+    return float(grid[int(np.argmin(losses))])
+
+
+class FirstStage:
+    def __init__(self, tokens: Iterable[str], log_prob: np.ndarray, log_prior: np.ndarray,
+                 classes: Iterable[str], analyzer, threshold: float = float("inf"), temperature: float = 1.0):
+        """Naive Bayes token -> class vote: one row sum per request, no vectorizer.
+
+        Raw naive Bayes posteriors are far too confident (every token counts as
+        independent evidence), so the log-scores are divided by a temperature
+        fitted to the full model's probabilities before they are reported.
+        """
+        self.tokens = list(tokens)
+        self.index = {token: i for i, token in enumerate(self.tokens)}
+        self.log_prob = np.asarray(log_prob, dtype=float)
+        self.log_prior = np.asarray(log_prior, dtype=float)
+        self.classes = [str(c) for c in classes]
+        self.analyzer = analyzer
+        self.threshold = threshold
+        self.temperature = temperature
+
+    @classmethod
+    def train(cls, vectorizer, texts: Iterable[str], labels: Iterable[str], alpha: float = 1.0) -> "FirstStage":
+        """Fit a binary-count MultinomialNB over the full model's vocabulary"""
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        tokens = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        counts = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=tokens, binary=True)
+        nb = MultinomialNB(alpha=alpha).fit(counts.transform(texts), list(labels))
+        return cls(tokens, nb.feature_log_prob_.T, nb.class_log_prior_, nb.classes_, vectorizer.build_analyzer())
+
+    def scores(self, medical_terms: List[str]) -> Optional[np.ndarray]:
+        """Untempered class log-scores, or None when no term is known (nothing to vote with)"""
+        features = set()
+        for term in medical_terms:
+            for token in self.analyzer(term):
+                feature = self.index.get(token)
+                if feature is not None:
+                    features.add(feature)
+        if not features:
+            return None
+        return self.log_prior + self.log_prob[list(features)].sum(axis=0)
+
+    def probabilities(self, medical_terms: List[str]) -> Optional[np.ndarray]:
+        """Calibrated class probabilities, or None when no term is known"""
+        scores = self.scores(medical_terms)
+        return softmax(scores / self.temperature) if scores is not None else None
+
+    def calibrate(self, inputs: List[List[str]], reference: np.ndarray, target_agreement: float) -> Dict[str, Any]:
+        """Fit the temperature, then the lowest margin threshold whose answered inputs agree
+        with the reference model often enough.
+
+        inputs must be held out from the data the stage was trained on, or the
+        agreement (and so the threshold) is measured in-sample.
+        """
+        rows = [(i, self.scores(terms)) for i, terms in enumerate(inputs)]
+        rows = [(i, s) for i, s in rows if s is not None]
+        if not rows:
+            self.threshold = float("inf")
+            return {"threshold": self.threshold, "temperature": self.temperature, "coverage": 0.0, "agreement": None}
+
+        indices = np.array([i for i, _ in rows])
+        scores = np.array([s for _, s in rows])
+        self.temperature = fit_temperature(scores, reference[indices])
+        probabilities = softmax(scores / self.temperature)
+        margin = margins(probabilities)
+        agree = probabilities.argmax(axis=1) == reference[indices].argmax(axis=1)
+
+        order = np.argsort(-margin, kind="stable")
+        precision = np.cumsum(agree[order]) / np.arange(1, len(order) + 1)
+        # Only cut between distinct margins: ties are all answered or all escalated
+        sorted_margin = margin[order]
+        boundary = np.append(sorted_margin[:-1] != sorted_margin[1:], True)
+        passing = np.nonzero((precision >= target_agreement) & boundary)[0]
+        if len(passing) == 0:
+            self.threshold = float("inf")
+            return {"threshold": self.threshold, "temperature": self.temperature, "coverage": 0.0, "agreement": None}
+        cut = passing[-1]
+        self.threshold = float(margin[order[cut]])
+        answered = margin >= self.threshold
+        return {
+            "threshold": self.threshold,
+            "temperature": self.temperature,
+            "coverage": float(answered.sum() / len(inputs)),
+            "agreement": float(agree[answered].mean()),
+        }
+
+    def save(self, path, model_path) -> None:
+        """Store the stage next to the model it was calibrated against"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                tokens=np.array(self.tokens),
+                log_prob=self.log_prob,
+                log_prior=self.log_prior,
+                classes=np.array(self.classes),
+                threshold=np.array(self.threshold),
+                temperature=np.array(self.temperature),
+                model_sha256=np.array(model_fingerprint(model_path)),
+            )
+
+    @classmethod
+    def load(cls, path, model, model_path) -> Optional["FirstStage"]:
+        """Load a stage calibrated for this exact model, or None when absent or stale"""
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["model_sha256"]) != model_fingerprint(model_path):
+                logger.warning(f"Ignoring cascade stage {path}: calibrated for a different model")
+                return None
+            if list(data["classes"]) != [str(c) for c in model.classes_]:
+                logger.warning(f"Ignoring cascade stage {path}: class list differs")
+                return None
+            analyzer = model.named_steps["tfidf"].build_analyzer()
+            stage = cls(data["tokens"], data["log_prob"], data["log_prior"], data["classes"],
+                        analyzer, float(data["threshold"]), float(data["temperature"]))
+        logger.info(f"Loaded cascade first stage {path} (margin threshold {stage.threshold:.3f}, "
+                    f"temperature {stage.temperature:.2f})")
+        return stage
+
+
+class Cascade:
+    def __init__(self, stage: FirstStage, audit_rate: float = 0.0):
+        """Answer confident inputs from the first stage and escalate the rest.
+
+        A random audit_rate share of first-stage answers is also run through
+        the full model to track agreement in production.
+        """
+        self.stage = stage
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        self._stats = {
+            "first_stage": 0, "escalated": 0, "abstained": 0,
+            "audited": 0, "audit_agreed": 0,
+            "first_stage_seconds": 0.0, "full_model_seconds": 0.0, "full_model_calls": 0,
+        }
+
+    def _record(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def _first_stage(self, medical_terms: List[str]):
+        probabilities = self.stage.probabilities(medical_terms)
+        if probabilities is None:
+            return None, "abstained"
+        if margins(probabilities) >= self.stage.threshold:
+            return probabilities, "first_stage"
+        return None, "escalated"
+
+    def _audit(self, probabilities: np.ndarray, medical_terms: List[str],
+               full_model: Callable[[List[str]], np.ndarray]) -> None:
+        if self.audit_rate > 0 and random.random() < self.audit_rate:
+            agreed = int(full_model(medical_terms).argmax() == probabilities.argmax())
+            self._record(audited=1, audit_agreed=agreed)
+
+    def probabilities(self, medical_terms: List[str],
+                      full_model: Callable[[List[str]], np.ndarray]) -> Tuple[np.ndarray, str]:
+        """(probabilities, stage) for one term list, escalating to full_model when unsure.
+
+        stage is "first_stage" or "full_model", the one whose scores are returned.
+        """
+        start = time.perf_counter()
+        probabilities, outcome = self._first_stage(medical_terms)
+        middle = time.perf_counter()
+        self._record(**{outcome: 1, "first_stage_seconds": middle - start})
+        if probabilities is not None:
+            self._audit(probabilities, medical_terms, full_model)
+            return probabilities, "first_stage"
+
+        probabilities = full_model(medical_terms)
+        self._record(full_model_seconds=time.perf_counter() - middle, full_model_calls=1)
+        return probabilities, "full_model"
+
+    def probabilities_batch(self, batch: List[List[str]],
+                            full_model_batch: Callable[[List[List[str]]], np.ndarray]
+                            ) -> Tuple[List[np.ndarray], List[str]]:
+        """Batch version: escalated rows go through full_model_batch in one call"""
+        start = time.perf_counter()
+        results = []
+        counts = {"first_stage": 0, "escalated": 0, "abstained": 0}
+        for terms in batch:
+            probabilities, outcome = self._first_stage(terms)
+            results.append(probabilities)
+            counts[outcome] += 1
+        middle = time.perf_counter()
+        self._record(first_stage_seconds=middle - start, **counts)
+
+        stages = ["first_stage" if probabilities is not None else "full_model" for probabilities in results]
+        missing = [i for i, probabilities in enumerate(results) if probabilities is None]
+        if missing:
+            for i, row in zip(missing, full_model_batch([batch[i] for i in missing])):
+                results[i] = row
+            # Each escalated row counts, so the mean is the amortized per-row cost
+            self._record(full_model_seconds=time.perf_counter() - middle, full_model_calls=len(missing))
+        return results, stages
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["first_stage"] + stats["escalated"] + stats["abstained"]
+        first_mean = stats["first_stage_seconds"] / total if total else 0.0
+        full_mean = stats["full_model_seconds"] / stats["full_model_calls"] if stats["full_model_calls"] else None
+        return {
+            "threshold": self.stage.threshold,
+            "temperature": self.stage.temperature,
+            "requests": total,
+            "first_stage_hit_rate": stats["first_stage"] / total if total else 0.0,
+            "escalated": stats["escalated"],
+            "abstained": stats["abstained"],
+            "audited": stats["audited"],
+            "audit_agreement": stats["audit_agreed"] / stats["audited"] if stats["audited"] else None,
+            "first_stage_mean_ms": first_mean * 1000,
+            "full_model_mean_ms": full_mean * 1000 if full_mean is not None else None,
+            # Inference avoided by first-stage answers, net of the first stage's own cost
+            "estimated_seconds_saved": (
+                stats["first_stage"] * full_mean - stats["first_stage_seconds"] if full_mean is not None else None
+            ),
+        }
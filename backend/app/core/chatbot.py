@@ -134,20 +134,27 @@ class HealthAssistant:
             "diare": "Untuk diare: minum oralit, hindari makanan berminyak, istirahat cukup. Segera ke dokter jika dehidrasi berat atau diare berdarah."
         }
 
+        # Matchers are built once and shared by every call (and batch worker)
+        self._synonym_index = [
+            (syn, key) for key, synonyms in self.symptom_synonyms.items() for syn in synonyms
+        ]
+        self._qa_matchers = [
+            (re.compile(pattern), response) for pattern, response in self.qa_pairs.items()
+        ]
+
     def _normalize_symptoms(self, text: str) -> List[str]:
         """Extract normalized symptom keys from user text using synonyms."""
         found = set()
         text = text.lower()
-        for key, synonyms in self.symptom_synonyms.items():
-            for syn in synonyms:
-                if syn in text:
-                    found.add(key)
+        for syn, key in self._synonym_index:
+            if key not in found and syn in text:
+                found.add(key)
         return list(found)
 
     def _get_qa_response(self, text: str) -> Optional[str]:
         text = text.lower()
-        for pattern, response in self.qa_pairs.items():
-            if re.search(pattern, text):
+        for matcher, response in self._qa_matchers:
+            if matcher.search(text):
                 return response
         return None
 
@@ -213,6 +220,24 @@ class HealthAssistant:
             "context": {"medical_terms": all_terms}
         }
 
+    def _get_batch_response(self, item: Any) -> Dict[str, Any]:
+        """Answer one batch item, turning failures into an error entry"""
+        item_id = item.get("id") if isinstance(item, dict) else None
+        try:
+            text = item.get("text") if isinstance(item, dict) else None
+            if not isinstance(text, str) or not text.strip():
+                return {"id": item_id, "error": "No message provided"}
+            response = self.get_response(text, item.get("context") or {})
+            response["id"] = item_id
+            return response
+        except Exception as e:
+            logger.error(f"Error in batch chat item {item_id}: {str(e)}")
+            return {"id": item_id, "error": str(e)}
+
+    def get_responses(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Answer a batch of {id, text, context} items in input order"""
+        return [self._get_batch_response(item) for item in items]
+
 # Global chatbot instance
 _chatbot = None
 
@@ -225,4 +250,15 @@ def get_chatbot_response(text: str, context: Dict[str, Any] = None) -> Dict[str,
     global _chatbot
     if _chatbot is None:
         initialize_chatbot()
-    return _chatbot.get_response(text, context) 
\ No newline at end of file
+    return _chatbot.get_response(text, context)
+
+def get_chatbot_responses(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Answer a batch of {id, text, context} items in input order with the global chatbot.
+
+    Items are answered serially: the work is pure-Python regex matching, so
+    threads only add GIL contention; scale with more worker processes instead.
+    """
+    global _chatbot
+    if _chatbot is None:
+        initialize_chatbot()
+    return _chatbot.get_responses(items)
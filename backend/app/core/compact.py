@@ -0,0 +1,204 @@
+import json
+import math
+import re
+import sys
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Any, Iterable
+
+import numpy as np
+
+from .incremental import idf_weights, is_ovr, logits_to_probabilities, supports_incremental
+from .vocabulary import CompactVocabulary, build_vocabulary_index
+
+logger = logging.getLogger(__name__)
+
+COMPACT_VERSION = 2
+WEIGHT_DTYPES = ("float32", "float16", "int8")
+
+
+def _quantize(weights: np.ndarray, classes: np.ndarray, n_classes: int, dtype: str):
+    """Stored weights plus per-class scales (ones unless int8)"""
+    if dtype != "int8":
+        return weights.astype(dtype), np.ones(n_classes, dtype=np.float32)
+    peak = np.zeros(n_classes)
+    np.maximum.at(peak, classes, np.abs(weights))
+    scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(weights / scales[classes]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def export_compact_model(pipeline, path, dtype: str = "int8", prune: float = 1e-3) -> Dict[str, Any]:
+    """Write a pruned, quantized copy of a TF-IDF + linear pipeline as a single .npz.
+
+    Weights with |w| <= prune are dropped and the rest are stored feature-major
+    (CSR over features x classes), so scoring a request only touches the rows
+    of the tokens it contains.
+    """
+    if dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(WEIGHT_DTYPES)}")
+    vectorizer = pipeline.named_steps["tfidf"]
+    classifier = pipeline.named_steps["clf"]
+    if not supports_incremental(vectorizer, classifier) or vectorizer.stop_words or vectorizer.preprocessor \
+            or vectorizer.tokenizer or vectorizer.strip_accents:
+        raise ValueError("Only default unigram TF-IDF + linear pipelines can be exported")
+
+    weights = np.asarray(classifier.coef_, dtype=np.float64).T  # features x classes
+    keep = np.abs(weights) > prune
+    indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))]).astype(np.int64)
+    features, classes = np.nonzero(keep)
+    n_classes = weights.shape[1]
+    data, scales = _quantize(weights[features, classes], classes, n_classes, dtype)
+    idf = idf_weights(vectorizer)
+
+    meta = {
+        "version": COMPACT_VERSION,
+        "dtype": dtype,
+        "prune": prune,
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "binary": bool(vectorizer.binary),
+        "normalize": vectorizer.norm == "l2",
+        "ovr": bool(is_ovr(classifier)),
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            meta=np.array(json.dumps(meta)),
+            vocabulary=np.frombuffer(build_vocabulary_index(vectorizer.vocabulary_), dtype=np.uint8),
+            idf=(idf if idf is not None else np.ones(len(vectorizer.vocabulary_))).astype(np.float32),
+            indptr=indptr,
+            indices=classes.astype(np.uint16 if n_classes < 1 << 16 else np.uint32),
+            data=data,
+            scales=scales,
+            intercept=np.asarray(classifier.intercept_, dtype=np.float32),
+            classes=np.array([str(c) for c in classifier.classes_]),
+        )
+    return {"kept_weights": int(keep.sum()), "total_weights": int(keep.size), "bytes": Path(path).stat().st_size}
+
+
+class CompactModel:
+    def __init__(self, meta: Dict[str, Any], vocabulary, idf, indptr, indices, data, scales, intercept, classes):
+        """Serves an exported compact model; exposes predict_proba and classes_ like the pipeline"""
+        self.meta = meta
+        self.lowercase = meta["lowercase"]
+        self._token_re = re.compile(meta["token_pattern"])
+        self.vocabulary_ = vocabulary
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.scales = scales
+        self.intercept = intercept
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    @classmethod
+    def load(cls, path) -> "CompactModel":
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if meta.get("version") != COMPACT_VERSION:
+                raise ValueError(f"Unsupported compact model version in {path}")
+            vocabulary = CompactVocabulary(npz["vocabulary"])
+            return cls(meta, vocabulary, npz["idf"], npz["indptr"], npz["indices"], npz["data"],
+                       npz["scales"], npz["intercept"], npz["classes"])
+
+    def _features(self, text: str) -> Dict[int, float]:
+        """TF-IDF weights of one text, as the exported vectorizer would compute them"""
+        if self.lowercase:
+            text = text.lower()
+        counts = Counter()
+        for token in self._token_re.findall(text):
+            feature = self.vocabulary_.get(token)
+            if feature is not None:
+                counts[feature] += 1
+        weights = {}
+        for feature, count in counts.items():
+            if self.meta["binary"]:
+                tf = 1.0
+            elif self.meta["sublinear_tf"]:
+                tf = 1.0 + math.log(count)
+            else:
+                tf = float(count)
+            weights[feature] = tf * float(self.idf[feature])
+        if self.meta["normalize"] and weights:
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            weights = {feature: w / norm for feature, w in weights.items()}
+        return weights
+
+    def decision_function(self, texts: Iterable[str]) -> np.ndarray:
+        rows = []
+        for text in texts:
+            logits = self.intercept.astype(np.float64)
+            for feature, value in self._features(text).items():
+                start, end = self.indptr[feature], self.indptr[feature + 1]
+                if start == end:
+                    continue
+                classes = self.indices[start:end]
+                logits = logits + np.bincount(
+                    classes,
+                    weights=value * self.data[start:end].astype(np.float64) * self.scales[classes],
+                    minlength=len(self.intercept)
+                )
+            rows.append(logits)
+        return np.array(rows).reshape(-1, len(self.intercept))
+
+    def predict_proba(self, texts: Iterable[str]) -> np.ndarray:
+        return logits_to_probabilities(self.decision_function(texts), self.meta["ovr"])
+
+    def predict(self, texts: Iterable[str]) -> np.ndarray:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+    def memory_bytes(self) -> int:
+        """Arrays plus the vocabulary (index buffer, or dict keys, values and table)"""
+        arrays = sum(a.nbytes for a in (self.idf, self.indptr, self.indices, self.data, self.scales, self.intercept))
+        return arrays + vocabulary_bytes(self.vocabulary_)
+
+
+def vocabulary_bytes(vocabulary) -> int:
+    """Index buffer size, or a dict's table plus its key and value objects"""
+    if isinstance(vocabulary, CompactVocabulary):
+        return vocabulary.nbytes()
+    return sys.getsizeof(vocabulary) + sum(sys.getsizeof(t) + sys.getsizeof(i) for t, i in vocabulary.items())
+
+
+def dense_model_bytes(pipeline) -> int:
+    """Comparable footprint of the full-precision pipeline's weights and vocabulary"""
+    vectorizer = pipeline.named_steps["tfidf"]
+    classifier = pipeline.named_steps["clf"]
+    idf = idf_weights(vectorizer)
+    return (classifier.coef_.nbytes + classifier.intercept_.nbytes + (idf.nbytes if idf is not None else 0)
+            + vocabulary_bytes(vectorizer.vocabulary_))
+
+
+def accuracy_delta_report(pipeline, compact: CompactModel, texts: List[str], labels: List[str]) -> Dict[str, Any]:
+    """How far the compact model's answers drift from the full-precision pipeline"""
+    reference = pipeline.predict_proba(texts)
+    approximate = compact.predict_proba(texts)
+    labels = np.asarray([str(label) for label in labels])
+    reference_top = np.asarray(pipeline.classes_)[reference.argmax(axis=1)].astype(str)
+    approximate_top = compact.classes_[approximate.argmax(axis=1)].astype(str)
+    top3_reference = np.argsort(-reference, axis=1)[:, :3]
+    top3_approximate = np.argsort(-approximate, axis=1)[:, :3]
+    difference = np.abs(reference - approximate)
+    full_bytes = dense_model_bytes(pipeline)
+    return {
+        "samples": len(texts),
+        "dtype": compact.meta["dtype"],
+        "prune": compact.meta["prune"],
+        "kept_weights": int(len(compact.data)),
+        "total_weights": int(len(compact.vocabulary_) * len(compact.classes_)),
+        "full_accuracy": float((reference_top == labels).mean()),
+        "compact_accuracy": float((approximate_top == labels).mean()),
+        "top1_agreement": float((reference_top == approximate_top).mean()),
+        "top3_agreement": float(np.mean([set(a) == set(b) for a, b in zip(top3_reference, top3_approximate)])),
+        "max_probability_delta": float(difference.max()),
+        "mean_probability_delta": float(difference.mean()),
+        "full_weight_bytes": int(pipeline.named_steps["clf"].coef_.nbytes),
+        "compact_weight_bytes": int(compact.data.nbytes + compact.indices.nbytes + compact.scales.nbytes),
+        "full_bytes": int(full_bytes),
+        "compact_bytes": int(compact.memory_bytes()),
+        "memory_ratio": float(full_bytes / compact.memory_bytes()),
+    }
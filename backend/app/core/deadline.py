@@ -0,0 +1,123 @@
+import threading
+import time
+import logging
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before a pipeline stage"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded before {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, endpoint: str, expires_at: float):
+        """Absolute (epoch seconds) deadline for one request"""
+        self.endpoint = endpoint
+        self.expires_at = expires_at
+        self.started = time.monotonic()
+        self.abandoned = False
+
+    def remaining(self, now: float = None) -> float:
+        return self.expires_at - (time.time() if now is None else now)
+
+    def expired(self, now: float = None) -> bool:
+        return self.remaining(now) <= 0
+
+
+class DeadlineStats:
+    def __init__(self, ewma_alpha: float = 0.2):
+        """Completed/abandoned counters and an estimate of the work skipped"""
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def _endpoint(self, name: str) -> Dict[str, Any]:
+        stats = self._endpoints.get(name)
+        if stats is None:
+            stats = {
+                "completed": 0,
+                "abandoned": {},
+                "service_time_ewma": 0.0,
+                "estimated_seconds_saved": 0.0,
+            }
+            self._endpoints[name] = stats
+        return stats
+
+    def record_completed(self, deadline: Deadline) -> None:
+        elapsed = time.monotonic() - deadline.started
+        with self._lock:
+            stats = self._endpoint(deadline.endpoint)
+            stats["completed"] += 1
+            if stats["service_time_ewma"] == 0.0:
+                stats["service_time_ewma"] = elapsed
+            else:
+                stats["service_time_ewma"] += self.ewma_alpha * (elapsed - stats["service_time_ewma"])
+
+    def record_abandoned(self, deadline: Deadline, stage: str) -> None:
+        # The skipped work is what a full run usually costs minus what was already spent
+        elapsed = time.monotonic() - deadline.started
+        with self._lock:
+            stats = self._endpoint(deadline.endpoint)
+            stats["abandoned"][stage] = stats["abandoned"].get(stage, 0) + 1
+            stats["estimated_seconds_saved"] += max(0.0, stats["service_time_ewma"] - elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: dict(stats, abandoned=dict(stats["abandoned"]))
+                for name, stats in self._endpoints.items()
+            }
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+_stats = DeadlineStats()
+
+
+def set_deadline(deadline: Optional[Deadline]):
+    """Install the deadline for the current request, returns a reset token"""
+    return _current.set(deadline)
+
+
+def reset_deadline(token) -> None:
+    _current.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def abandon_deadline(stage: str) -> DeadlineExceeded:
+    """Mark the current request abandoned before stage (counted once) and return the error to raise"""
+    deadline = _current.get()
+    if deadline is not None and not deadline.abandoned:
+        deadline.abandoned = True
+        _stats.record_abandoned(deadline, stage)
+        logger.warning(f"Abandoning {deadline.endpoint} request before {stage}: deadline exceeded")
+    return DeadlineExceeded(stage)
+
+
+def check_deadline(stage: str) -> None:
+    """Abandon the current request if its deadline has passed"""
+    deadline = _current.get()
+    if deadline is None:
+        return
+    if not deadline.abandoned and not deadline.expired():
+        return
+    raise abandon_deadline(stage)
+
+
+def finish_deadline(deadline: Optional[Deadline]) -> None:
+    """Record a request that ran to completion"""
+    if deadline is not None and not deadline.abandoned:
+        _stats.record_completed(deadline)
+
+
+def deadline_stats() -> Dict[str, Any]:
+    """Abandoned-work counters for the metrics endpoint"""
+    return _stats.snapshot()
@@ -0,0 +1,341 @@
+import heapq
+import io
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import DRIFT, PREDICTOR_MODEL_PATH
+from .background import BackgroundBatcher
+from .prediction_table import model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DISTRIBUTION_VERSION = 1
+SNAPSHOT_PREFIX = "worker-"
+# Second hash seed for double hashing: row i uses h1 + i * h2
+_SEED = 0x5BD1E995
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 16384, depth: int = 4, table: Optional[np.ndarray] = None):
+        """Approximate token counts in a fixed depth x width table (estimates never undercount)"""
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32) if table is None else table
+
+    def indices(self, tokens: Sequence[str]) -> np.ndarray:
+        """Flat table positions, (len(tokens), depth); tokens hash the same in every process"""
+        h1 = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.int64, count=len(tokens))
+        h2 = np.fromiter((zlib.crc32(t.encode("utf-8"), _SEED) | 1 for t in tokens), dtype=np.int64,
+                         count=len(tokens))
+        rows = np.arange(self.depth, dtype=np.int64)
+        return rows * self.width + (h1[:, np.newaxis] + rows * h2[:, np.newaxis]) % self.width
+
+    def add(self, tokens: Sequence[str]) -> None:
+        if tokens:
+            np.add.at(self.table.reshape(-1), self.indices(tokens).ravel(), 1)
+
+    def estimate(self, tokens: Sequence[str], indices: Optional[np.ndarray] = None) -> np.ndarray:
+        if indices is None:
+            indices = self.indices(tokens)
+        return self.table.reshape(-1)[indices].min(axis=1) if len(indices) else np.zeros(0, dtype=np.uint32)
+
+    def halve(self) -> None:
+        self.table >>= 1
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int = 200):
+        """Top-k heavy hitters in fixed memory: counts overestimate by at most the reported error"""
+        self.capacity = capacity
+        self.counts: Dict[str, List[int]] = {}
+        # One (count, token) entry per tracked token; entries go stale on increments and are fixed lazily
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, token: str, count: int = 1) -> None:
+        entry = self.counts.get(token)
+        if entry is not None:
+            entry[0] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[token] = [count, 0]
+            heapq.heappush(self._heap, (count, token))
+            return
+        while True:
+            smallest, victim = self._heap[0]
+            if self.counts[victim][0] == smallest:
+                break
+            heapq.heapreplace(self._heap, (self.counts[victim][0], victim))
+        # The newcomer inherits the evicted count, which bounds its error
+        del self.counts[victim]
+        self.counts[token] = [smallest + count, smallest]
+        heapq.heapreplace(self._heap, (smallest + count, token))
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        ranked = heapq.nlargest(n, self.counts.items(), key=lambda item: item[1][0])
+        return [{"token": token, "count": count, "error": error} for token, (count, error) in ranked]
+
+    def halve(self) -> None:
+        self.counts = {token: [count // 2, error // 2] for token, (count, error) in self.counts.items()
+                       if count // 2 > 0}
+        self._heap = [(count, token) for token, (count, _) in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+def build_term_distribution(vectorizer, texts: Iterable[str], path, model_path) -> Dict[str, Any]:
+    """Save the training token counts (as the model's vectorizer tokenizes them) for drift comparison"""
+    analyzer = vectorizer.build_analyzer()
+    counts = Counter()
+    documents = 0
+    for text in texts:
+        counts.update(analyzer(str(text)))
+        documents += 1
+    distribution = {
+        "version": DISTRIBUTION_VERSION,
+        "model_sha256": model_fingerprint(model_path),
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": bool(vectorizer.lowercase),
+        "documents": documents,
+        "total": sum(counts.values()),
+        "tokens": dict(counts.most_common()),
+    }
+    Path(path).write_text(json.dumps(distribution, ensure_ascii=False))
+    return distribution
+
+
+def load_term_distribution(path) -> Optional[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    distribution = json.loads(path.read_text())
+    if distribution.get("version") != DISTRIBUTION_VERSION:
+        logger.warning(f"Ignoring term distribution {path}: unsupported version")
+        return None
+    return distribution
+
+
+class DriftMonitor:
+    def __init__(self, distribution: Optional[Dict[str, Any]], directory, width: int = 16384, depth: int = 4,
+                 capacity: int = 200, max_queue: int = 10000, batch_size: int = 512, flush_interval: float = 0.5,
+                 publish_interval: float = 10.0, decay_seconds: float = 86400.0):
+        """Live term statistics against the training distribution, updated off the request thread.
+
+        Requests enqueue their medical terms; the worker's background thread
+        tokenizes them like the model's vectorizer, counts every token in a
+        count-min sketch and every token the model has never seen in a
+        space-saving top list. All counts are halved every decay_seconds so the
+        comparison follows recent traffic. Snapshots are published to directory
+        for the other workers.
+        """
+        self.distribution = distribution
+        self.directory = Path(directory)
+        self.publish_interval = publish_interval
+        self.decay_seconds = decay_seconds
+        pattern = distribution["token_pattern"] if distribution else r"(?u)\b\w\w+\b"
+        self._token = re.compile(pattern)
+        self._lowercase = distribution["lowercase"] if distribution else True
+        self.known = frozenset(distribution["tokens"]) if distribution else None
+        self.sketch = CountMinSketch(width, depth)
+        self.unknown = SpaceSaving(capacity)
+        self.counters = {"requests": 0, "tokens": 0, "unknown_tokens": 0, "no_known_tokens": 0}
+        self._lock = threading.Lock()
+        self._published = 0.0
+        self._decayed = time.monotonic()
+        self._batcher = BackgroundBatcher(self._process, max_queue, batch_size, flush_interval, "drift-monitor")
+
+    def tokenize(self, term: str) -> List[str]:
+        return self._token.findall(term.lower() if self._lowercase else term)
+
+    def submit(self, medical_terms: List[str]) -> bool:
+        return self._batcher.submit(list(medical_terms))
+
+    def _process(self, batch: List[List[str]]) -> None:
+        with self._lock:
+            self.observe(batch)
+            if time.monotonic() - self._decayed >= self.decay_seconds:
+                self.decay()
+            if time.monotonic() - self._published >= self.publish_interval:
+                self.publish()
+
+    def observe(self, batch: List[List[str]]) -> None:
+        """Count a batch of requests' terms (caller holds the lock when the thread is running)"""
+        tokens = []
+        for terms in batch:
+            request_tokens = [token for term in terms for token in self.tokenize(term)]
+            tokens.extend(request_tokens)
+            if self.known is not None:
+                unknown = [token for token in request_tokens if token not in self.known]
+                for token in unknown:
+                    self.unknown.add(token)
+                self.counters["unknown_tokens"] += len(unknown)
+                if len(unknown) == len(request_tokens):
+                    # The model sees an empty vector for this request
+                    self.counters["no_known_tokens"] += 1
+        self.sketch.add(tokens)
+        self.counters["requests"] += len(batch)
+        self.counters["tokens"] += len(tokens)
+
+    def decay(self) -> None:
+        self.sketch.halve()
+        self.unknown.halve()
+        self.counters = {name: count // 2 for name, count in self.counters.items()}
+        self._decayed = time.monotonic()
+
+    def publish(self) -> None:
+        """Write this worker's snapshot (caller holds the lock)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = {"pid": os.getpid(), "published": time.time(), "counters": self.counters,
+                "unknown": self.unknown.top(self.unknown.capacity)}
+        buffer = io.BytesIO()
+        np.savez(buffer, table=self.sketch.table, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        path = self.directory / f"{SNAPSHOT_PREFIX}{os.getpid()}.npz"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(buffer.getvalue())
+        os.replace(tmp, path)
+        self._published = time.monotonic()
+
+    def refresh(self) -> None:
+        with self._lock:
+            self.publish()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        return self._batcher.drain(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["tracked_unknown"] = len(self.unknown.counts)
+        stats["queue"] = self._batcher.stats()
+        return stats
+
+
+def drift_report(distribution: Optional[Dict[str, Any]], sketch: CountMinSketch, counters: Dict[str, int],
+                 unknown: List[Dict[str, Any]], top: int = 20, smoothing: float = 1e-4) -> Dict[str, Any]:
+    """Unknown-token shares plus PSI and Jensen-Shannon divergence of live vs training token shares.
+
+    Both distributions cover the training tokens plus one bucket for all
+    tokens the model has never seen; live counts of training tokens are
+    count-min estimates.
+    """
+    tokens = counters["tokens"]
+    report = {
+        "requests": counters["requests"],
+        "tokens": tokens,
+        "unknown_rate": counters["unknown_tokens"] / tokens if tokens else None,
+        "no_known_tokens_rate": counters["no_known_tokens"] / counters["requests"] if counters["requests"] else None,
+        "top_unknown": unknown[:top],
+        "drift": None,
+    }
+    if distribution is None or not tokens:
+        return report
+
+    names = list(distribution["tokens"])
+    training = np.array([distribution["tokens"][name] for name in names] + [0], dtype=np.float64)
+    live = np.append(sketch.estimate(names).astype(np.float64), counters["unknown_tokens"])
+    p = training / training.sum()
+    # Count-min overestimates; rescale so the shares sum to one
+    q = live / live.sum() if live.sum() else live
+    p_s, q_s = (p + smoothing) / (1 + smoothing * len(p)), (q + smoothing) / (1 + smoothing * len(q))
+    m = (p_s + q_s) / 2
+    shifts = np.argsort(-np.abs(q[:-1] - p[:-1]))[:top]
+    report["drift"] = {
+        "psi": float(np.sum((q_s - p_s) * np.log(q_s / p_s))),
+        "js_divergence": float((np.sum(p_s * np.log2(p_s / m)) + np.sum(q_s * np.log2(q_s / m))) / 2),
+        "top_shifts": [{"token": names[i], "training_share": float(p[i]), "live_share": float(q[i])}
+                       for i in shifts],
+    }
+    return report
+
+
+def read_drift(directory, distribution: Optional[Dict[str, Any]], top: int = 20,
+               max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Merge the workers' snapshots (sketches add, top lists merge) into one report"""
+    directory = Path(directory)
+    paths = sorted(directory.glob(f"{SNAPSHOT_PREFIX}*.npz")) if directory.is_dir() else []
+    sketch = None
+    counters = Counter()
+    unknown = Counter()
+    errors = Counter()
+    workers = 0
+    for path in paths:
+        try:
+            with np.load(path) as snapshot:
+                table = snapshot["table"]
+                meta = json.loads(str(snapshot["meta"]))
+        except (OSError, ValueError, KeyError):
+            continue
+        if max_age is not None and time.time() - meta["published"] > max_age:
+            path.unlink(missing_ok=True)
+            continue
+        if sketch is None:
+            sketch = CountMinSketch(table.shape[1], table.shape[0], table.astype(np.uint64))
+        elif table.shape != sketch.table.shape:
+            continue  # written under other settings
+        else:
+            sketch.table += table
+        workers += 1
+        counters.update(meta["counters"])
+        for entry in meta["unknown"]:
+            unknown[entry["token"]] += entry["count"]
+            errors[entry["token"]] += entry["error"]
+    if sketch is None:
+        return None
+    merged = [{"token": token, "count": count, "error": errors[token]} for token, count in unknown.most_common(top)]
+    report = drift_report(distribution, sketch, {name: counters[name] for name in
+                                                 ("requests", "tokens", "unknown_tokens", "no_known_tokens")},
+                          merged, top)
+    report["workers"] = workers
+    return report
+
+
+# Global drift monitor instance
+_monitor = None
+
+def initialize_drift_monitor() -> Optional[DriftMonitor]:
+    """Initialize the global drift monitor (None when disabled)"""
+    global _monitor
+    if _monitor is None and DRIFT["enabled"]:
+        distribution = load_term_distribution(DRIFT["distribution_path"])
+        if distribution is None:
+            logger.warning("No training term distribution; unknown-token and drift reports are disabled")
+        elif os.path.exists(PREDICTOR_MODEL_PATH) and distribution["model_sha256"] != model_fingerprint(PREDICTOR_MODEL_PATH):
+            logger.warning(f"{DRIFT['distribution_path']} was built for a different model; rebuild it with "
+                           f"scripts/build_term_distribution.py")
+        _monitor = DriftMonitor(
+            distribution,
+            DRIFT["directory"],
+            width=DRIFT["sketch_width"],
+            depth=DRIFT["sketch_depth"],
+            capacity=DRIFT["unknown_capacity"],
+            max_queue=DRIFT["queue_size"],
+            batch_size=DRIFT["batch_size"],
+            flush_interval=DRIFT["flush_interval"],
+            publish_interval=DRIFT["publish_interval"],
+            decay_seconds=DRIFT["decay_hours"] * 3600
+        )
+    return _monitor
+
+def observe_terms(medical_terms: List[str]) -> None:
+    """Queue one request's extracted terms for drift monitoring"""
+    monitor = initialize_drift_monitor()
+    if monitor is not None:
+        monitor.submit(medical_terms)
+
+def current_drift(top: int = 20) -> Optional[Dict[str, Any]]:
+    monitor = initialize_drift_monitor()
+    if monitor is None:
+        return None
+    monitor.refresh()
+    return read_drift(DRIFT["directory"], monitor.distribution, top, max_age=DRIFT["snapshot_max_age"])
+
+def drift_stats() -> Optional[Dict[str, Any]]:
+    return _monitor.stats() if _monitor is not None else None
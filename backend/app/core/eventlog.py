@@ -0,0 +1,233 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import EVENT_LOG
+from .background import BackgroundBatcher
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+ACTIVE_SUFFIX = ".jsonl.open"
+SEALED_SUFFIX = ".jsonl"
+
+
+class EventLog:
+    def __init__(self, directory, max_queue: int = 10000, batch_size: int = 256, flush_interval: float = 0.2,
+                 segment_bytes: int = 64 << 20, segment_seconds: float = 3600.0,
+                 fsync: str = "interval", fsync_interval: float = 1.0):
+        """Append-only JSONL event log written by a background thread.
+
+        Records are queued without blocking (dropped and counted when the
+        queue is full) and appended in batches to per-process segment files,
+        so workers never interleave writes. The active segment ends in
+        .jsonl.open and is renamed to .jsonl when it rotates by size or age.
+        fsync: "always" syncs every batch, "interval" at most every
+        fsync_interval seconds while writing, "never" leaves it to the OS.
+        A crash can leave a torn last line, which readers skip.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._batcher = BackgroundBatcher(self._write, max_queue, batch_size, flush_interval, "event-log-writer")
+        # Segment state, used by the writer thread (and close() at shutdown)
+        self._segment_lock = threading.Lock()
+        self._file = None
+        self._path: Optional[Path] = None
+        self._pid = None
+        self._opened = 0.0
+        self._synced = 0.0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stats = {"records_written": 0, "bytes_written": 0, "segments": 0, "fsyncs": 0}
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """Queue one record; False when it was dropped"""
+        return self._batcher.submit(record)
+
+    def _open_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._pid = os.getpid()
+        self._sequence += 1
+        name = f"events-{time.strftime('%Y%m%dT%H%M%S')}-{self._pid}-{self._sequence:04d}"
+        self._path = self.directory / (name + ACTIVE_SUFFIX)
+        self._file = open(self._path, "ab")
+        self._opened = time.monotonic()
+        with self._lock:
+            self._stats["segments"] += 1
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = time.monotonic()
+        with self._lock:
+            self._stats["fsyncs"] += 1
+
+    def _seal(self) -> None:
+        """Sync, close and rename the active segment so exporters see it as complete"""
+        if self._file is None:
+            return
+        if self.fsync != "never":
+            self._sync()
+        self._file.close()
+        self._path.rename(self._path.with_name(self._path.name[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX))
+        if self.fsync != "never":
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._file = None
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._segment_lock:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if self._file is not None and self._pid != os.getpid():
+            # Forked after the parent opened a segment: leave that file to the parent
+            self._file = None
+        if self._file is not None and (self._file.tell() >= self.segment_bytes
+                                       or time.monotonic() - self._opened >= self.segment_seconds):
+            self._seal()
+        if self._file is None:
+            self._open_segment()
+        payload = b"".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            for record in batch
+        )
+        self._file.write(payload)
+        if self.fsync == "always" or (self.fsync == "interval"
+                                      and time.monotonic() - self._synced >= self.fsync_interval):
+            self._sync()
+        else:
+            self._file.flush()
+        with self._lock:
+            self._stats["records_written"] += len(batch)
+            self._stats["bytes_written"] += len(payload)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out queued records and seal the active segment (shutdown, tests)"""
+        self._batcher.drain(timeout)
+        with self._segment_lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._seal()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        return self._batcher.drain(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue"] = self._batcher.stats()
+        stats["fsync"] = self.fsync
+        return stats
+
+
+def read_events(directory) -> Iterator[Dict[str, Any]]:
+    """Records of every segment (sealed and active) in name order, skipping torn lines"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return
+    paths = sorted(p for p in directory.iterdir()
+                   if p.name.endswith(SEALED_SUFFIX) or p.name.endswith(ACTIVE_SUFFIX))
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logger.warning(f"Skipping incomplete record at the end of {path}")
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable record in {path}")
+
+
+def labeled_predictions(directory, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Prediction records joined with their feedback ("diagnosis", "note"); the latest feedback wins.
+
+    Predictions without feedback, or older than the since timestamp, are skipped, and so is
+    feedback whose prediction_id matches no logged prediction.
+    """
+    predictions: Dict[str, Dict[str, Any]] = {}
+    feedback: Dict[str, Dict[str, Any]] = {}
+    for record in read_events(directory):
+        prediction_id = record.get("prediction_id")
+        if record.get("type") == "prediction":
+            if since is None or record.get("ts", 0) >= since:
+                predictions[prediction_id] = record
+        elif record.get("type") == "feedback":
+            if prediction_id not in feedback or record.get("ts", 0) >= feedback[prediction_id].get("ts", 0):
+                feedback[prediction_id] = record
+    for prediction_id, record in predictions.items():
+        if prediction_id in feedback:
+            yield dict(record, diagnosis=feedback[prediction_id]["diagnosis"], note=feedback[prediction_id].get("note"))
+
+
+def new_prediction_id() -> str:
+    return uuid.uuid4().hex
+
+
+# Global event log instance
+_event_log = None
+
+def initialize_event_log(directory: Optional[str] = None) -> Optional[EventLog]:
+    """Initialize the global event log (None when disabled)"""
+    global _event_log
+    if _event_log is None and EVENT_LOG["enabled"]:
+        _event_log = EventLog(
+            directory or EVENT_LOG["directory"],
+            max_queue=EVENT_LOG["queue_size"],
+            batch_size=EVENT_LOG["batch_size"],
+            flush_interval=EVENT_LOG["flush_interval"],
+            segment_bytes=EVENT_LOG["segment_bytes"],
+            segment_seconds=EVENT_LOG["segment_seconds"],
+            fsync=EVENT_LOG["fsync"],
+            fsync_interval=EVENT_LOG["fsync_interval"]
+        )
+        atexit.register(_event_log.close)
+    return _event_log
+
+def log_prediction(text: str, medical_terms: List[str], predictions: List[Dict[str, Any]],
+                   model: Optional[str] = None) -> str:
+    """Record a served prediction and return the prediction_id clients quote in feedback"""
+    prediction_id = new_prediction_id()
+    event_log = initialize_event_log()
+    if event_log is not None:
+        event_log.append({
+            "type": "prediction",
+            "prediction_id": prediction_id,
+            "ts": time.time(),
+            "model": model,
+            "text": text,
+            "medical_terms": list(medical_terms),
+            "predictions": [{"disease": str(p["disease"]), "confidence": p["confidence"]} for p in predictions],
+        })
+    return prediction_id
+
+def log_feedback(prediction_id: str, diagnosis: str, note: Optional[str] = None) -> bool:
+    """Record a clinician-confirmed diagnosis; False when the log is disabled or full"""
+    event_log = initialize_event_log()
+    if event_log is None:
+        return False
+    return event_log.append({
+        "type": "feedback",
+        "prediction_id": prediction_id,
+        "ts": time.time(),
+        "diagnosis": diagnosis,
+        "note": note,
+    })
+
+def event_log_stats() -> Optional[Dict[str, Any]]:
+    """Queue and writer counters, None when the log is disabled or unused"""
+    return _event_log.stats() if _event_log is not None else None
@@ -0,0 +1,143 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.linear_model import LogisticRegression
+
+from .incremental import is_ovr, logits_to_probabilities
+from .topk import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+def auto_groups(X, y_index: np.ndarray, n_classes: int, n_groups: int, random_state=None) -> np.ndarray:
+    """Cluster classes by their mean feature vector when no group mapping is given"""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import normalize
+
+    centroids = np.vstack([np.asarray(X[y_index == c].mean(axis=0)).ravel() for c in range(n_classes)])
+    kmeans = KMeans(n_clusters=n_groups, n_init=10, random_state=random_state)
+    return kmeans.fit_predict(normalize(centroids))
+
+
+def linear_probabilities(clf, X) -> np.ndarray:
+    """predict_proba of a fitted LogisticRegression without its per-call validation overhead"""
+    if getattr(X, "shape", (0,))[0] == 1 and hasattr(X, "indices"):
+        # One sparse request: gather its few non-zero columns instead of a sparse matmul
+        logits = (clf.coef_[:, X.indices] @ X.data + clf.intercept_)[np.newaxis, :]
+    else:
+        logits = np.asarray(X @ clf.coef_.T) + clf.intercept_
+    return logits_to_probabilities(logits, is_ovr(clf))
+
+
+class HierarchicalClassifier(BaseEstimator, ClassifierMixin):
+    def __init__(self, groups: Optional[Dict[str, str]] = None, n_groups: Optional[int] = None,
+                 beam: int = 2, C: float = 1.0, max_iter: int = 1000, random_state=None):
+        """Two-level classifier: P(disease) = P(group) * P(disease | group).
+
+        groups maps each disease to a group name (e.g. its ICD chapter); without
+        it classes are clustered into n_groups (default sqrt of the class count).
+        top_k only scores the `beam` most likely groups, so a request touches
+        O(groups + beam x group size) weights instead of every class.
+        """
+        self.groups = groups
+        self.n_groups = n_groups
+        self.beam = beam
+        self.C = C
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    def _linear(self):
+        return LogisticRegression(C=self.C, max_iter=self.max_iter, random_state=self.random_state)
+
+    def fit(self, X, y):
+        self.classes_, y_index = np.unique(np.asarray(y), return_inverse=True)
+        n_classes = len(self.classes_)
+
+        if self.groups is not None:
+            # Labels are matched ignoring surrounding whitespace, as CSV exports vary
+            groups = {str(disease).strip(): group for disease, group in self.groups.items()}
+            missing = [str(c) for c in self.classes_ if str(c).strip() not in groups]
+            if missing:
+                raise ValueError(f"No group for diseases: {', '.join(missing)}")
+            self.group_names_, class_group = np.unique(
+                [groups[str(c).strip()] for c in self.classes_], return_inverse=True
+            )
+        else:
+            n_groups = min(self.n_groups or max(1, int(round(np.sqrt(n_classes)))), n_classes)
+            class_group = auto_groups(X, y_index, n_classes, n_groups, self.random_state)
+            self.group_names_ = np.array([f"group_{g}" for g in range(n_groups)])
+        self.class_group_ = np.asarray(class_group)
+
+        row_group = self.class_group_[y_index]
+        self.group_clf_ = self._linear().fit(X, row_group) if len(np.unique(row_group)) > 1 else None
+
+        # members_[g] lists class indices in the column order of within_clf_[g]
+        self.members_: List[np.ndarray] = []
+        self.within_clf_ = []
+        for g in range(len(self.group_names_)):
+            rows = row_group == g
+            members = np.unique(y_index[rows]) if rows.any() else np.nonzero(self.class_group_ == g)[0]
+            if len(members) > 1:
+                clf = self._linear().fit(X[rows], y_index[rows])
+                members = clf.classes_
+            else:
+                clf = None
+            self.members_.append(np.asarray(members))
+            self.within_clf_.append(clf)
+        return self
+
+    def _group_probabilities(self, X) -> np.ndarray:
+        n_groups = len(self.group_names_)
+        if self.group_clf_ is None:
+            only = np.zeros((X.shape[0], n_groups))
+            only[:, np.unique(self.class_group_)[0]] = 1.0
+            return only
+        probabilities = np.zeros((X.shape[0], n_groups))
+        probabilities[:, self.group_clf_.classes_] = linear_probabilities(self.group_clf_, X)
+        return probabilities
+
+    def _within(self, g: int, X) -> np.ndarray:
+        if self.within_clf_[g] is None:
+            return np.ones((X.shape[0], 1))
+        return linear_probabilities(self.within_clf_[g], X)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Dense probabilities over every class (tables, calibration); prefer top_k when serving"""
+        group_probabilities = self._group_probabilities(X)
+        probabilities = np.zeros((X.shape[0], len(self.classes_)))
+        for g, members in enumerate(self.members_):
+            if len(members):
+                probabilities[:, members] = group_probabilities[:, [g]] * self._within(g, X)
+        return probabilities
+
+    def predict(self, X) -> np.ndarray:
+        indices, _ = self.top_k(X, 1)
+        return self.classes_[[row[0] for row in indices]]
+
+    def top_k(self, X, k: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Best k class indices and probabilities per row, scoring only the beam's groups"""
+        group_probabilities = self._group_probabilities(X)
+        beams = top_k_indices(group_probabilities, min(self.beam, group_probabilities.shape[1]))
+
+        candidates = [[] for _ in range(X.shape[0])]
+        scores = [[] for _ in range(X.shape[0])]
+        for g in np.unique(beams):
+            rows = np.nonzero((beams == g).any(axis=1))[0]
+            if not len(self.members_[g]):
+                continue
+            # Single-request calls skip scipy's comparatively slow row indexing
+            within = self._within(g, X if len(rows) == X.shape[0] else X[rows])
+            for row, probabilities in zip(rows, within):
+                candidates[row].append(self.members_[g])
+                scores[row].append(group_probabilities[row, g] * probabilities)
+
+        indices, top_probabilities = [], []
+        for row_candidates, row_scores in zip(candidates, scores):
+            row_candidates = np.concatenate(row_candidates)
+            row_scores = np.concatenate(row_scores)
+            best = top_k_indices(row_scores, k)
+            indices.append(row_candidates[best])
+            top_probabilities.append(row_scores[best])
+        return indices, top_probabilities
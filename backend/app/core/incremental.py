@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def supports_incremental(vectorizer, classifier) -> bool:
+    """Only unigram word analyzers keep per-term contributions additive"""
+    return (
+        getattr(vectorizer, "analyzer", None) == "word"
+        and tuple(getattr(vectorizer, "ngram_range", (1, 1))) == (1, 1)
+        and getattr(vectorizer, "norm", "l2") in ("l2", None)
+        and hasattr(classifier, "coef_")
+    )
+
+
+def is_ovr(classifier) -> bool:
+    """Mirror LogisticRegression.predict_proba's choice between OvR and softmax"""
+    multi_class = getattr(classifier, "multi_class", "auto")
+    if multi_class in ("ovr", "warn"):
+        return True
+    if multi_class == "multinomial":
+        return False
+    return len(classifier.classes_) <= 2 or getattr(classifier, "solver", None) == "liblinear"
+
+
+def logits_to_probabilities(logits: np.ndarray, ovr: bool) -> np.ndarray:
+    """Class probabilities from decision values, as LogisticRegression computes them"""
+    if logits.shape[-1] == 1:
+        positive = 1.0 / (1.0 + np.exp(-logits[..., 0]))
+        return np.stack([1.0 - positive, positive], axis=-1)
+    if ovr:
+        scores = 1.0 / (1.0 + np.exp(-logits))
+        return scores / scores.sum(axis=-1, keepdims=True)
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+def idf_weights(vectorizer) -> Optional[np.ndarray]:
+    """IDF vector exactly as the vectorizer's transform applies it (None when it skips IDF)"""
+    transformer = getattr(vectorizer, "_tfidf", vectorizer)
+    # Pickles from older scikit-learn lack idf_, and newer releases then transform without IDF
+    return getattr(transformer, "idf_", None)
+
+
+class IncrementalPrediction:
+    def __init__(self, vectorizer, classifier):
+        """Prediction state for one conversation over a TF-IDF + linear pipeline.
+
+        Keeps the unnormalized per-class dot products and the squared L2 norm
+        of the TF-IDF vector, so adding or removing a term costs
+        O(tokens x classes) and re-normalizing is a single division.
+        """
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.idf = idf_weights(vectorizer)
+        self.sublinear_tf = getattr(vectorizer, "sublinear_tf", False)
+        self.binary = getattr(vectorizer, "binary", False)
+        self.normalize = getattr(vectorizer, "norm", "l2") == "l2"
+        self.coef = classifier.coef_
+        self.intercept = np.asarray(classifier.intercept_, dtype=float)
+        self.classes = classifier.classes_
+        self.ovr = is_ovr(classifier)
+
+        self.lock = threading.Lock()
+        self.terms: Dict[str, int] = {}
+        self.counts: Dict[int, int] = {}
+        self.scores = np.zeros(self.coef.shape[0])
+        self.norm_sq = 0.0
+
+    def _weight(self, feature: int, count: int) -> float:
+        """TF-IDF value (before normalization) for a raw token count"""
+        if count <= 0:
+            return 0.0
+        if self.binary:
+            tf = 1.0
+        elif self.sublinear_tf:
+            tf = 1.0 + math.log(count)
+        else:
+            tf = float(count)
+        return tf * self.idf[feature] if self.idf is not None else tf
+
+    def _apply(self, term: str, delta: int) -> None:
+        for token in self.analyzer(term):
+            feature = self.vocabulary.get(token)
+            if feature is None:
+                continue
+            old = self.counts.get(feature, 0)
+            new = old + delta
+            old_weight = self._weight(feature, old)
+            new_weight = self._weight(feature, new)
+            if new_weight != old_weight:
+                self.scores += self.coef[:, feature] * (new_weight - old_weight)
+                self.norm_sq += new_weight * new_weight - old_weight * old_weight
+            if new:
+                self.counts[feature] = new
+            else:
+                del self.counts[feature]
+
+    def add_terms(self, terms: Iterable[str]) -> None:
+        for term in terms:
+            if term not in self.terms:
+                self.terms[term] = 1
+                self._apply(term, 1)
+
+    def remove_terms(self, terms: Iterable[str]) -> None:
+        for term in terms:
+            if self.terms.pop(term, None) is not None:
+                self._apply(term, -1)
+
+    def update(self, terms: Iterable[str]) -> None:
+        """Move the state to exactly this term set, touching only the difference"""
+        terms = set(terms)
+        self.remove_terms([term for term in self.terms if term not in terms])
+        self.add_terms(terms)
+
+    def probabilities(self) -> np.ndarray:
+        if not self.counts:
+            # Guard against float drift once every term has been removed
+            self.scores[:] = 0.0
+            self.norm_sq = 0.0
+        scores = self.scores
+        if self.normalize and self.norm_sq > 0:
+            scores = scores / math.sqrt(self.norm_sq)
+        return logits_to_probabilities(scores + self.intercept, self.ovr)
+
+
+class ConversationPredictions:
+    def __init__(self, factory, max_conversations: int = 10000, ttl: float = 3600.0):
+        """Bounded LRU of per-conversation prediction states"""
+        self.factory = factory
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, conversation_id: str) -> Optional[IncrementalPrediction]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._states.get(conversation_id)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._states.move_to_end(conversation_id)
+                self._states[conversation_id] = (entry[0], now)
+                return entry[0]
+            state = self.factory()
+            if state is None:
+                return None
+            self._states[conversation_id] = (state, now)
+            self._states.move_to_end(conversation_id)
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+            return state
+
+    def __len__(self) -> int:
+        return len(self._states)
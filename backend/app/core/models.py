@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownModel(KeyError):
+    """Raised when a request names a model that is not in the registry"""
+
+
+def normalize_specs(models: Dict[str, Any]) -> Dict[str, Dict[str, Optional[str]]]:
+    """Registry entries as {"path", "table", "cascade"}; a bare string is the model path"""
+    specs = {}
+    for name, spec in models.items():
+        if isinstance(spec, str):
+            spec = {"path": spec}
+        if not isinstance(spec, dict) or not spec.get("path"):
+            raise ValueError(f"Model {name!r} needs a path")
+        specs[str(name)] = {"path": spec["path"], "table": spec.get("table"), "cascade": spec.get("cascade")}
+    return specs
+
+
+class _Resident:
+    def __init__(self, predictor, nbytes: int):
+        self.predictor = predictor
+        self.nbytes = nbytes
+
+
+class ModelManager:
+    def __init__(self, models: Dict[str, Any], memory_budget: int,
+                 loader: Callable[..., Any], size_of: Callable[[Any], int]):
+        """Named models loaded on first use and kept resident within a memory budget.
+
+        loader(path, table, cascade) builds a predictor and size_of estimates
+        its footprint in bytes. When the resident set exceeds memory_budget the
+        least recently used models are dropped (requests still holding one
+        finish with it) and are loaded again on their next use. Concurrent
+        first requests for a model share a single load.
+        """
+        self.specs = normalize_specs(models)
+        self.memory_budget = int(memory_budget)
+        self.loader = loader
+        self.size_of = size_of
+        self._lock = threading.Lock()
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._models = {name: {"loads": 0, "hits": 0, "evictions": 0, "load_errors": 0,
+                               "last_load_ms": None, "total_load_ms": 0.0} for name in self.specs}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def get(self, name: str):
+        """The predictor for name, loading it (once, across threads) when not resident"""
+        if name not in self.specs:
+            raise UnknownModel(name)
+        with self._lock:
+            resident = self._resident.get(name)
+            if resident is not None:
+                self._resident.move_to_end(name)
+                self._models[name]["hits"] += 1
+                return resident.predictor
+        return self._flight.do(name, lambda: self._load(name))
+
+    def _load(self, name: str):
+        with self._lock:
+            # Another load may have finished between the residency check and the flight
+            resident = self._resident.get(name)
+            if resident is not None:
+                self._resident.move_to_end(name)
+                self._models[name]["hits"] += 1
+                return resident.predictor
+
+        spec = self.specs[name]
+        start = time.perf_counter()
+        try:
+            predictor = self.loader(spec["path"], spec["table"], spec["cascade"])
+        except Exception:
+            with self._lock:
+                self._models[name]["load_errors"] += 1
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        nbytes = int(self.size_of(predictor))
+
+        with self._lock:
+            stats = self._models[name]
+            stats["loads"] += 1
+            stats["last_load_ms"] = elapsed_ms
+            stats["total_load_ms"] += elapsed_ms
+            self._resident[name] = _Resident(predictor, nbytes)
+            self._evict(keep=name)
+        logger.info(f"Loaded model {name} from {spec['path']} in {elapsed_ms:.1f} ms ({nbytes} bytes)")
+        return predictor
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used models until the budget holds (caller holds the lock)"""
+        while self._resident_bytes() > self.memory_budget and len(self._resident) > 1:
+            name = next(iter(self._resident))
+            if name == keep:
+                self._resident.move_to_end(name)
+                continue
+            evicted = self._resident.pop(name)
+            self._models[name]["evictions"] += 1
+            logger.info(f"Evicted model {name} ({evicted.nbytes} bytes) to stay within the memory budget")
+        if self._resident_bytes() > self.memory_budget:
+            logger.warning(f"Model {keep} alone exceeds the memory budget of {self.memory_budget} bytes")
+
+    def _resident_bytes(self) -> int:
+        return sum(resident.nbytes for resident in self._resident.values())
+
+    def evict(self, name: str) -> bool:
+        """Drop a model from memory now; it is reloaded on its next use"""
+        with self._lock:
+            return self._resident.pop(name, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for name, counters in self._models.items():
+                resident = self._resident.get(name)
+                models[name] = dict(
+                    counters,
+                    path=os.fspath(self.specs[name]["path"]),
+                    resident=resident is not None,
+                    bytes=resident.nbytes if resident is not None else None
+                )
+            return {
+                "memory_budget_bytes": self.memory_budget,
+                "resident_bytes": self._resident_bytes(),
+                "resident": list(self._resident),
+                "models": models,
+            }
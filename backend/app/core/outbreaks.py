@@ -0,0 +1,368 @@
+import json
+import math
+import os
+import threading
+import time
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import OUTBREAKS
+from .background import BackgroundBatcher
+from .rollups import RollupStore, initialize_rollups
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_REGION = "unknown"
+SNAPSHOT_PREFIX = "worker-"
+
+
+class _Series:
+    """Detector state of one disease x region series: a handful of numbers and the held-back buckets"""
+    __slots__ = ("epoch", "count", "mean", "var", "cusum", "buckets", "last_z", "held")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.buckets = 0
+        self.last_z = 0.0
+        self.held = []
+
+
+class OutbreakDetector:
+    def __init__(self, bucket_seconds: int = 3600, alpha: float = 0.02, k: float = 0.5, h: float = 8.0,
+                 warmup: int = 24, min_count: int = 5, max_series: int = 2048, max_alerts: int = 100):
+        """EWMA baseline plus one-sided CUSUM on per-bucket prediction counts, per disease and region.
+
+        observe() is O(1): it bumps the count of the series' open bucket and,
+        when a newer bucket starts, scores the closed one. A bucket's z-score
+        uses the EWMA mean and variance (floored at the mean, as for Poisson
+        counts); CUSUM accumulates z - k and alerts once it reaches h after
+        warmup buckets, then restarts. While CUSUM is above zero the baseline
+        is frozen: buckets are held back and join it only once CUSUM returns
+        to zero, and are dropped when the rise alerts, so an outbreak never
+        becomes the new normal and ordinary noise does not bias it low.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.k = k
+        self.h = h
+        self.warmup = warmup
+        self.min_count = min_count
+        self.max_series = max_series
+        # Past this many empty buckets the EWMA state has decayed to its limit
+        self.max_gap = max(warmup, int(math.ceil(5 / alpha)))
+        self.series: Dict[Tuple[str, str], _Series] = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self.stats = {"observed": 0, "buckets": 0, "alerts": 0, "overflow": 0}
+        self._advanced = None
+
+    def observe(self, disease: str, region: Optional[str], timestamp: float, count: int = 1) -> None:
+        key = (disease, region or UNKNOWN_REGION)
+        epoch = int(timestamp // self.bucket_seconds)
+        state = self.series.get(key)
+        if state is None:
+            if len(self.series) >= self.max_series:
+                self.stats["overflow"] += 1
+                return
+            state = self.series[key] = _Series(epoch)
+        elif epoch > state.epoch:
+            self._close(key, state, epoch)
+        # Late arrivals for an already closed bucket count towards the open one
+        state.count += count
+        self.stats["observed"] += count
+
+    def advance(self, timestamp: float) -> None:
+        """Close the buckets of every series that has seen no prediction since they ended"""
+        epoch = int(timestamp // self.bucket_seconds)
+        if epoch == self._advanced:
+            return
+        self._advanced = epoch
+        for key, state in self.series.items():
+            if epoch > state.epoch:
+                self._close(key, state, epoch)
+
+    def _close(self, key: Tuple[str, str], state: _Series, epoch: int) -> None:
+        """Score the open bucket, then the empty buckets up to epoch (at most max_gap of them)"""
+        self._score(key, state, state.count, state.epoch)
+        gap = epoch - state.epoch - 1
+        for offset in range(min(gap, self.max_gap)):
+            self._score(key, state, 0, epoch - min(gap, self.max_gap) + offset)
+        state.epoch = epoch
+        state.count = 0
+
+    def _score(self, key: Tuple[str, str], state: _Series, count: int, epoch: int) -> None:
+        z = (count - state.mean) / math.sqrt(max(state.var, state.mean, 1.0))
+        state.last_z = z
+        self.stats["buckets"] += 1
+        if state.buckets >= self.warmup:
+            state.cusum = max(0.0, state.cusum + z - self.k)
+            if state.cusum >= self.h and count >= self.min_count:
+                self.stats["alerts"] += 1
+                self.alerts.append({
+                    "disease": key[0],
+                    "region": key[1],
+                    "bucket_start": epoch * self.bucket_seconds,
+                    "observed": count,
+                    "expected": state.mean,
+                    "z": z,
+                    "cusum": state.cusum,
+                })
+                logger.warning(f"Outbreak alert: {key[0]} in {key[1]}, {count} predictions "
+                               f"(expected {state.mean:.1f}, CUSUM {state.cusum:.1f})")
+                state.cusum = 0.0
+                # The held buckets were the rise that led here: none of it joins the baseline
+                state.held.clear()
+                return
+            if state.cusum > 0:
+                # Held back until CUSUM returns to zero (noise) or alerts (outbreak)
+                state.held.append(count)
+                if len(state.held) > self.warmup:
+                    # A rise this long without an alert is a slow shift the baseline should follow
+                    self._update(state, state.held.pop(0))
+                return
+            for held in state.held:
+                self._update(state, held)
+            state.held.clear()
+        self._update(state, count)
+
+    def _update(self, state: _Series, count: int) -> None:
+        diff = count - state.mean
+        # Plain averages until the EWMA has enough history to be meaningful
+        weight = max(self.alpha, 1.0 / (state.buckets + 1))
+        state.mean += weight * diff
+        state.var = (1 - weight) * (state.var + weight * diff * diff)
+        state.buckets += 1
+
+    def scores(self, now: Optional[float] = None,
+               current_counts: Optional[Dict[Tuple[str, str], int]] = None) -> List[Dict[str, Any]]:
+        """Current state per series, with the open bucket's count so far scored against the baseline.
+
+        current_counts gives the open bucket's counts when they are kept
+        outside the detector; series seen there first are listed too.
+        """
+        now = time.time() if now is None else now
+        current = int(now // self.bucket_seconds)
+        series = dict(self.series)
+        for key in current_counts or ():
+            if key not in series and len(series) < self.max_series:
+                series[key] = _Series(current)
+        result = []
+        for (disease, region), state in series.items():
+            if current_counts is not None:
+                count = current_counts.get((disease, region), 0)
+            else:
+                count = state.count if state.epoch == current else 0
+            result.append({
+                "disease": disease,
+                "region": region,
+                "expected": state.mean,
+                "current_count": count,
+                "current_z": (count - state.mean) / math.sqrt(max(state.var, state.mean, 1.0)),
+                "last_z": state.last_z,
+                "cusum": state.cusum,
+                "warmed_up": state.buckets >= self.warmup,
+            })
+        return result
+
+
+class OutbreakMonitor:
+    def __init__(self, detector: OutbreakDetector, rollups: RollupStore, directory, settle_seconds: float = 60.0,
+                 flush_interval: float = 0.5):
+        """Score the prediction counts of all workers together and publish the detector's state.
+
+        A detector fed by one worker would see 1/N of the traffic, so each
+        alert would need an N times larger rise. Instead, once a bucket has
+        closed (and settle_seconds have let in-flight requests land), the
+        background thread reads that bucket's counts summed over every worker
+        from the rollup store and scores them. Every worker reaches the same
+        state; a request only compares the clock with the next due time.
+        Each worker writes a JSON snapshot to directory for queries to merge.
+        """
+        if detector.bucket_seconds % rollups.bucket_seconds:
+            raise ValueError(f"bucket_seconds must be a multiple of the rollups' {rollups.bucket_seconds} seconds")
+        self.detector = detector
+        self.rollups = rollups
+        self.directory = Path(directory)
+        self.settle_seconds = settle_seconds
+        self._scored = None
+        self._due = 0.0
+        self._lock = threading.Lock()
+        self._batcher = BackgroundBatcher(self._process, 4, 1, flush_interval, "outbreak-detector")
+
+    def tick(self, now: Optional[float] = None) -> bool:
+        """Hand scoring to the background thread when a bucket is due; True when it was queued"""
+        now = time.time() if now is None else now
+        if now < self._due:
+            return False
+        # Retried after settle_seconds should the scoring fail or the queue be full
+        self._due = now + self.settle_seconds
+        return self._batcher.submit(now)
+
+    def _process(self, batch) -> None:
+        with self._lock:
+            self._score(time.time())
+            self.publish()
+
+    def _score(self, now: float) -> None:
+        """Score the settled buckets after the last one scored, oldest first (caller holds the lock)"""
+        bucket = self.detector.bucket_seconds
+        ready = int((now - self.settle_seconds) // bucket) - 1
+        self._due = (ready + 2) * bucket + self.settle_seconds
+        # The first bucket still wholly inside the rollups' retention
+        kept = (int(now // self.rollups.bucket_seconds) - self.rollups.buckets + 1) * self.rollups.bucket_seconds
+        first = -(-kept // bucket)
+        if self._scored is not None:
+            first = max(first, self._scored + 1)
+        if first > ready:
+            return
+        counts = self.rollups.series_counts(first, ready, bucket)
+        for offset, epoch in enumerate(range(first, ready + 1)):
+            for (disease, region), series in counts.items():
+                if series[offset]:
+                    self.detector.observe(disease, region, epoch * bucket, int(series[offset]))
+            self.detector.advance((epoch + 1) * bucket)
+        self._scored = ready
+
+    def _scored_until(self) -> Optional[int]:
+        return (self._scored + 1) * self.detector.bucket_seconds if self._scored is not None else None
+
+    def publish(self) -> None:
+        """Write this worker's snapshot (caller holds the lock)"""
+        now = time.time()
+        bucket = self.detector.bucket_seconds
+        current = int(now // bucket)
+        counts = self.rollups.series_counts(current, current, bucket)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        snapshot = {
+            "pid": os.getpid(),
+            "published": now,
+            "bucket_seconds": bucket,
+            "scored_until": self._scored_until(),
+            "series": self.detector.scores(now, {key: int(series[0]) for key, series in counts.items()}),
+            "alerts": list(self.detector.alerts),
+        }
+        path = self.directory / f"{SNAPSHOT_PREFIX}{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot))
+        os.replace(tmp, path)
+
+    def refresh(self) -> None:
+        """Score finished buckets and publish now (the worker answering a query is never stale)"""
+        with self._lock:
+            self._score(time.time())
+            self.publish()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        return self._batcher.drain(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.detector.stats)
+            stats["series"] = len(self.detector.series)
+            stats["scored_until"] = self._scored_until()
+        stats["queue"] = self._batcher.stats()
+        return stats
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_outbreaks(directory, max_age: Optional[float] = None) -> Dict[str, Any]:
+    """Merge the workers' snapshots: the scores of the most up to date worker and every alert once.
+
+    Workers score the same summed counts, so they agree apart from how far
+    they have got. Scores come from running workers only; alerts of exited
+    workers are kept until their snapshot is older than max_age seconds,
+    then the file is removed.
+    """
+    directory = Path(directory)
+    latest = None
+    alerts = {}
+    workers = 0
+    paths = sorted(directory.glob(f"{SNAPSHOT_PREFIX}*.json")) if directory.is_dir() else []
+    for path in paths:
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for alert in snapshot["alerts"]:
+            alerts[(alert["disease"], alert["region"], alert["bucket_start"])] = alert
+        if not _alive(snapshot["pid"]):
+            if max_age is not None and time.time() - snapshot["published"] > max_age:
+                path.unlink(missing_ok=True)
+            continue
+        workers += 1
+        rank = (snapshot.get("scored_until") or 0, snapshot["published"])
+        if latest is None or rank > latest[0]:
+            latest = (rank, snapshot["series"])
+    series = latest[1] if latest is not None else []
+    return {
+        "series": sorted(series, key=lambda entry: (-entry["cusum"], -entry["current_z"])),
+        "alerts": sorted(alerts.values(), key=lambda alert: alert["bucket_start"]),
+        "workers": workers,
+    }
+
+
+# Global outbreak monitor instance
+_monitor = None
+
+def initialize_outbreak_monitor() -> Optional[OutbreakMonitor]:
+    """Initialize the global outbreak monitor (None when disabled)"""
+    global _monitor
+    if _monitor is None and OUTBREAKS["enabled"]:
+        rollups = initialize_rollups()
+        if rollups is None:
+            logger.warning("Outbreak detection reads the prediction rollups; it is off while ROLLUPS_ENABLED is false")
+            return None
+        detector = OutbreakDetector(
+            bucket_seconds=OUTBREAKS["bucket_seconds"],
+            alpha=OUTBREAKS["alpha"],
+            k=OUTBREAKS["k"],
+            h=OUTBREAKS["h"],
+            warmup=OUTBREAKS["warmup_buckets"],
+            min_count=OUTBREAKS["min_count"],
+            max_series=OUTBREAKS["max_series"],
+            max_alerts=OUTBREAKS["max_alerts"]
+        )
+        _monitor = OutbreakMonitor(
+            detector,
+            rollups,
+            OUTBREAKS["directory"],
+            settle_seconds=OUTBREAKS["settle_seconds"],
+            flush_interval=OUTBREAKS["flush_interval"]
+        )
+    return _monitor
+
+def check_outbreaks() -> None:
+    """Let the monitor score buckets that closed since it last looked (the counts come from the rollups)"""
+    monitor = initialize_outbreak_monitor()
+    if monitor is not None:
+        monitor.tick()
+
+def current_outbreaks(disease: Optional[str] = None, region: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    monitor = initialize_outbreak_monitor()
+    if monitor is None:
+        return None
+    monitor.refresh()
+    result = read_outbreaks(OUTBREAKS["directory"], max_age=OUTBREAKS["snapshot_max_age"])
+
+    def keep(entry):
+        return (disease is None or entry["disease"] == disease) and (region is None or entry["region"] == region)
+    result["series"] = [entry for entry in result["series"] if keep(entry)]
+    result["alerts"] = [alert for alert in result["alerts"] if keep(alert)]
+    return result
+
+def outbreak_stats() -> Optional[Dict[str, Any]]:
+    return _monitor.stats() if _monitor is not None else None
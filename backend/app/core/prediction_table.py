@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+from itertools import combinations, islice
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional
+
+import numpy as np
+
+from config.settings import MEDICAL_TERMS
+from .topk import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+TABLE_VERSION = 1
+# Feature ids are packed into 16-bit fields of a u8 key, so at most four terms
+MAX_TABLE_TERMS = 4
+TOP_K = 3
+MIN_CONFIDENCE = 0.1
+NO_CLASS = 0xFFFF
+
+TABLE_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("cls", "<u2", (TOP_K,)),
+    ("prob", "<f4", (TOP_K,)),
+])
+
+
+def model_fingerprint(model_path) -> str:
+    """SHA-256 of the model file; a table is only valid for the exact pickle it was built from"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pack_key(features: Iterable[int]) -> int:
+    """Sorted feature ids (+1, so 0 marks an empty field) packed into one integer"""
+    key = 0
+    for feature in sorted(features):
+        key = (key << 16) | (feature + 1)
+    return key
+
+
+def sidecar_path(table_path) -> Path:
+    return Path(table_path).with_suffix(".json")
+
+
+def build_prediction_table(pipeline, max_terms: int = 3, batch_size: int = 4096,
+                           terms: Optional[Iterable[str]] = None, max_rows: int = 1000000) -> np.ndarray:
+    """Score every combination of symptom terms covering up to max_terms vocabulary tokens, sorted by key.
+
+    terms defaults to the canonical MEDICAL_TERMS; each one stands for the
+    vocabulary tokens it analyzes to. Combinations are streamed to the model
+    in batches, and a build that could exceed max_rows is refused up front.
+    """
+    if not 0 < max_terms <= MAX_TABLE_TERMS:
+        raise ValueError(f"max_terms must be between 1 and {MAX_TABLE_TERMS}")
+    vectorizer = pipeline.named_steps["tfidf"]
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    if len(vocabulary) >= NO_CLASS:
+        raise ValueError("Vocabulary too large for 16-bit feature ids")
+
+    # Terms reduce to their known tokens; terms with the same tokens answer alike, so one of them is kept
+    units: Dict[tuple, str] = {}
+    for term in sorted(MEDICAL_TERMS if terms is None else terms):
+        features = tuple(sorted({vocabulary[token] for token in analyzer(term) if token in vocabulary}))
+        if features and len(features) <= max_terms:
+            units.setdefault(features, term)
+    units = list(units.items())
+    bound = sum(math.comb(len(units), size) for size in range(max_terms + 1))
+    if bound > max_rows:
+        raise ValueError(f"{len(units)} terms give up to {bound} symptom sets, more than max_rows ({max_rows})")
+
+    def symptom_sets():
+        for size in range(max_terms + 1):
+            for combo in combinations(units, size):
+                features = [feature for unit, _ in combo for feature in unit]
+                # Repeated tokens change the TF weights; only sets are tabulated
+                if len(features) <= max_terms and len(set(features)) == len(features):
+                    yield features, ", ".join(term for _, term in combo)
+
+    table = np.zeros(bound, dtype=TABLE_DTYPE)
+    rows = 0
+    sets = symptom_sets()
+    while True:
+        chunk = list(islice(sets, batch_size))
+        if not chunk:
+            break
+        probabilities = pipeline.predict_proba([text for _, text in chunk])
+        top = top_k_indices(probabilities, TOP_K)
+        top_prob = np.take_along_axis(probabilities, top, axis=1)
+        block = table[rows:rows + len(chunk)]
+        block["key"] = [pack_key(features) for features, _ in chunk]
+        # The confidence cut-off is applied in float64 so float32 storage never flips it
+        block["cls"] = np.where(top_prob > MIN_CONFIDENCE, top, NO_CLASS)
+        block["prob"] = np.where(top_prob > MIN_CONFIDENCE, top_prob, 0.0)
+        rows += len(chunk)
+    # A multi-token term and the combination of its tokens share a key
+    _, first = np.unique(table[:rows]["key"], return_index=True)
+    return table[first]
+
+
+def save_prediction_table(table_path, table: np.ndarray, metadata: Dict[str, Any]) -> None:
+    """Write the table and its sidecar; the sidecar goes last so readers never see a half-built pair"""
+    table_path = Path(table_path)
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(table_path, table)
+    sidecar = sidecar_path(table_path)
+    tmp = sidecar.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(dict(metadata, version=TABLE_VERSION, rows=len(table)), indent=2))
+    tmp.replace(sidecar)
+
+
+class PredictionTable:
+    def __init__(self, table: np.ndarray, vectorizer, classes, max_terms: int):
+        """Exact predictions for small symptom sets, answered by binary search"""
+        self.table = table
+        self.keys = table["key"]
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.classes = list(classes)
+        self.max_terms = max_terms
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "uncovered": 0}
+
+    @classmethod
+    def load(cls, table_path, model, model_path) -> Optional["PredictionTable"]:
+        """Memory-map a table built for this exact model, or None when absent or stale"""
+        table_path = Path(table_path)
+        sidecar = sidecar_path(table_path)
+        if not table_path.exists() or not sidecar.exists():
+            return None
+        metadata = json.loads(sidecar.read_text())
+        if metadata.get("version") != TABLE_VERSION:
+            logger.warning(f"Ignoring prediction table {table_path}: unsupported version")
+            return None
+        if metadata.get("model_sha256") != model_fingerprint(model_path):
+            logger.warning(f"Ignoring prediction table {table_path}: built for a different model")
+            return None
+        if metadata.get("classes") != [str(c) for c in model.classes_]:
+            logger.warning(f"Ignoring prediction table {table_path}: class list differs")
+            return None
+        table = np.load(table_path, mmap_mode="r")
+        logger.info(f"Loaded prediction table {table_path} ({len(table)} rows, up to {metadata['max_terms']} terms)")
+        return cls(table, model.named_steps["tfidf"], model.classes_, metadata["max_terms"])
+
+    def key_for(self, medical_terms: List[str]) -> Optional[int]:
+        """Table key of the vectorized term set, or None when it is not covered"""
+        features = set()
+        for term in medical_terms:
+            for token in self.analyzer(term):
+                feature = self.vocabulary.get(token)
+                if feature is None:
+                    continue
+                if feature in features:
+                    # Repeated tokens change the TF weights; only sets are tabulated
+                    return None
+                features.add(feature)
+        if len(features) > self.max_terms:
+            return None
+        return pack_key(features)
+
+    def lookup(self, medical_terms: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Predictions in DiseasePredictor format, or None to fall back to the model"""
+        key = self.key_for(medical_terms)
+        row = None
+        if key is not None:
+            index = int(np.searchsorted(self.keys, key))
+            if index < len(self.keys) and self.keys[index] == key:
+                row = self.table[index]
+        with self._lock:
+            if row is not None:
+                self._stats["hits"] += 1
+            elif key is None:
+                self._stats["uncovered"] += 1
+            else:
+                self._stats["misses"] += 1
+        if row is None:
+            return None
+        return [
+            {"disease": self.classes[cls], "confidence": float(prob), "symptoms": [], "stage": "table"}
+            for cls, prob in zip(row["cls"], row["prob"])
+            if cls != NO_CLASS
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["hits"] + stats["misses"] + stats["uncovered"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        stats["rows"] = len(self.table)
+        stats["max_terms"] = self.max_terms
+        return stats
@@ -1,18 +1,39 @@
-import joblib
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 import logging
 import os
+import time
+from functools import partial
+from config.settings import CASCADE, CASE_INDEX, INCREMENTAL_PREDICTION, MODEL_REGISTRY, PREDICTION_TABLE, PREDICTOR_MODEL_PATH, SHADOW
+from .attribution import attribute_terms
+from .cascade import Cascade, FirstStage
+from .compact import CompactModel, dense_model_bytes
+from .deadline import check_deadline, current_deadline
+from .tracing import annotate
+from .incremental import ConversationPredictions, IncrementalPrediction, supports_incremental
+from .models import ModelManager
+from .prediction_table import PredictionTable
+from .retrieval import CaseIndex
+from .shadow import ShadowEvaluator
+from .topk import top_k_indices
+from .vocabulary import load_pipeline
 
 logger = logging.getLogger(__name__)
 
 print("=== Running NEW predictor.py version ===")
 
 class DiseasePredictor:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, table_path: Optional[str] = None, cascade_path: Optional[str] = None,
+                 cases_path: Optional[str] = None):
         """Initialize the disease predictor with a trained model pipeline"""
+        self.model_path = model_path
         self.model = self._load_model(model_path)
+        # File name and modification time identify the model build in traces and slow-request entries
+        self.version = f"{os.path.basename(model_path)}@{int(os.path.getmtime(model_path))}"
+        self.table = self._load_table(table_path or PREDICTION_TABLE["path"], model_path)
+        self.cascade = self._load_cascade(cascade_path or CASCADE["path"], model_path)
+        self.cases = self._load_cases(cases_path or CASE_INDEX["path"], model_path)
         logger.info("DiseasePredictor initialized successfully with trained pipeline")
 
     def _load_model(self, model_path: str):
@@ -21,34 +42,142 @@ class DiseasePredictor:
             if not os.path.exists(model_path):
                 logger.error(f"Model file not found at {model_path}. Prediction will not work.")
                 raise FileNotFoundError(f"Model file not found at {model_path}")
+            if str(model_path).endswith(".npz"):
+                logger.info(f"Loading compact model from {model_path}")
+                return CompactModel.load(model_path)
             logger.info(f"Loading model pipeline from {model_path}")
-            return joblib.load(model_path)
+            return load_pipeline(model_path)
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
 
-    def predict(self, medical_terms: List[str]) -> List[Dict[str, Any]]:
-        """Predict diseases based on symptoms using the trained pipeline"""
+    def _load_table(self, table_path: str, model_path: str) -> Optional[PredictionTable]:
+        """Load the precomputed prediction table; the model alone still works without it"""
+        if not PREDICTION_TABLE["enabled"] or not hasattr(self.model, "named_steps"):
+            return None
         try:
-            # Join symptoms into a single string for the vectorizer
-            symptoms_text = ", ".join(medical_terms)
-            logger.debug(f"Predicting for symptoms: {symptoms_text}")
-
-            # Get class probabilities
-            probabilities = self.model.predict_proba([symptoms_text])[0]
-            classes = self.model.classes_
-            predictions = []
-
-            # Get top 3 predictions
-            top_indices = np.argsort(probabilities)[-3:][::-1]
-            for idx in top_indices:
-                if probabilities[idx] > 0.1:  # Only include if confidence > 10%
-                    disease = classes[idx]
-                    predictions.append({
-                        "disease": disease,
-                        "confidence": float(probabilities[idx]),
-                        "symptoms": []  # Optionally, map to known symptoms if you want
-                    })
+            return PredictionTable.load(table_path, self.model, model_path)
+        except Exception as e:
+            logger.warning(f"Prediction table unavailable, using the model only: {str(e)}")
+            return None
+
+    def _load_cascade(self, cascade_path: str, model_path: str) -> Optional[Cascade]:
+        """Load the calibrated first stage; without it every request uses the full model"""
+        if not CASCADE["enabled"] or not hasattr(self.model, "named_steps"):
+            return None
+        try:
+            stage = FirstStage.load(cascade_path, self.model, model_path)
+        except Exception as e:
+            logger.warning(f"Cascade first stage unavailable, using the full model only: {str(e)}")
+            return None
+        return Cascade(stage, CASCADE["audit_rate"]) if stage is not None else None
+
+    def _load_cases(self, cases_path: str, model_path: str) -> Optional[CaseIndex]:
+        """Load the similar-case index; predictions work without it"""
+        if not CASE_INDEX["enabled"] or not hasattr(self.model, "named_steps"):
+            return None
+        try:
+            return CaseIndex.load(cases_path, self.model, model_path)
+        except Exception as e:
+            logger.warning(f"Case index unavailable, similar cases disabled: {str(e)}")
+            return None
+
+    def similar_cases(self, medical_terms: List[str], k: int, budget: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Most similar labeled cases, or None without a case index"""
+        if self.cases is None:
+            return None
+        result = self.cases.search(medical_terms, k, budget)
+        return {"cases": result["cases"], "partial": result["partial"]}
+
+    def case_index_stats(self) -> Optional[Dict[str, Any]]:
+        return self.cases.stats() if self.cases is not None else None
+
+    def cascade_stats(self) -> Optional[Dict[str, Any]]:
+        return self.cascade.stats() if self.cascade is not None else None
+
+    def _model_probabilities(self, medical_terms: List[str]):
+        return self.model.predict_proba([", ".join(medical_terms)])[0]
+
+    def _model_probabilities_batch(self, batch: List[List[str]]):
+        return self.model.predict_proba([", ".join(medical_terms) for medical_terms in batch])
+
+    def table_stats(self) -> Optional[Dict[str, Any]]:
+        return self.table.stats() if self.table is not None else None
+
+    def memory_bytes(self) -> int:
+        """Estimated heap footprint of the model (memory-mapped tables are shared and not counted)"""
+        if isinstance(self.model, CompactModel):
+            return self.model.memory_bytes()
+        if self.linear_components() is not None:
+            return dense_model_bytes(self.model)
+        # Other estimators: the pickle size is a fair proxy for their arrays
+        return os.path.getsize(self.model_path)
+
+    def _format_top(self, indices, probabilities, stage: str = "full_model") -> List[Dict[str, Any]]:
+        """Response entries for the best classes, already ordered best first; stage names what scored them"""
+        classes = self.model.classes_
+        predictions = []
+        for idx, probability in zip(indices, probabilities):
+            if probability > 0.1:  # Only include if confidence > 10%
+                predictions.append({
+                    "disease": classes[idx],
+                    "confidence": float(probability),
+                    "symptoms": [],  # Optionally, map to known symptoms if you want
+                    "stage": stage
+                })
+        return predictions
+
+    def _format_predictions(self, probabilities, stage: str = "full_model") -> List[Dict[str, Any]]:
+        """Turn one row of class probabilities into the top-3 response entries"""
+        # Partial sort: only the top 3 of possibly thousands of classes are ordered
+        top_indices = top_k_indices(probabilities, 3)
+        return self._format_top(top_indices, probabilities[top_indices], stage)
+
+    def _top_k_classifier(self):
+        """The pipeline's classifier when it can rank classes without scoring all of them"""
+        steps = getattr(self.model, "named_steps", None)
+        clf = steps.get("clf") if steps else None
+        return clf if hasattr(clf, "top_k") else None
+
+    def _predict_top_k(self, classifier, batch: List[List[str]]) -> List[List[Dict[str, Any]]]:
+        """Hierarchical models: vectorize once, then score only the most likely groups"""
+        X = self.model[:-1].transform([", ".join(medical_terms) for medical_terms in batch])
+        indices, probabilities = classifier.top_k(X, 3)
+        return [self._format_top(i, p) for i, p in zip(indices, probabilities)]
+
+    def predict(self, medical_terms: List[str], explain: bool = False) -> List[Dict[str, Any]]:
+        """Predict diseases based on symptoms; explain fills each entry's contributing symptoms"""
+        predictions = self._predict(medical_terms)
+        if explain:
+            self.explain([medical_terms], [predictions])
+        return predictions
+
+    def explain(self, batch: List[List[str]], results: List[List[Dict[str, Any]]]) -> None:
+        """Fill "symptoms" of each prediction in place (linear pipelines only; others keep [])"""
+        parts = self.linear_components()
+        if parts is not None:
+            attribute_terms(*parts, batch, results)
+
+    def _predict(self, medical_terms: List[str]) -> List[Dict[str, Any]]:
+        try:
+            if self.table is not None:
+                predictions = self.table.lookup(medical_terms)
+                if predictions is not None:
+                    return predictions
+
+            logger.debug(f"Predicting for symptoms: {', '.join(medical_terms)}")
+
+            # Get class probabilities, from the cheap first stage when it is confident (temperature-calibrated)
+            top_k_classifier = self._top_k_classifier()
+            if top_k_classifier is not None:
+                predictions = self._predict_top_k(top_k_classifier, [medical_terms])[0]
+                logger.info(f"Generated predictions: {predictions}")
+                return predictions
+            if self.cascade is not None:
+                probabilities, stage = self.cascade.probabilities(medical_terms, self._model_probabilities)
+            else:
+                probabilities, stage = self._model_probabilities(medical_terms), "full_model"
+            predictions = self._format_predictions(probabilities, stage)
 
             logger.info(f"Generated predictions: {predictions}")
             return predictions
@@ -56,26 +185,211 @@ class DiseasePredictor:
             logger.error(f"Error making predictions: {str(e)}")
             raise
 
+    def linear_components(self):
+        """(vectorizer, classifier) of a unigram TF-IDF + linear pipeline, else None"""
+        steps = getattr(self.model, "named_steps", None)
+        if not steps or "tfidf" not in steps or "clf" not in steps:
+            return None
+        if not supports_incremental(steps["tfidf"], steps["clf"]):
+            return None
+        return steps["tfidf"], steps["clf"]
+
+    def new_incremental_state(self) -> Optional[IncrementalPrediction]:
+        """Fresh per-conversation state, or None when the model is not linear"""
+        parts = self.linear_components()
+        return IncrementalPrediction(*parts) if parts else None
+
+    def predict_incremental(self, state: IncrementalPrediction, medical_terms: List[str]) -> List[Dict[str, Any]]:
+        """Apply only the added/removed terms to the state and predict"""
+        with state.lock:
+            state.update(medical_terms)
+            probabilities = state.probabilities()
+        return self._format_predictions(probabilities)
+
+    def predict_batch(self, batch: List[List[str]], explain: bool = False) -> List[List[Dict[str, Any]]]:
+        """Predict many symptom lists with a single vectorized predict_proba call"""
+        results = self._predict_batch(batch)
+        if explain:
+            self.explain(batch, results)
+        return results
+
+    def _predict_batch(self, batch: List[List[str]]) -> List[List[Dict[str, Any]]]:
+        if not batch:
+            return []
+        try:
+            results = [self.table.lookup(terms) if self.table is not None else None for terms in batch]
+            missing = [i for i, predictions in enumerate(results) if predictions is None]
+            top_k_classifier = self._top_k_classifier()
+            if missing and top_k_classifier is not None:
+                pending = [batch[i] for i in missing]
+                for i, predictions in zip(missing, self._predict_top_k(top_k_classifier, pending)):
+                    results[i] = predictions
+            elif missing:
+                pending = [batch[i] for i in missing]
+                if self.cascade is not None:
+                    probabilities, stages = self.cascade.probabilities_batch(pending, self._model_probabilities_batch)
+                else:
+                    probabilities, stages = self._model_probabilities_batch(pending), ["full_model"] * len(pending)
+                for i, row, stage in zip(missing, probabilities, stages):
+                    results[i] = self._format_predictions(row, stage)
+            return results
+        except Exception as e:
+            logger.error(f"Error making batch predictions: {str(e)}")
+            raise
+
 # Global predictor instance
 _predictor = None
+# Incremental prediction states of HTTP conversations
+_conversations = None
+# Named models from MODEL_REGISTRY, loaded on demand
+_models = None
+# Candidate model compared against the default one off the request path
+_shadow = None
 
-def initialize_predictor(model_path: str = "model/disease_classifier.pkl"):
+def initialize_predictor(model_path: Optional[str] = None):
     """Initialize the global predictor"""
     global _predictor
     if _predictor is None:
         logger.info("Initializing global predictor")
-        _predictor = DiseasePredictor(model_path)
+        _predictor = DiseasePredictor(model_path or PREDICTOR_MODEL_PATH)
     return _predictor
 
-def predict_disease(processed_text: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Predict disease using the global predictor"""
+def _model_manager() -> ModelManager:
+    global _models
+    if _models is None:
+        _models = ModelManager(
+            MODEL_REGISTRY["models"],
+            int(MODEL_REGISTRY["memory_budget_mb"] * 1024 * 1024),
+            loader=DiseasePredictor,
+            size_of=lambda predictor: predictor.memory_bytes()
+        )
+    return _models
+
+def _shadow_evaluator() -> Optional[ShadowEvaluator]:
+    global _shadow
+    if _shadow is None and SHADOW["model_path"]:
+        _shadow = ShadowEvaluator(
+            partial(DiseasePredictor, SHADOW["model_path"], SHADOW["table_path"] or None, SHADOW["cascade_path"] or None),
+            max_queue=SHADOW["queue_size"],
+            batch_size=SHADOW["batch_size"],
+            flush_interval=SHADOW["flush_interval"],
+            sample_rate=SHADOW["sample_rate"]
+        )
+    return _shadow
+
+def has_model(model: Optional[str]) -> bool:
+    """Whether requests may name this model (None is the default model)"""
+    return model is None or model in _model_manager()
+
+def get_predictor(model: Optional[str] = None) -> DiseasePredictor:
+    """The default predictor, or a named one from the registry (raises UnknownModel)"""
+    if model is not None:
+        return _model_manager().get(model)
     global _predictor
     if _predictor is None:
         logger.info("Predictor not initialized, initializing now")
         _predictor = initialize_predictor()
+    return _predictor
+
+def known_diagnoses() -> Set[str]:
+    """Disease names the default model predicts, the labels feedback may confirm"""
+    return {str(c).strip() for c in get_predictor().model.classes_}
+
+def predict_disease(processed_text: Dict[str, Any], model: Optional[str] = None,
+                    explain: bool = False) -> List[Dict[str, Any]]:
+    """Predict disease using the global predictor, or the named model"""
+    # Before get_predictor: a named model may still have to be loaded
+    check_deadline("predict")
+    predictor = get_predictor(model)
     try:
         logger.debug(f"Making prediction for processed text: {processed_text}")
-        return _predictor.predict(processed_text["medical_terms"])
+        annotate("model.version", predictor.version)
+        shadow = _shadow_evaluator() if model is None else None
+        if shadow is None:
+            return predictor.predict(processed_text["medical_terms"], explain)
+        start = time.perf_counter()
+        predictions = predictor.predict(processed_text["medical_terms"])
+        shadow.submit(processed_text["medical_terms"], predictions, (time.perf_counter() - start) * 1000)
+        if explain:
+            predictor.explain([processed_text["medical_terms"]], [predictions])
+        return predictions
     except Exception as e:
         logger.error(f"Error in predict_disease: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+def predict_disease_batch(processed_texts: List[Dict[str, Any]], model: Optional[str] = None,
+                          explain: bool = False) -> List[List[Dict[str, Any]]]:
+    """Predict diseases for several processed texts using the global predictor, or the named model"""
+    check_deadline("predict")
+    predictor = get_predictor(model)
+    batch = [processed["medical_terms"] for processed in processed_texts]
+    shadow = _shadow_evaluator() if model is None else None
+    if shadow is None or not batch:
+        return predictor.predict_batch(batch, explain)
+    results = predictor.predict_batch(batch)
+    # A batch has no per-input latency to compare with the candidate's
+    for medical_terms, predictions in zip(batch, results):
+        shadow.submit(medical_terms, predictions)
+    if explain:
+        predictor.explain(batch, results)
+    return results
+
+def new_prediction_state() -> Optional[IncrementalPrediction]:
+    """Incremental prediction state for a conversation held by the caller"""
+    global _predictor
+    if _predictor is None:
+        _predictor = initialize_predictor()
+    return _predictor.new_incremental_state()
+
+def predict_with_state(state: Optional[IncrementalPrediction], medical_terms: List[str]) -> List[Dict[str, Any]]:
+    """Re-predict a conversation after a turn, falling back to a full run"""
+    global _predictor
+    if _predictor is None:
+        _predictor = initialize_predictor()
+    if state is None:
+        return _predictor.predict(medical_terms)
+    return _predictor.predict_incremental(state, medical_terms)
+
+def predict_conversation(conversation_id: Optional[str], medical_terms: List[str]) -> List[Dict[str, Any]]:
+    """Predict for an HTTP conversation, reusing its server-side incremental state"""
+    global _conversations
+    if _conversations is None:
+        _conversations = ConversationPredictions(
+            new_prediction_state,
+            INCREMENTAL_PREDICTION["max_conversations"],
+            INCREMENTAL_PREDICTION["ttl"]
+        )
+    state = _conversations.get(conversation_id) if conversation_id else new_prediction_state()
+    return predict_with_state(state, medical_terms)
+
+def prediction_table_stats() -> Optional[Dict[str, Any]]:
+    """Hit rate of the precomputed table, None until a predictor with a table is loaded"""
+    return _predictor.table_stats() if _predictor is not None else None
+
+def cascade_stats() -> Optional[Dict[str, Any]]:
+    """First-stage hit rate, agreement and latency, None until a cascade is loaded"""
+    return _predictor.cascade_stats() if _predictor is not None else None
+
+def model_stats() -> Dict[str, Any]:
+    """Residency, memory and load latency of the named models"""
+    return _model_manager().stats()
+
+def shadow_stats() -> Optional[Dict[str, Any]]:
+    """Agreement and latency of the shadow candidate, None when shadowing is off"""
+    shadow = _shadow_evaluator()
+    return shadow.stats() if shadow is not None else None
+
+def find_similar_cases(medical_terms: List[str], k: Optional[int] = None,
+                       model: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Similar past cases within CASE_INDEX's budget (and the request deadline), None without an index"""
+    k = min(max(1, k or CASE_INDEX["top_k"]), CASE_INDEX["max_k"])
+    budget = CASE_INDEX["budget_ms"] / 1000
+    deadline = current_deadline()
+    if deadline is not None:
+        check_deadline("similar_cases")
+        budget = min(budget, deadline.remaining())
+    return get_predictor(model).similar_cases(medical_terms, k, budget)
+
+def case_index_stats() -> Optional[Dict[str, Any]]:
+    """Query latency and pruning of the case index, None until one is loaded"""
+    return _predictor.case_index_stats() if _predictor is not None else None
@@ -0,0 +1,327 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config.settings import PROFILER
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "requests")
+CONTROL_PREFIX = "control-"
+RESULT_PREFIX = "result-"
+WORKER_PREFIX = "worker-"
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, skip: Optional[set] = None) -> Dict[str, Any]:
+    """Statistical profile of every thread of this process, as collapsed stacks.
+
+    Every interval the calling thread reads sys._current_frames() and counts
+    each thread's stack as one "thread:<name>;module:function;..." line (root
+    first, the format flamegraph.pl and speedscope read). The profiled code
+    is not instrumented; the cost is one stack walk per thread per sample.
+    """
+    skip = set(skip or ()) | {threading.get_ident()}
+    counts = Counter()
+    samples = 0
+    names = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            if ident not in names:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(f"thread:{names.get(ident, ident)}")
+            counts[";".join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return {
+        "samples": samples,
+        "output": "".join(f"{stack} {count}\n" for stack, count in counts.most_common()),
+    }
+
+
+class RequestProfiler:
+    def __init__(self):
+        """cProfile of the next K requests to chosen endpoints, merged into one pstats report.
+
+        Unarmed, the request hooks only read one attribute. Each selected
+        request is profiled on its own thread; the profiles are merged under
+        a lock when the request ends.
+        """
+        self.armed = False
+        self._lock = threading.Lock()
+        self._job = None
+        self._remaining = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._profiled = 0
+
+    def arm(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._job = job
+            self._remaining = job["requests"]
+            self._stats = None
+            self._profiled = 0
+            self.armed = True
+
+    def start(self, endpoint: str) -> Optional[cProfile.Profile]:
+        """Begin profiling this request if the armed job wants it"""
+        with self._lock:
+            if not self.armed or endpoint not in self._job["endpoints"] or self._remaining <= 0:
+                return None
+            self._remaining -= 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            with self._lock:
+                self._remaining += 1
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._profiled += 1
+
+    def done(self) -> bool:
+        with self._lock:
+            return self.armed and self._remaining <= 0 and self._profiled >= self._job["requests"]
+
+    def collect(self, top: int = 50) -> Dict[str, Any]:
+        """Disarm and return the merged report (requests still running are left out)"""
+        with self._lock:
+            self.armed = False
+            stats, profiled = self._stats, self._profiled
+            self._stats = None
+        if stats is None:
+            return {"requests": 0, "output": ""}
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(top)
+        return {"requests": profiled, "output": out.getvalue()}
+
+
+class ProfilerControl:
+    def __init__(self, directory, poll_interval: float = 1.0, top: int = 50):
+        """Runs profiling jobs that an admin request left for this worker in directory.
+
+        A job is a control-<pid>.json file naming the target worker, so any
+        worker can start a job on any other. Each worker polls for its file
+        from a daemon thread (started lazily per process) and touches
+        worker-<pid> as a heartbeat; results are written to result-<job>.json.
+        Sampling runs on its own thread, so it also sees a worker whose
+        request threads are stuck.
+        """
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self.top = top
+        self.requests = RequestProfiler()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._active: Optional[Dict[str, Any]] = None
+        self._stats = {"jobs": 0, "errors": 0}
+
+    def ensure_started(self) -> None:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._active = None
+                    self.requests = RequestProfiler()
+                    threading.Thread(target=self._run, name="profiler-control", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Profiler control failed: {str(e)}")
+                with self._lock:
+                    self._stats["errors"] += 1
+            time.sleep(self.poll_interval)
+
+    def control_path(self, pid: int) -> Path:
+        return self.directory / f"{CONTROL_PREFIX}{pid}.json"
+
+    def poll(self) -> None:
+        """Heartbeat, then start a new job or finish the armed request profile"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{WORKER_PREFIX}{os.getpid()}").touch()
+        active = self._active
+        if active is not None:
+            # Sampling jobs finish on their own thread
+            if active["mode"] == "requests" and (self.requests.done() or
+                                                 time.time() >= active["started"] + active["seconds"]):
+                self._finish(active, self.requests.collect(self.top))
+            return
+        try:
+            job = json.loads(self.control_path(os.getpid()).read_text())
+        except (OSError, ValueError):
+            return
+        job["started"] = time.time()
+        with self._lock:
+            self._stats["jobs"] += 1
+        logger.info(f"Starting {job['mode']} profile {job['id']}")
+        self._active = job
+        if job["mode"] == "sample":
+            threading.Thread(target=self._sample, args=(job, threading.get_ident()), name="profiler-sampler",
+                             daemon=True).start()
+        else:
+            self.requests.arm(job)
+
+    def _sample(self, job: Dict[str, Any], control_thread: int) -> None:
+        try:
+            result = sample_stacks(job["seconds"], job["interval_ms"] / 1000, skip={control_thread})
+        except Exception as e:
+            logger.error(f"Sampling profile {job['id']} failed: {str(e)}")
+            with self._lock:
+                self._stats["errors"] += 1
+            result = {"samples": 0, "output": "", "error": str(e)}
+        self._finish(job, result)
+
+    def _finish(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        result = dict(result, id=job["id"], pid=os.getpid(), mode=job["mode"],
+                      format="collapsed" if job["mode"] == "sample" else "pstats",
+                      started=job["started"], finished=time.time())
+        path = self.directory / f"{RESULT_PREFIX}{job['id']}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(result))
+        os.replace(tmp, path)
+        self.control_path(os.getpid()).unlink(missing_ok=True)
+        self._active = None
+        logger.info(f"Finished {job['mode']} profile {job['id']}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["active"] = self._active["id"] if self._active is not None else None
+        return stats
+
+
+def live_workers(directory, max_age: float) -> List[int]:
+    """Pids whose heartbeat is recent; stale heartbeats are removed"""
+    directory = Path(directory)
+    pids = []
+    paths = sorted(directory.glob(f"{WORKER_PREFIX}*")) if directory.is_dir() else []
+    for path in paths:
+        try:
+            fresh = time.time() - path.stat().st_mtime <= max_age
+        except OSError:
+            continue
+        if fresh:
+            pids.append(int(path.name[len(WORKER_PREFIX):]))
+        else:
+            path.unlink(missing_ok=True)
+    return pids
+
+
+def submit_job(directory, pid: int, mode: str, seconds: float, interval_ms: float = 10.0,
+               requests: int = 0, endpoints: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Leave a job for worker pid; raises FileExistsError while that worker has one pending"""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    job = {"id": uuid.uuid4().hex[:16], "pid": pid, "mode": mode, "seconds": seconds, "interval_ms": interval_ms,
+           "requests": requests, "endpoints": endpoints or [], "submitted": time.time()}
+    tmp = directory / f"{CONTROL_PREFIX}{pid}.{job['id']}.tmp"
+    tmp.write_text(json.dumps(job))
+    try:
+        # link() fails if the file exists, so concurrent submissions cannot overwrite each other
+        os.link(tmp, directory / f"{CONTROL_PREFIX}{pid}.json")
+    finally:
+        tmp.unlink(missing_ok=True)
+    return job
+
+
+def read_job(directory, job_id: str) -> Optional[Dict[str, Any]]:
+    """The job's result, {"status": "running"} while it is pending, or None if unknown"""
+    directory = Path(directory)
+    try:
+        return dict(json.loads((directory / f"{RESULT_PREFIX}{job_id}.json").read_text()), status="done")
+    except (OSError, ValueError):
+        pass
+    for path in directory.glob(f"{CONTROL_PREFIX}*.json") if directory.is_dir() else []:
+        try:
+            job = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if job["id"] == job_id:
+            return {"id": job_id, "pid": job["pid"], "mode": job["mode"], "status": "running"}
+    return None
+
+
+def prune(directory, live, max_age: float) -> None:
+    """Remove jobs left for exited workers and results older than max_age"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return
+    for path in directory.glob(f"{CONTROL_PREFIX}*.json"):
+        if int(path.stem[len(CONTROL_PREFIX):]) not in live:
+            path.unlink(missing_ok=True)
+    for path in directory.glob(f"{RESULT_PREFIX}*.json"):
+        try:
+            if time.time() - path.stat().st_mtime > max_age:
+                path.unlink(missing_ok=True)
+        except OSError:
+            continue
+
+
+# Global profiler control instance
+_control = None
+
+def initialize_profiler() -> Optional[ProfilerControl]:
+    """Initialize the global profiler control and its per-process thread (None when disabled)"""
+    global _control
+    if _control is None and PROFILER["enabled"]:
+        _control = ProfilerControl(PROFILER["directory"], PROFILER["poll_interval"], PROFILER["top"])
+    if _control is not None:
+        _control.ensure_started()
+    return _control
+
+def start_profile(pid: int, mode: str, seconds: float, interval_ms: float = 10.0, requests: int = 0,
+                  endpoints: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Queue a job for a live worker (None when profiling is disabled); raises LookupError for unknown pids"""
+    control = initialize_profiler()
+    if control is None:
+        return None
+    live = set(live_workers(control.directory, PROFILER["worker_max_age"])) | {os.getpid()}
+    if pid not in live:
+        raise LookupError(f"No live worker with pid {pid}")
+    prune(control.directory, live, PROFILER["result_max_age"])
+    return submit_job(control.directory, pid, mode, seconds, interval_ms, requests, endpoints)
+
+def profile_job(job_id: str) -> Optional[Dict[str, Any]]:
+    control = initialize_profiler()
+    return read_job(control.directory, job_id) if control is not None else None
+
+def profiler_workers() -> Optional[List[int]]:
+    control = initialize_profiler()
+    return live_workers(control.directory, PROFILER["worker_max_age"]) if control is not None else None
+
+def profiler_stats() -> Optional[Dict[str, Any]]:
+    return _control.stats() if _control is not None else None
@@ -0,0 +1,79 @@
+import re
+import logging
+from typing import Dict, List, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Emergency signs from HealthAssistant ("kapan harus ke dokter" and the health
+# advice), with common spelling variants, mapped to a canonical label
+RED_FLAG_PHRASES = {
+    "sesak nafas": "sesak_nafas",
+    "sesak napas": "sesak_nafas",
+    "sulit bernafas": "sesak_nafas",
+    "sulit bernapas": "sesak_nafas",
+    "nyeri dada": "nyeri_dada",
+    "sakit dada": "nyeri_dada",
+    "kejang": "kejang",
+    "pingsan": "pingsan",
+    "tidak sadar": "pingsan",
+    "kesadaran menurun": "pingsan",
+    "bibir membiru": "bibir_membiru",
+    "muntah darah": "muntah_darah",
+    "diare berdarah": "diare_berdarah",
+}
+
+SAFETY_MESSAGE = (
+    "Gejala yang Anda sebutkan dapat menandakan kondisi darurat. "
+    "Segera ke IGD terdekat atau hubungi layanan gawat darurat 119."
+)
+
+
+class RedFlagDetector:
+    def __init__(self, phrases: Dict[str, str] = None):
+        """Single precompiled alternation so detection is one regex scan"""
+        self.phrases = phrases or RED_FLAG_PHRASES
+        alternatives = sorted(self.phrases, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in alternatives) + r")\b",
+            re.IGNORECASE
+        )
+
+    def detect(self, text: str) -> List[str]:
+        """Return the canonical red flags mentioned in the text"""
+        if not text:
+            return []
+        found = []
+        for match in self._pattern.finditer(text):
+            label = self.phrases[" ".join(match.group(0).lower().split())]
+            if label not in found:
+                found.append(label)
+        return found
+
+
+def safety_response(red_flags: Iterable[str]) -> Dict[str, Any]:
+    """Immediate advice attached to (or returned instead of) the full answer"""
+    return {
+        "red_flags": list(red_flags),
+        "message": SAFETY_MESSAGE,
+        "emergency_number": "119"
+    }
+
+
+# Global detector instance
+_detector = None
+
+
+def initialize_red_flags():
+    global _detector
+    if _detector is None:
+        _detector = RedFlagDetector()
+    return _detector
+
+
+def detect_red_flags(text: str) -> List[str]:
+    """Detect red flags using the global detector"""
+    if _detector is None:
+        initialize_red_flags()
+    if not isinstance(text, str):
+        return []
+    return _detector.detect(text)
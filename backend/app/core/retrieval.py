@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .attribution import tfidf_rows
+from .prediction_table import model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+# Arrays of an index directory, each memory-mapped on load
+INDEX_ARRAYS = ("indptr", "docs", "weights", "max_weights", "labels", "text_offsets", "texts")
+
+
+def _query_vector(vectorizer, medical_terms: List[str]) -> List[Tuple[int, float]]:
+    """(feature, weight) pairs of the L2-normalized TF-IDF query, as the model vectorizes it"""
+    if getattr(vectorizer, "analyzer", None) == "word" and tuple(getattr(vectorizer, "ngram_range", (1, 1))) == (1, 1):
+        _, indices, data, _ = tfidf_rows(vectorizer, [medical_terms])
+    else:
+        row = sparse.csr_matrix(vectorizer.transform([", ".join(medical_terms)]))
+        indices, data = row.indices, row.data
+    return [(int(feature), float(weight)) for feature, weight in zip(indices, data) if weight > 0]
+
+
+def build_case_index(vectorizer, texts: Sequence[str], labels: Sequence[str], classes, directory,
+                     model_path) -> Dict[str, Any]:
+    """Write the inverted index of labeled cases (term -> case ids and TF-IDF weights).
+
+    Posting lists are the CSC columns of the case matrix, so case ids are
+    sorted within each list; max_weights holds each term's largest weight,
+    the per-term upper bound MaxScore needs.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    texts = [str(text) for text in texts]
+    class_index = {str(c).strip(): i for i, c in enumerate(classes)}
+    missing = sorted({str(label) for label in labels if str(label).strip() not in class_index})
+    if missing:
+        raise ValueError(f"Labels not known to the model: {', '.join(missing)}")
+
+    matrix = sparse.csc_matrix(vectorizer.transform(texts), dtype=np.float32)
+    matrix.sort_indices()
+    max_weights = np.zeros(matrix.shape[1], dtype=np.float32)
+    lengths = np.diff(matrix.indptr)
+    nonempty = lengths > 0
+    max_weights[nonempty] = np.maximum.reduceat(matrix.data, matrix.indptr[:-1][nonempty])
+    encoded = [text.encode("utf-8") for text in texts]
+
+    arrays = {
+        "indptr": matrix.indptr.astype(np.int64),
+        "docs": matrix.indices.astype(np.uint32),
+        "weights": matrix.data,
+        "max_weights": max_weights,
+        "labels": np.array([class_index[str(label).strip()] for label in labels], dtype=np.uint32),
+        "text_offsets": np.concatenate([[0], np.cumsum([len(e) for e in encoded])]).astype(np.int64),
+        "texts": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    }
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", array)
+    meta = {
+        "version": INDEX_VERSION,
+        "model_sha256": model_fingerprint(model_path),
+        "classes": [str(c) for c in classes],
+        "cases": len(texts),
+        "postings": int(matrix.nnz),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    (directory / "meta.json").write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+class CaseIndex:
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], vectorizer, latency_window: int = 2048):
+        """Top-k similar labeled cases by cosine similarity, over a memory-mapped inverted index"""
+        self.meta = meta
+        self.vectorizer = vectorizer
+        self.classes = meta["classes"]
+        for name in INDEX_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._lock = threading.Lock()
+        self._latency = deque(maxlen=latency_window)
+        self._stats = {"queries": 0, "partial": 0, "scored": 0, "postings": 0}
+
+    @classmethod
+    def load(cls, directory, model, model_path) -> Optional["CaseIndex"]:
+        """Memory-map an index built for this exact model, or None when absent or stale"""
+        directory = Path(directory)
+        meta_path = directory / "meta.json"
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text())
+        if meta.get("version") != INDEX_VERSION:
+            logger.warning(f"Ignoring case index {directory}: unsupported version")
+            return None
+        if meta.get("model_sha256") != model_fingerprint(model_path):
+            logger.warning(f"Ignoring case index {directory}: built for a different model")
+            return None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in INDEX_ARRAYS}
+        logger.info(f"Loaded case index {directory} ({meta['cases']} cases, {meta['postings']} postings)")
+        return cls(meta, arrays, model.named_steps["tfidf"])
+
+    def case(self, case_id: int, similarity: float) -> Dict[str, Any]:
+        start, end = int(self.text_offsets[case_id]), int(self.text_offsets[case_id + 1])
+        return {
+            "case_id": case_id,
+            "disease": self.classes[int(self.labels[case_id])],
+            "symptoms": bytes(self.texts[start:end]).decode("utf-8"),
+            "similarity": similarity,
+        }
+
+    @staticmethod
+    def _score(lists, candidates: np.ndarray) -> np.ndarray:
+        """Exact cosine scores of sorted candidate ids: one searchsorted per posting list"""
+        scores = np.zeros(len(candidates))
+        for docs, weights, query, _ in lists:
+            scores += CaseIndex._partial_scores(docs, weights, query, candidates)
+        return scores
+
+    @staticmethod
+    def _partial_scores(docs, weights, query: float, candidates: np.ndarray) -> np.ndarray:
+        """One posting list's contribution to sorted candidate ids"""
+        contribution = np.zeros(len(candidates))
+        positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+        hit = docs[positions] == candidates
+        contribution[hit] = query * weights[positions[hit]]
+        return contribution
+
+    @staticmethod
+    def _merge(seed: np.ndarray, essential, non_essential) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted case ids and scores from a merge of short essential lists (seed included)"""
+        docs = np.concatenate([seed] + [np.asarray(docs, dtype=np.int64) for docs, _, _, _ in essential])
+        contributions = np.concatenate([np.zeros(len(seed))] + [query * weights for _, weights, query, _ in essential])
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions, minlength=len(candidates))
+        for docs, weights, query, _ in non_essential:
+            scores += CaseIndex._partial_scores(docs, weights, query, candidates)
+        return candidates, scores
+
+    def _accumulate(self, essential, non_essential) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted case ids and scores from a dense per-case accumulator, for long essential lists"""
+        accumulator = np.zeros(len(self.labels))
+        for docs, weights, query, _ in essential:
+            accumulator[docs] += query * weights
+        found = np.flatnonzero(accumulator)
+        for docs, weights, query, _ in non_essential:
+            # Look the found cases up in the list, or scan the list, whichever touches fewer entries
+            if len(found) * np.log2(len(docs) + 1) < len(docs):
+                accumulator[found] += CaseIndex._partial_scores(docs, weights, query, found)
+            else:
+                hit = accumulator[docs] > 0
+                accumulator[docs[hit]] += query * weights[hit]
+        candidates = np.flatnonzero(accumulator)
+        return candidates, accumulator[candidates]
+
+    def search(self, medical_terms: List[str], k: int = 5, budget: Optional[float] = None) -> Dict[str, Any]:
+        """Top-k cases with MaxScore pruning over the posting lists.
+
+        The list with the highest score upper bound is scored exactly first,
+        which gives a k-th best score. Lists are then split by upper bound:
+        the low-bound lists whose bounds sum to less than that score are
+        non-essential, since a case found only in them cannot reach the top k.
+        Essential lists, best bound first until budget seconds are spent
+        (partial), are summed term-at-a-time: merged when short, into a dense
+        per-case array when long. Non-essential lists only add to the cases
+        found that way.
+        """
+        started = time.perf_counter()
+        lists = []
+        for feature, weight in _query_vector(self.vectorizer, medical_terms):
+            lo, hi = int(self.indptr[feature]), int(self.indptr[feature + 1])
+            if lo < hi:
+                lists.append((self.docs[lo:hi], self.weights[lo:hi], weight,
+                              weight * float(self.max_weights[feature])))
+        postings = sum(len(docs) for docs, _, _, _ in lists)
+
+        candidates = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0)
+        partial = False
+        if lists:
+            lists.sort(key=lambda entry: entry[3])
+            seed = np.asarray(lists[-1][0], dtype=np.int64)
+            seed_scores = self._score(lists, seed)
+            threshold = np.partition(seed_scores, -k)[-k] if len(seed_scores) >= k else 0.0
+            # The longest prefix of low-bound lists whose summed bounds stay below the threshold
+            split = int(np.searchsorted(np.cumsum([entry[3] for entry in lists]), threshold, side="left"))
+
+            essential = []
+            for entry in reversed(lists[split:]):
+                if budget is not None and time.perf_counter() - started > budget:
+                    partial = True
+                    break
+                essential.append(entry)
+            if sum(len(docs) for docs, _, _, _ in essential) * 16 < len(self.labels):
+                candidates, scores = self._merge(seed, essential, lists[:split])
+            else:
+                candidates, scores = self._accumulate(essential, lists[:split])
+            # Exact even when the budget cut the essential lists short
+            scores[np.searchsorted(candidates, seed)] = seed_scores
+
+        scored = len(candidates)
+        if len(scores) > k:
+            # Only the cases tied with or above the k-th best score need ordering
+            keep = scores >= np.partition(scores, -k)[-k]
+            candidates, scores = candidates[keep], scores[keep]
+        # Best scores first, ties to the earlier case
+        order = np.lexsort((candidates, -scores))[:k]
+        order = [i for i in order if scores[i] > 0]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["partial"] += int(partial)
+            self._stats["scored"] += scored
+            self._stats["postings"] += postings
+            self._latency.append(elapsed_ms)
+        return {
+            "cases": [self.case(int(candidates[i]), float(scores[i])) for i in order],
+            "partial": partial,
+            "scored": scored,
+            "postings": postings,
+            "latency_ms": elapsed_ms,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            latency = np.fromiter(self._latency, dtype=np.float64)
+        stats["cases"] = self.meta["cases"]
+        # Cases scored per posting of the query terms
+        stats["scored_ratio"] = stats["scored"] / stats["postings"] if stats["postings"] else None
+        stats["p50_ms"] = float(np.percentile(latency, 50)) if len(latency) else None
+        stats["p99_ms"] = float(np.percentile(latency, 99)) if len(latency) else None
+        return stats
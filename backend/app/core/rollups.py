@@ -0,0 +1,368 @@
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import ROLLUPS
+
+logger = logging.getLogger(__name__)
+
+# Index 0 of each dimension collects keys beyond the table's capacity
+OVERFLOW = "other"
+UNKNOWN_REGION = "unknown"
+WORKER_PREFIX = "worker-"
+
+
+class RollupStore:
+    def __init__(self, directory, bucket_seconds: int = 300, retention_seconds: int = 48 * 3600,
+                 max_diseases: int = 64, regions: Iterable[str] = (), confidence_bins: int = 10,
+                 prune_interval: float = 3600.0):
+        """Per-worker time-bucketed prediction counters in memory-mapped arrays, merged at query time.
+
+        Each worker writes its own directory of .npy ring buffers (one bucket
+        per bucket_seconds, retention_seconds deep), so recording is a few
+        array increments under a thread lock and never waits on other workers.
+        Readers memory-map every worker's arrays; a bucket is only counted
+        while its epoch lies inside the queried range, which is what bounds
+        memory and drops expired data without a cleanup pass.
+
+        Regions are free text from clients, so only the configured regions get
+        a column (matched case-insensitively); anything else is counted as
+        UNKNOWN_REGION and cannot grow the table.
+        """
+        if bucket_seconds <= 0 or retention_seconds < bucket_seconds:
+            raise ValueError("retention_seconds must cover at least one bucket of bucket_seconds")
+        self.directory = Path(directory)
+        self.bucket_seconds = int(bucket_seconds)
+        self.buckets = int(retention_seconds // bucket_seconds)
+        self.max_diseases = max_diseases
+        self.regions = [str(region).strip() for region in regions if str(region).strip()]
+        # Index 0 is the overflow column shared with the disease layout, 1 is UNKNOWN_REGION
+        self._region_names = {region.casefold(): region for region in self.regions}
+        self.max_regions = len(self._region_names) + 2
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self.confidence_bins = confidence_bins
+        self._lock = threading.Lock()
+        self._pid = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._diseases: Dict[str, int] = {}
+        self._regions: Dict[str, int] = {}
+        self._stats = {"recorded": 0, "overflow": 0, "unknown_regions": 0}
+        self._maps: Dict[str, list] = {}
+
+    @property
+    def retention_seconds(self) -> int:
+        return self.buckets * self.bucket_seconds
+
+    def _shapes(self) -> Dict[str, tuple]:
+        return {
+            "epochs": (self.buckets,),
+            "counts": (self.buckets, self.max_diseases, self.max_regions),
+            "histogram": (self.buckets, self.max_diseases, self.confidence_bins),
+            "confidence": (self.buckets, self.max_diseases),
+        }
+
+    def _open(self) -> None:
+        """Create this process's ring buffers (workers forked after import get their own)"""
+        worker = self.directory / f"{WORKER_PREFIX}{os.getpid()}"
+        if worker.exists():
+            shutil.rmtree(worker)  # left behind by an earlier process with a recycled pid
+        worker.mkdir(parents=True)
+        dtypes = {"epochs": np.int64, "counts": np.uint32, "histogram": np.uint32, "confidence": np.float64}
+        # Plain ndarray views of the maps: memmap's Python-level indexing would dominate record()
+        self._arrays = {
+            name: np.lib.format.open_memmap(worker / f"{name}.npy", mode="w+", dtype=dtypes[name],
+                                            shape=shape).view(np.ndarray)
+            for name, shape in self._shapes().items()
+        }
+        self._arrays["epochs"][:] = -1
+        self._diseases = {OVERFLOW: 0}
+        self._regions = {OVERFLOW: 0, UNKNOWN_REGION: 1}
+        for region in self._region_names.values():
+            self._regions.setdefault(region, len(self._regions))
+        self._pid = os.getpid()
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        """Publish the key order; readers ignore a worker until its meta.json exists"""
+        worker = self.directory / f"{WORKER_PREFIX}{self._pid}"
+        meta = {
+            "bucket_seconds": self.bucket_seconds,
+            "diseases": sorted(self._diseases, key=self._diseases.get),
+            "regions": sorted(self._regions, key=self._regions.get),
+        }
+        tmp = worker / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, worker / "meta.json")
+
+    def _key(self, keys: Dict[str, int], name: str, capacity: int) -> int:
+        index = keys.get(name)
+        if index is None:
+            if len(keys) >= capacity:
+                self._stats["overflow"] += 1
+                return 0
+            index = keys[name] = len(keys)
+            self._write_meta()
+        return index
+
+    def canonical_region(self, region: Optional[str]) -> str:
+        """The configured spelling of region, or UNKNOWN_REGION"""
+        if not region:
+            return UNKNOWN_REGION
+        return self._region_names.get(region.strip().casefold(), UNKNOWN_REGION)
+
+    def record(self, disease: str, region: Optional[str], confidence: float, now: Optional[float] = None) -> None:
+        """Count one prediction in the bucket of now"""
+        epoch = int((time.time() if now is None else now) // self.bucket_seconds)
+        slot = epoch % self.buckets
+        bin_index = min(int(confidence * self.confidence_bins), self.confidence_bins - 1)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            a = self._arrays
+            if a["epochs"][slot] != epoch:
+                # The slot still holds a bucket from one retention period ago
+                a["counts"][slot] = 0
+                a["histogram"][slot] = 0
+                a["confidence"][slot] = 0.0
+                a["epochs"][slot] = epoch
+            d = self._key(self._diseases, disease, self.max_diseases)
+            name = self.canonical_region(region)
+            if name == UNKNOWN_REGION and region:
+                self._stats["unknown_regions"] += 1
+            r = self._regions[name]
+            a["counts"][slot, d, r] += 1
+            a["histogram"][slot, d, max(bin_index, 0)] += 1
+            a["confidence"][slot, d] += confidence
+            self._stats["recorded"] += 1
+
+    def _workers(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return [p for p in self.directory.iterdir() if p.name.startswith(WORKER_PREFIX) and (p / "meta.json").exists()]
+
+    def _map_worker(self, worker: Path):
+        """meta.json and read-only maps of a worker's arrays; the maps are reused while the files are"""
+        meta_stat = os.stat(worker / "meta.json")
+        inode = os.stat(worker / "epochs.npy").st_ino
+        cached = self._maps.get(worker.name)
+        if cached is None or cached[0] != inode:
+            arrays = {name: np.load(worker / f"{name}.npy", mmap_mode="r") for name in self._shapes()}
+            cached = self._maps[worker.name] = [inode, None, None, arrays]
+        # meta.json is replaced, not rewritten, whenever the worker adds a key
+        version = (meta_stat.st_ino, meta_stat.st_mtime_ns)
+        if cached[1] != version:
+            cached[1:3] = version, json.loads((worker / "meta.json").read_text())
+        return cached[2], cached[3]
+
+    def query(self, window: int, windows: int = 1, disease: Optional[str] = None,
+              region: Optional[str] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Tumbling windows of window seconds (the last `windows` of them) plus the sliding window ending now.
+
+        Cost depends on the retention, key capacity and worker count, not on
+        how many predictions were recorded.
+        """
+        if window <= 0 or window % self.bucket_seconds:
+            raise ValueError(f"window must be a positive multiple of {self.bucket_seconds} seconds")
+        if windows < 1 or window * windows > self.retention_seconds:
+            raise ValueError(f"windows must cover at most the {self.retention_seconds}s retention")
+        now = time.time() if now is None else now
+        if region is not None:
+            region = self._region_names.get(region.strip().casefold(), region)
+        per_window = window // self.bucket_seconds
+        current = int(now // self.bucket_seconds)
+        # Tumbling windows align to multiples of window; the last one is still filling
+        last_start = (current // per_window) * per_window
+        first = last_start - (windows - 1) * per_window
+        sliding_first = current - per_window + 1
+
+        # One row per tumbling window, plus the sliding window as the last row
+        rows = windows + 1
+        disease_totals: Dict[str, np.ndarray] = {}
+        region_totals: Dict[str, np.ndarray] = {}
+        histograms: Dict[str, np.ndarray] = {}
+        confidence_sums: Dict[str, float] = {}
+        workers = 0
+
+        for worker in self._workers():
+            try:
+                meta, arrays = self._map_worker(worker)
+            except (OSError, ValueError):
+                continue  # worker directory removed or rewritten while reading
+            if (meta["bucket_seconds"] != self.bucket_seconds or arrays["epochs"].shape != (self.buckets,)
+                    or arrays["histogram"].shape[2] != self.confidence_bins):
+                continue  # written under other settings
+            workers += 1
+            epochs = np.array(arrays["epochs"])
+            d_names, r_names = meta["diseases"], meta["regions"]
+            d_sel = [i for i, name in enumerate(d_names) if disease is None or name == disease]
+            r_sel = [i for i, name in enumerate(r_names) if region is None or name == region]
+            slots = np.flatnonzero((epochs >= min(first, sliding_first)) & (epochs <= current))
+            if not d_sel or not r_sel or not len(slots):
+                continue
+
+            # Bucket -> window membership, so one matrix product sums every window
+            slot_epochs = epochs[slots]
+            membership = np.zeros((rows, len(slots)))
+            tumbling = slot_epochs >= first
+            membership[(slot_epochs[tumbling] - first) // per_window, np.flatnonzero(tumbling)] = 1.0
+            membership[-1] = slot_epochs >= sliding_first
+            # Keys fill each worker's table from index 0, so slicing to the used prefix skips empty capacity
+            counts = arrays["counts"][slots, :len(d_names), :len(r_names)]
+            if disease is not None:
+                counts = counts[:, d_sel]
+            if region is not None:
+                counts = counts[:, :, r_sel]
+            by_disease = membership @ counts.sum(axis=2, dtype=np.float64)
+            by_region = membership @ counts.sum(axis=1, dtype=np.float64)
+            for j, count in zip(d_sel, by_disease.T):
+                disease_totals[d_names[j]] = disease_totals.get(d_names[j], 0) + count
+            for j, count in zip(r_sel, by_region.T):
+                region_totals[r_names[j]] = region_totals.get(r_names[j], 0) + count
+
+            in_range = slots[tumbling]
+            hist = arrays["histogram"][in_range, :len(d_names)][:, d_sel].sum(axis=0, dtype=np.int64)
+            conf = arrays["confidence"][in_range, :len(d_names)][:, d_sel].sum(axis=0)
+            for j, h, c in zip(d_sel, hist, conf):
+                histograms[d_names[j]] = histograms.get(d_names[j], 0) + h
+                confidence_sums[d_names[j]] = confidence_sums.get(d_names[j], 0.0) + float(c)
+
+        def totals(row: int, start: int) -> Dict[str, Any]:
+            diseases = {name: int(count[row]) for name, count in disease_totals.items() if count[row]}
+            return {
+                "start": start * self.bucket_seconds,
+                "total": sum(diseases.values()),
+                "diseases": diseases,
+                "regions": {name: int(count[row]) for name, count in region_totals.items() if count[row]},
+            }
+
+        confidence = {}
+        for name, hist in histograms.items():
+            total = int(hist.sum())
+            if total:
+                confidence[name] = {"mean": confidence_sums[name] / total, "histogram": hist.tolist()}
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "window_seconds": window,
+            "windows": [totals(i, first + i * per_window) for i in range(windows)],
+            "sliding": totals(windows, sliding_first),
+            "confidence": confidence,
+            "workers": workers,
+        }
+
+    def series_counts(self, first: int, last: int, bucket_seconds: int) -> Dict[Tuple[str, str], np.ndarray]:
+        """Counts per (disease, region) summed over every worker, in buckets of bucket_seconds.
+
+        Buckets first..last are epochs of bucket_seconds, which must be a
+        multiple of the store's bucket. Keys counted as "other" are left out.
+        """
+        if bucket_seconds <= 0 or bucket_seconds % self.bucket_seconds:
+            raise ValueError(f"bucket_seconds must be a positive multiple of {self.bucket_seconds} seconds")
+        ratio = bucket_seconds // self.bucket_seconds
+        length = last - first + 1
+        series: Dict[Tuple[str, str], np.ndarray] = {}
+        for worker in self._workers():
+            try:
+                meta, arrays = self._map_worker(worker)
+            except (OSError, ValueError):
+                continue
+            if meta["bucket_seconds"] != self.bucket_seconds or arrays["epochs"].shape != (self.buckets,):
+                continue
+            epochs = np.array(arrays["epochs"])
+            outer = epochs // ratio
+            slots = np.flatnonzero((epochs >= 0) & (outer >= first) & (outer <= last))
+            if not len(slots) or length <= 0:
+                continue
+            d_names, r_names = meta["diseases"], meta["regions"]
+            counts = np.zeros((length, len(d_names), len(r_names)), dtype=np.int64)
+            np.add.at(counts, outer[slots] - first, arrays["counts"][slots, :len(d_names), :len(r_names)])
+            # Index 0 of both dimensions is the overflow key
+            for d, r in np.argwhere(counts[:, 1:, 1:].any(axis=0)) + 1:
+                key = (d_names[d], r_names[r])
+                series[key] = series[key] + counts[:, d, r] if key in series else counts[:, d, r]
+        return series
+
+    def maybe_prune(self, now: Optional[float] = None) -> int:
+        """prune() at most once per prune_interval; in between this is a clock comparison"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self._next_prune:
+                return 0
+            self._next_prune = now + self.prune_interval
+        return self.prune(now)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Remove directories of exited workers whose newest bucket is past retention"""
+        now = time.time() if now is None else now
+        oldest = int(now // self.bucket_seconds) - self.buckets
+        removed = 0
+        for worker in self._workers():
+            if worker.name == f"{WORKER_PREFIX}{os.getpid()}":
+                continue
+            try:
+                epochs = np.load(worker / "epochs.npy", mmap_mode="r")
+                if int(epochs.max()) <= oldest:
+                    shutil.rmtree(worker)
+                    self._maps.pop(worker.name, None)
+                    removed += 1
+            except (OSError, ValueError):
+                continue
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["diseases"] = max(len(self._diseases) - 1, 0)
+            stats["regions"] = len(self._region_names)
+        stats["bucket_seconds"] = self.bucket_seconds
+        stats["retention_seconds"] = self.retention_seconds
+        stats["workers"] = len(self._workers())
+        return stats
+
+
+# Global rollup store instance
+_rollups = None
+
+def initialize_rollups(directory: Optional[str] = None) -> Optional[RollupStore]:
+    """Initialize the global rollup store (None when disabled)"""
+    global _rollups
+    if _rollups is None and ROLLUPS["enabled"]:
+        _rollups = RollupStore(
+            directory or ROLLUPS["directory"],
+            bucket_seconds=ROLLUPS["bucket_seconds"],
+            retention_seconds=ROLLUPS["retention_hours"] * 3600,
+            max_diseases=ROLLUPS["max_diseases"],
+            regions=ROLLUPS["regions"],
+            confidence_bins=ROLLUPS["confidence_bins"],
+            prune_interval=ROLLUPS["prune_interval"]
+        )
+    return _rollups
+
+def record_prediction(predictions: List[Dict[str, Any]], region: Optional[str] = None) -> None:
+    """Count the top prediction of one request"""
+    rollups = initialize_rollups()
+    if rollups is None or not predictions:
+        return
+    try:
+        rollups.record(str(predictions[0]["disease"]).strip(), region, float(predictions[0]["confidence"]))
+    except Exception as e:
+        # Analytics must never fail a prediction
+        logger.error(f"Error recording prediction rollup: {str(e)}")
+
+def query_rollups(window: int, windows: int = 1, disease: Optional[str] = None,
+                  region: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    rollups = initialize_rollups()
+    if rollups is None:
+        return None
+    rollups.maybe_prune()
+    return rollups.query(window, windows, disease, region)
+
+def rollup_stats() -> Optional[Dict[str, Any]]:
+    return _rollups.stats() if _rollups is not None else None
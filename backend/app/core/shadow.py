@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+import logging
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .background import BackgroundBatcher
+
+logger = logging.getLogger(__name__)
+
+
+def _latency_summary(samples) -> Optional[Dict[str, float]]:
+    if not samples:
+        return None
+    values = np.fromiter(samples, dtype=np.float64)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def _serve_candidate(loader: Callable[[], Any], connection) -> None:
+    """Child process: load the candidate, then answer batches of term lists until the pipe closes"""
+    # The candidate only gets CPU time the workers answering requests leave idle
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (AttributeError, OSError):
+        os.nice(19)
+    try:
+        candidate = loader()
+    except Exception as e:
+        connection.send(("error", str(e)))
+        return
+    connection.send(("ready", None))
+    while True:
+        try:
+            batch = connection.recv()
+        except EOFError:
+            return
+        results = []
+        for terms in batch:
+            # One call per input, so the latency compares with the primary's predict()
+            start = time.perf_counter()
+            predictions = candidate.predict(terms)
+            results.append((predictions, (time.perf_counter() - start) * 1000))
+        connection.send(results)
+
+
+class ShadowEvaluator:
+    def __init__(self, loader: Callable[[], Any], max_queue: int = 1024, batch_size: int = 64,
+                 flush_interval: float = 0.05, sample_rate: float = 1.0, latency_window: int = 2048):
+        """Score a candidate model on live inputs in a separate process and compare it with the primary.
+
+        Requests only pay for a non-blocking enqueue; when the queue is full
+        the sample is dropped. The background thread hands batches to a child
+        process (spawned with the first batch, loader() -> DiseasePredictor
+        must be picklable), so the candidate never competes with the worker
+        for its GIL, and the thread itself only waits on the pipe.
+        """
+        self.loader = loader
+        self.sample_rate = sample_rate
+        self._process = None
+        self._connection = None
+        self._load_error: Optional[str] = None
+        self._batcher = BackgroundBatcher(self._evaluate, max_queue, batch_size, flush_interval, "shadow-evaluator")
+        self._lock = threading.Lock()
+        self._primary_latency = deque(maxlen=latency_window)
+        self._candidate_latency = deque(maxlen=latency_window)
+        self._disagreements = Counter()
+        self._stats = {"compared": 0, "top1_agree": 0, "top3_overlap": 0.0, "confidence_delta": 0.0}
+
+    def submit(self, medical_terms: List[str], predictions: List[Dict[str, Any]],
+               latency_ms: Optional[float] = None) -> bool:
+        """Queue one primary result for comparison; never blocks (latency_ms of a single predict() call, if any)"""
+        if self._load_error is not None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+        return self._batcher.submit((list(medical_terms), predictions, latency_ms))
+
+    def _start_candidate(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        connection, child = context.Pipe()
+        process = context.Process(target=_serve_candidate, args=(self.loader, child), name="shadow-candidate",
+                                  daemon=True)
+        process.start()
+        child.close()
+        try:
+            status, detail = connection.recv()
+        except EOFError:
+            process.join()
+            status, detail = "error", f"candidate process exited with code {process.exitcode}"
+        if status == "error":
+            # Shadowing switches itself off rather than retrying the load per batch
+            self._load_error = detail
+            logger.error(f"Shadow model unavailable, shadow evaluation disabled: {detail}")
+            raise RuntimeError(detail)
+        self._process, self._connection = process, connection
+
+    def _evaluate(self, batch) -> None:
+        if self._process is None or not self._process.is_alive():
+            self._start_candidate()
+        try:
+            self._connection.send([terms for terms, _, _ in batch])
+            results = self._connection.recv()
+        except (EOFError, OSError):
+            # A crashed candidate is restarted with the next batch
+            self._process = None
+            raise
+
+        with self._lock:
+            for (_, primary, latency_ms), (candidate, candidate_ms) in zip(batch, results):
+                self._compare(primary, candidate)
+                if latency_ms is not None:
+                    self._primary_latency.append(latency_ms)
+                self._candidate_latency.append(candidate_ms)
+
+    def _compare(self, primary: List[Dict[str, Any]], candidate: List[Dict[str, Any]]) -> None:
+        """Fold one primary/candidate pair into the aggregates (caller holds the lock)"""
+        primary_top = str(primary[0]["disease"]).strip() if primary else None
+        candidate_top = str(candidate[0]["disease"]).strip() if candidate else None
+        primary_set = {str(p["disease"]).strip() for p in primary}
+        candidate_set = {str(p["disease"]).strip() for p in candidate}
+
+        self._stats["compared"] += 1
+        if primary_top == candidate_top:
+            self._stats["top1_agree"] += 1
+        else:
+            self._disagreements[f"{primary_top} -> {candidate_top}"] += 1
+        union = primary_set | candidate_set
+        self._stats["top3_overlap"] += len(primary_set & candidate_set) / len(union) if union else 1.0
+        primary_confidence = primary[0]["confidence"] if primary else 0.0
+        candidate_confidence = next(
+            (p["confidence"] for p in candidate if str(p["disease"]).strip() == primary_top), 0.0
+        )
+        self._stats["confidence_delta"] += abs(primary_confidence - candidate_confidence)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        return self._batcher.drain(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            compared = self._stats["compared"]
+            return {
+                "queue": self._batcher.stats(),
+                "load_error": self._load_error,
+                "candidate_pid": self._process.pid if self._process is not None else None,
+                "compared": compared,
+                "top1_agreement": self._stats["top1_agree"] / compared if compared else None,
+                "mean_top3_overlap": self._stats["top3_overlap"] / compared if compared else None,
+                "mean_confidence_delta": self._stats["confidence_delta"] / compared if compared else None,
+                "top_disagreements": dict(self._disagreements.most_common(10)),
+                "primary_latency": _latency_summary(self._primary_latency),
+                "candidate_latency": _latency_summary(self._candidate_latency),
+            }
@@ -0,0 +1,65 @@
+import threading
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, private_errors: Tuple[Type[BaseException], ...] = ()):
+        """Collapse concurrent calls with the same key into one execution.
+
+        Errors listed in private_errors belong to the caller that ran the
+        function (e.g. its own deadline expiring); waiting callers run the
+        function themselves instead of inheriting them.
+        """
+        self.private_errors = private_errors
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {"leaders": 0, "followers": 0, "follower_retries": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn once for all concurrent callers of key and share its outcome"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["leaders"] += 1
+            else:
+                self._stats["followers"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                # Forget the key before waking followers so later callers start fresh
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for in-flight call {key!r}")
+        if call.error is not None:
+            if isinstance(call.error, self.private_errors):
+                with self._lock:
+                    self._stats["follower_retries"] += 1
+                return fn()
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -0,0 +1,207 @@
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import SECRET_KEY, SLOW_REQUESTS
+from .tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "worker-"
+REDACTION = ("drop", "hash", "full")
+# Per-deployment key of the text hashes: without SECRET_KEY, short symptom texts cannot be
+# recovered by hashing guesses
+HASH_KEY = hmac.new(SECRET_KEY.encode("utf-8"), b"slow-requests", hashlib.sha256).digest()
+
+
+def redact_text(text: Optional[str], mode: str, max_chars: int = 200, key: bytes = HASH_KEY) -> Dict[str, Any]:
+    """What an entry keeps of the patient's text: nothing, a keyed hash to spot repeats, or a truncated copy"""
+    if text is None or mode == "drop":
+        return {}
+    if mode == "hash":
+        return {"text_hmac": hmac.new(key, text.encode("utf-8"), hashlib.sha256).hexdigest()[:16]}
+    return {"text": text[:max_chars]}
+
+
+def trace_stages(trace: Trace) -> List[Dict[str, Any]]:
+    """The trace's spans below the root as offsets and durations in milliseconds"""
+    start = trace.root.start_ns
+    stages = []
+    for s in trace.spans:
+        if s is trace.root:
+            continue
+        stage = {
+            "name": s.name,
+            "start_ms": (s.start_ns - start) / 1e6,
+            "duration_ms": ((s.end_ns or s.start_ns) - s.start_ns) / 1e6,
+        }
+        if s.error:
+            stage["error"] = s.error
+        stages.append(stage)
+    return stages
+
+
+class SlowRequestBuffer:
+    def __init__(self, directory, thresholds_ms: Dict[str, float], capacity: int = 20,
+                 window_seconds: float = 3600.0):
+        """The slowest requests per endpoint over a rolling window, shared with other workers through files.
+
+        is_slow() is a dict lookup and a comparison, so requests under their
+        endpoint's threshold pay nothing else. Each endpoint keeps a min-heap
+        of at most capacity entries; a slow request replaces the fastest one
+        once the heap is full, and entries leave after window_seconds. Every
+        capture rewrites this worker's snapshot (slow requests are rare).
+        """
+        self.directory = Path(directory)
+        self.thresholds_ms = thresholds_ms
+        self.default_ms = thresholds_ms.get("default", 1000.0)
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self._heaps: Dict[str, List] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {"captured": 0, "displaced": 0, "skipped": 0}
+
+    def is_slow(self, endpoint: str, duration_ms: float) -> bool:
+        return duration_ms >= self.thresholds_ms.get(endpoint, self.default_ms)
+
+    def capture(self, endpoint: str, duration_ms: float, build: Callable[[], Dict[str, Any]],
+                now: Optional[float] = None) -> bool:
+        """Keep a slow request if it ranks among the endpoint's slowest; build() makes the entry only then"""
+        now = time.time() if now is None else now
+        with self._lock:
+            heap = self._heaps.setdefault(endpoint, [])
+            self._expire(heap, now)
+            if len(heap) >= self.capacity and duration_ms <= heap[0][0]:
+                self._stats["skipped"] += 1
+                return False
+        entry = dict(build(), endpoint=endpoint, duration_ms=duration_ms, timestamp=now, pid=os.getpid())
+        with self._lock:
+            item = (duration_ms, next(self._sequence), entry)
+            if len(heap) >= self.capacity:
+                heapq.heapreplace(heap, item)
+                self._stats["displaced"] += 1
+            else:
+                heapq.heappush(heap, item)
+            self._stats["captured"] += 1
+            snapshot = self._entries(now)
+        self._publish(snapshot)
+        return True
+
+    def _expire(self, heap: List, now: float) -> None:
+        cutoff = now - self.window_seconds
+        if any(item[2]["timestamp"] < cutoff for item in heap):
+            heap[:] = [item for item in heap if item[2]["timestamp"] >= cutoff]
+            heapq.heapify(heap)
+
+    def _entries(self, now: float) -> List[Dict[str, Any]]:
+        for heap in self._heaps.values():
+            self._expire(heap, now)
+        return [item[2] for heap in self._heaps.values() for item in heap]
+
+    def entries(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries(time.time() if now is None else now)
+        return sorted(entries, key=lambda entry: -entry["duration_ms"])
+
+    def _publish(self, entries: List[Dict[str, Any]]) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{SNAPSHOT_PREFIX}{os.getpid()}.json"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"pid": os.getpid(), "published": time.time(), "entries": entries}))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not publish slow requests: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["buffered"] = {endpoint: len(heap) for endpoint, heap in self._heaps.items()}
+        return stats
+
+
+def read_slow_requests(directory, window_seconds: float, endpoint: Optional[str] = None,
+                       limit: Optional[int] = None, now: Optional[float] = None) -> Dict[str, Any]:
+    """Merge the workers' snapshots, slowest first; snapshots older than the window are removed"""
+    directory = Path(directory)
+    now = time.time() if now is None else now
+    cutoff = now - window_seconds
+    entries = []
+    workers = 0
+    paths = sorted(directory.glob(f"{SNAPSHOT_PREFIX}*.json")) if directory.is_dir() else []
+    for path in paths:
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if snapshot["published"] < cutoff:
+            path.unlink(missing_ok=True)
+            continue
+        workers += 1
+        entries.extend(entry for entry in snapshot["entries"]
+                       if entry["timestamp"] >= cutoff and (endpoint is None or entry["endpoint"] == endpoint))
+    entries.sort(key=lambda entry: -entry["duration_ms"])
+    return {"requests": entries[:limit] if limit else entries, "workers": workers,
+            "window_seconds": window_seconds}
+
+
+# Global slow request buffer instance
+_buffer = None
+
+def initialize_slow_requests() -> Optional[SlowRequestBuffer]:
+    """Initialize the global slow request buffer (None when disabled)"""
+    global _buffer
+    if _buffer is None and SLOW_REQUESTS["enabled"]:
+        if SLOW_REQUESTS["redact"] not in REDACTION:
+            raise ValueError(f"SLOW_REQUESTS redact must be one of {', '.join(REDACTION)}")
+        _buffer = SlowRequestBuffer(
+            SLOW_REQUESTS["directory"],
+            SLOW_REQUESTS["thresholds_ms"],
+            capacity=SLOW_REQUESTS["capacity"],
+            window_seconds=SLOW_REQUESTS["window_seconds"]
+        )
+    return _buffer
+
+def capture_slow_request(trace: Trace, endpoint: str, status: Optional[int], text: Callable[[], Optional[str]],
+                         input_bytes: Optional[int] = None) -> bool:
+    """Record a finished request if it was slow for its endpoint; text() is only called for those"""
+    if endpoint in SLOW_REQUESTS["exempt_endpoints"]:
+        return False
+    buffer = initialize_slow_requests()
+    duration_ms = trace.root.duration_ms
+    if buffer is None or not buffer.is_slow(endpoint, duration_ms):
+        return False
+
+    def build():
+        original = text()
+        entry = {
+            "request_id": trace.request_id,
+            "trace_id": trace.trace_id,
+            "status": status,
+            "input_bytes": input_bytes,
+            "input_chars": len(original) if original is not None else None,
+            "stages": trace_stages(trace),
+        }
+        versions = sorted({str(s.attributes["model.version"]) for s in trace.spans if "model.version" in s.attributes})
+        entry["model_version"] = versions[0] if len(versions) == 1 else (versions or None)
+        entry.update(redact_text(original, SLOW_REQUESTS["redact"], SLOW_REQUESTS["max_text_chars"]))
+        return entry
+    return buffer.capture(endpoint, duration_ms, build)
+
+def slow_requests(endpoint: Optional[str] = None, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    buffer = initialize_slow_requests()
+    if buffer is None:
+        return None
+    return read_slow_requests(buffer.directory, buffer.window_seconds, endpoint, limit)
+
+def slow_request_stats() -> Optional[Dict[str, Any]]:
+    return _buffer.stats() if _buffer is not None else None
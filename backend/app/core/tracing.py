@@ -0,0 +1,318 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+import logging
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config.settings import TRACING
+from .background import BackgroundBatcher
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+EXPORTERS = ("file", "otlp", "none")
+
+
+class Trace:
+    def __init__(self, trace_id: str, request_id: str, sampled: bool, max_spans: int = 256):
+        """Spans of one request; exported when sampled, slow or failed"""
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        self.max_spans = max_spans
+        self.spans: List["Span"] = []
+        self.dropped_spans = 0
+        self.root: Optional[Span] = None
+
+
+class Span:
+    """One timed stage; also its own context manager, so a span costs a single allocation"""
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error",
+                 "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[int], kind: int = KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        # Ids stay integers on the request path and are hex-encoded on export
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        return False
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+class _NoSpan:
+    """Shared no-op scope for code running outside a traced request"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes):
+    """Time a stage of the current request: `with span("nlp.tokenize"): ...` (no-op when untraced)"""
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    trace = parent.trace
+    if len(trace.spans) >= trace.max_spans:
+        trace.dropped_spans += 1
+        return _NO_SPAN
+    child = Span(trace, name, parent.span_id, KIND_INTERNAL, attributes)
+    trace.spans.append(child)
+    return child
+
+
+def annotate(key: str, value: Any) -> None:
+    """Set an attribute on the current span (no-op when untraced)"""
+    current = _current.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def current_request_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace.request_id if current is not None else None
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, request_id: Optional[str] = None,
+                sample_rate: float = 0.0, max_spans: int = 256, attributes: Optional[Dict[str, Any]] = None) -> Span:
+    """Open the request's root span, continuing a W3C traceparent when one is given.
+
+    A caller's sampled flag is honoured; otherwise sample_rate decides.
+    """
+    match = TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+    if match and match.group(1) != "0" * 32:
+        trace_id, parent_id, sampled = match.group(1), int(match.group(2), 16), bool(int(match.group(3), 16) & 1)
+    else:
+        trace_id, parent_id, sampled = f"{random.getrandbits(128):032x}", None, False
+    sampled = sampled or (sample_rate > 0 and random.random() < sample_rate)
+    if not request_id or not REQUEST_ID.match(request_id):
+        request_id = trace_id
+    trace = Trace(trace_id, request_id, sampled, max_spans)
+    trace.root = Span(trace, name, parent_id, KIND_SERVER, attributes)
+    trace.spans.append(trace.root)
+    _current.set(trace.root)
+    return trace.root
+
+
+def end_trace(root: Span) -> Trace:
+    """Close the request's spans that are still open and leave its context; returns the finished trace"""
+    _current.set(None)
+    trace = root.trace
+    for open_span in trace.spans:
+        if open_span.end_ns is None:
+            open_span.end()
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current.trace if current is not None else None
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def otlp_spans(trace: Trace) -> List[Dict[str, Any]]:
+    """The trace's spans in OTLP/JSON form (ids as hex, times as nanosecond strings)"""
+    spans = []
+    for s in trace.spans:
+        attributes = dict(s.attributes)
+        if s is trace.root:
+            attributes["request.id"] = trace.request_id
+            if trace.dropped_spans:
+                attributes["spans.dropped"] = trace.dropped_spans
+        entry = {
+            "traceId": trace.trace_id,
+            "spanId": f"{s.span_id:016x}",
+            "parentSpanId": f"{s.parent_id:016x}" if s.parent_id else "",
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [_attribute(key, value) for key, value in attributes.items()],
+        }
+        if s.error:
+            entry["status"] = {"code": 2, "message": s.error}
+        spans.append(entry)
+    return spans
+
+
+def otlp_request(traces: List[Trace], service_name: str) -> Dict[str, Any]:
+    """An OTLP ExportTraceServiceRequest for the traces"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", service_name),
+                                        _attribute("process.pid", os.getpid())]},
+            "scopeSpans": [{
+                "scope": {"name": "bluecare"},
+                "spans": [entry for trace in traces for entry in otlp_spans(trace)],
+            }],
+        }]
+    }
+
+
+class TraceExporter:
+    def __init__(self, exporter: str = "file", directory=None, endpoint: Optional[str] = None,
+                 service_name: str = "bluecare-api", max_file_bytes: int = 50 << 20, max_queue: int = 1000,
+                 batch_size: int = 64, flush_interval: float = 1.0, timeout: float = 2.0):
+        """Send finished traces as OTLP/JSON from a background thread.
+
+        "file" appends one ExportTraceServiceRequest per line to a per-process
+        traces-<pid>.jsonl (rotated to .1 at max_file_bytes); "otlp" POSTs it to
+        an OTLP/HTTP collector endpoint such as http://collector:4318/v1/traces.
+        """
+        if exporter not in EXPORTERS:
+            raise ValueError(f"exporter must be one of {', '.join(EXPORTERS)}")
+        self.exporter = exporter
+        self.directory = Path(directory) if directory else None
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {"exported": 0, "spans": 0, "failed": 0}
+        self._batcher = BackgroundBatcher(self._export, max_queue, batch_size, flush_interval, "trace-exporter")
+
+    def submit(self, trace: Trace) -> bool:
+        if self.exporter == "none":
+            return False
+        return self._batcher.submit(trace)
+
+    def _export(self, traces: List[Trace]) -> None:
+        payload = json.dumps(otlp_request(traces, self.service_name), separators=(",", ":"))
+        try:
+            if self.exporter == "file":
+                self._append(payload)
+            else:
+                request = urllib.request.Request(self.endpoint, data=payload.encode("utf-8"), method="POST",
+                                                 headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += len(traces)
+            raise
+        with self._lock:
+            self._stats["exported"] += len(traces)
+            self._stats["spans"] += sum(len(trace.spans) for trace in traces)
+
+    def _append(self, payload: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"traces-{os.getpid()}.jsonl"
+        if path.exists() and path.stat().st_size >= self.max_file_bytes:
+            os.replace(path, path.with_suffix(".jsonl.1"))
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(payload + "\n")
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        return self._batcher.drain(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue"] = self._batcher.stats()
+        return stats
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds %(request_id)s to log records ("-" outside a request) so log lines can be joined with traces"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
+
+
+# Global trace exporter instance
+_exporter = None
+_counters = {"traces": 0, "exported": 0, "sampled": 0, "slow": 0, "errors": 0}
+_counters_lock = threading.Lock()
+
+def initialize_exporter() -> Optional[TraceExporter]:
+    """Initialize the global trace exporter (None when tracing is disabled)"""
+    global _exporter
+    if _exporter is None and TRACING["enabled"]:
+        _exporter = TraceExporter(
+            TRACING["exporter"],
+            directory=TRACING["directory"],
+            endpoint=TRACING["endpoint"],
+            service_name=TRACING["service_name"],
+            max_file_bytes=TRACING["max_file_bytes"],
+            max_queue=TRACING["queue_size"],
+            batch_size=TRACING["batch_size"],
+            flush_interval=TRACING["flush_interval"]
+        )
+    return _exporter
+
+def export_trace(trace: Trace, error: bool = False) -> bool:
+    """Export a finished trace when it was sampled, ran slower than TRACING slow_ms, or failed"""
+    slow = trace.root.duration_ms >= TRACING["slow_ms"]
+    keep = trace.sampled or slow or error
+    with _counters_lock:
+        _counters["traces"] += 1
+        _counters["sampled"] += int(trace.sampled)
+        _counters["slow"] += int(slow)
+        _counters["errors"] += int(error)
+        _counters["exported"] += int(keep)
+    exporter = initialize_exporter()
+    return keep and exporter is not None and exporter.submit(trace)
+
+def tracing_stats() -> Dict[str, Any]:
+    with _counters_lock:
+        stats = dict(_counters)
+    stats["exporter"] = _exporter.stats() if _exporter is not None else None
+    return stats
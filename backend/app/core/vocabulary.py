@@ -0,0 +1,184 @@
+import hashlib
+import mmap
+import struct
+import zlib
+import logging
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"BCVI"
+_VERSION = 1
+# magic, version, term count, hash slots, blob bytes, sha256 of the (term, id) pairs
+_HEADER = struct.Struct("<4sIQQQ32s")
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def build_vocabulary_index(vocabulary: Mapping) -> bytes:
+    """Serialize a term -> id mapping into one contiguous, position-independent buffer.
+
+    Layout after the header: offsets (u8, count + 1) into the UTF-8 blob of
+    terms sorted by their encoding, their ids (u4), an open-addressing hash
+    table (u4 slots holding sorted position + 1, 0 = empty) and the blob.
+    """
+    entries = sorted((term.encode("utf-8"), int(feature)) for term, feature in vocabulary.items())
+    count = len(entries)
+    slots = 1
+    while slots < 2 * count:
+        slots <<= 1
+
+    digest = hashlib.sha256()
+    offsets = [0]
+    for key, feature in entries:
+        offsets.append(offsets[-1] + len(key))
+        digest.update(struct.pack("<I", len(key)) + key + struct.pack("<I", feature))
+
+    table = [0] * slots
+    mask = slots - 1
+    for position, (key, _) in enumerate(entries):
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = position + 1
+
+    ids = struct.pack(f"<{count}I", *(feature for _, feature in entries))
+    parts = [
+        _HEADER.pack(_MAGIC, _VERSION, count, slots, offsets[-1], digest.digest()),
+        struct.pack(f"<{count + 1}Q", *offsets),
+        ids + b"\0" * (_align(len(ids)) - len(ids)),
+        struct.pack(f"<{slots}I", *table),
+        b"".join(key for key, _ in entries),
+    ]
+    return b"".join(parts)
+
+
+class CompactVocabulary(Mapping):
+    def __init__(self, buffer, path: Optional[str] = None):
+        """Read-only term -> feature id mapping over a buffer from build_vocabulary_index.
+
+        Drop-in for TfidfVectorizer.vocabulary_: lookups hash into the buffer
+        instead of a dict, so a memory-mapped index costs no Python objects
+        per term and its pages are shared by every worker on the host.
+        """
+        view = memoryview(buffer).cast("B")
+        magic, version, count, slots, blob_bytes, digest = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a vocabulary index")
+        self._buffer = buffer
+        self._path = path
+        self._count = count
+        self._mask = slots - 1
+        self.digest = digest.hex()
+
+        start = _HEADER.size
+        self._offsets = view[start:start + 8 * (count + 1)].cast("Q")
+        start += 8 * (count + 1)
+        self._ids = view[start:start + 4 * count].cast("I")
+        start += _align(4 * count)
+        self._slots = view[start:start + 4 * slots].cast("I")
+        start += 4 * slots
+        self._blob = view[start:start + blob_bytes]
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "CompactVocabulary":
+        """Memory-map an index file written by save_vocabulary_index"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, str(path))
+
+    def __reduce__(self):
+        if self._path is None:
+            return CompactVocabulary, (bytes(self._buffer),)
+        return CompactVocabulary.open, (self._path,)
+
+    def _key(self, position: int) -> bytes:
+        return self._blob[self._offsets[position]:self._offsets[position + 1]]
+
+    def __getitem__(self, term) -> int:
+        if not isinstance(term, str):
+            raise KeyError(term)
+        key = term.encode("utf-8")
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            entry = self._slots[slot]
+            if not entry:
+                raise KeyError(term)
+            if self._key(entry - 1) == key:
+                return self._ids[entry - 1]
+            slot = (slot + 1) & self._mask
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self._count):
+            yield bytes(self._key(position)).decode("utf-8")
+
+    def nbytes(self) -> int:
+        return len(memoryview(self._buffer))
+
+
+def save_vocabulary_index(vocabulary: Mapping, path: Union[str, Path]) -> str:
+    """Write the index atomically and return its digest"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    buffer = build_vocabulary_index(vocabulary)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(buffer)
+    tmp.replace(path)
+    return CompactVocabulary(buffer).digest
+
+
+@contextmanager
+def detached_vocabulary(vectorizer, index_path: Union[str, Path]):
+    """Temporarily swap the vocabulary dict for a reference to an index file (for pickling)"""
+    vocabulary = vectorizer.vocabulary_
+    stop_words = vectorizer.__dict__.pop("stop_words_", None)
+    digest = save_vocabulary_index(vocabulary, index_path)
+    del vectorizer.vocabulary_
+    vectorizer.vocabulary_index_ = {"file": Path(index_path).name, "digest": digest}
+    try:
+        yield vectorizer
+    finally:
+        del vectorizer.vocabulary_index_
+        vectorizer.vocabulary_ = vocabulary
+        if stop_words is not None:
+            vectorizer.stop_words_ = stop_words
+
+
+def attach_vocabulary(vectorizer, model_dir: Union[str, Path]) -> None:
+    """Give a vectorizer saved without its vocabulary the memory-mapped index"""
+    reference = getattr(vectorizer, "vocabulary_index_", None)
+    if reference is None or hasattr(vectorizer, "vocabulary_"):
+        return
+    path = Path(model_dir) / reference["file"]
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Vocabulary index {path} not found: the model was saved without its vocabulary "
+            f"and needs the index file written with it"
+        )
+    vocabulary = CompactVocabulary.open(path)
+    if vocabulary.digest != reference["digest"]:
+        raise ValueError(
+            f"Vocabulary index {path} does not belong to this model "
+            f"(sha256 {vocabulary.digest[:12]}, expected {reference['digest'][:12]})"
+        )
+    vectorizer.vocabulary_ = vocabulary
+    logger.info(f"Attached vocabulary index {path} ({len(vocabulary)} terms, {vocabulary.nbytes()} bytes)")
+
+
+def load_pipeline(model_path: Union[str, Path]):
+    """joblib.load a pipeline, attaching its vocabulary index when it was saved stripped"""
+    pipeline = joblib.load(model_path)
+    steps = getattr(pipeline, "named_steps", None)
+    if steps and "tfidf" in steps:
+        attach_vocabulary(steps["tfidf"], Path(model_path).parent)
+    return pipeline
@@ -3,6 +3,9 @@ import nltk
 from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
 from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
 import logging
+from config.settings import MEDICAL_TERMS
+from ..core.deadline import check_deadline
+from ..core.tracing import span
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -21,23 +24,7 @@ class NLPEngine:
         self.stopword_remover = StopWordRemoverFactory().create_stop_word_remover()
         
         # Common medical terms in Indonesian (to be expanded)
-        self.medical_terms = {
-            "demam": "demam",
-            "sakit kepala": "sakit_kepala",
-            "batuk": "batuk",
-            "pilek": "pilek",
-            "mual": "mual",
-            "muntah": "muntah",
-            "diare": "diare",
-            "sakit perut": "sakit_perut",
-            "sesak nafas": "sesak_nafas",
-            "nyeri": "nyeri",
-            "pusing": "pusing",
-            "lemas": "lemas",
-            "meriang": "meriang",
-            "gatal": "gatal",
-            "ruam": "ruam",
-        }
+        self.medical_terms = dict(MEDICAL_TERMS)
 
     def clean_text(self, text):
         """Clean and normalize text"""
@@ -85,20 +72,32 @@ class NLPEngine:
 
     def process(self, text):
         """Process text through the complete NLP pipeline"""
+        # The request deadline is checked between stages so expired work stops early;
+        # each stage is a span of the request's trace
+        check_deadline("nlp.clean_text")
         # Clean text
-        cleaned_text = self.clean_text(text)
+        with span("nlp.clean_text"):
+            cleaned_text = self.clean_text(text)
         
+        check_deadline("nlp.tokenize")
         # Tokenize
-        tokens = self.tokenize(cleaned_text)
+        with span("nlp.tokenize"):
+            tokens = self.tokenize(cleaned_text)
         
+        check_deadline("nlp.remove_stopwords")
         # Remove stopwords
-        tokens = self.remove_stopwords(tokens)
+        with span("nlp.remove_stopwords"):
+            tokens = self.remove_stopwords(tokens)
         
+        check_deadline("nlp.stem_words")
         # Stem words
-        tokens = self.stem_words(tokens)
+        with span("nlp.stem_words"):
+            tokens = self.stem_words(tokens)
         
+        check_deadline("nlp.extract_medical_terms")
         # Extract medical terms
-        medical_terms = self.extract_medical_terms(tokens)
+        with span("nlp.extract_medical_terms"):
+            medical_terms = self.extract_medical_terms(tokens)
         
         return {
             'original_text': text,
@@ -120,4 +119,4 @@ def process_symptoms(text):
     """Process symptoms text using the global NLP engine"""
     if _nlp_engine is None:
         initialize_nlp()
- 
\ No newline at end of file
+    return _nlp_engine.process(text) 
\ No newline at end of file
@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flask import Flask
+from app.api.routes import api_bp
+from app.api import ratelimit
+
+class APITestCase(unittest.TestCase):
+    """Flask test client for api_bp, with a scratch directory and a rate limiter table inside it.
+
+    Subclasses that reset more module globals call super().setUp() first and
+    super().tearDown() last.
+    """
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        ratelimit.initialize_rate_limiter(os.path.join(self.test_dir, 'ratelimit.bin'), 64)
+        self.app = Flask(__name__)
+        self.app.register_blueprint(api_bp)
+        self.client = self.app.test_client()
+        self.app.config['TESTING'] = True
+
+    def tearDown(self):
+        ratelimit._limiter = None
+        shutil.rmtree(self.test_dir)
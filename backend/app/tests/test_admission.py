@@ -0,0 +1,115 @@
+import unittest
+import json
+import threading
+import time
+from unittest.mock import patch
+from app.api import admission
+from app.api.admission import AdmissionController, parse_request_start
+from app.tests.api_testcase import APITestCase
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.controller = AdmissionController(
+            max_in_flight=2,
+            endpoint_max_in_flight={"predict": 1},
+            max_queue_time=1.0
+        )
+
+    def test_concurrency_budget(self):
+        """Requests past the endpoint or global budget are shed"""
+        self.assertTrue(self.controller.try_acquire("predict")[0])
+        admitted, retry_after = self.controller.try_acquire("predict")
+        self.assertFalse(admitted)
+        self.assertGreaterEqual(retry_after, 1)
+
+        self.assertTrue(self.controller.try_acquire("chat")[0])
+        self.assertFalse(self.controller.try_acquire("chat")[0])
+
+        self.controller.release("predict", 0.5)
+        self.assertTrue(self.controller.try_acquire("predict")[0])
+
+        stats = self.controller.stats()
+        self.assertEqual(stats["endpoints"]["predict"]["accepted"], 2)
+        self.assertEqual(stats["endpoints"]["predict"]["shed_concurrency"], 1)
+        self.assertEqual(stats["endpoints"]["predict"]["service_time_ewma"], 0.5)
+
+    def test_queue_time_budget(self):
+        """Requests that already waited too long in the proxy queue are shed"""
+        admitted, _ = self.controller.try_acquire("chat", waited=2.0)
+        self.assertFalse(admitted)
+        self.assertEqual(self.controller.stats()["endpoints"]["chat"]["shed_queue_time"], 1)
+
+    def test_parse_request_start(self):
+        """X-Request-Start is accepted in seconds, milliseconds and microseconds"""
+        self.assertAlmostEqual(parse_request_start("t=1700000000.250"), 1700000000.25)
+        self.assertAlmostEqual(parse_request_start("1700000000250"), 1700000000.25)
+        self.assertAlmostEqual(parse_request_start("1700000000250000"), 1700000000.25)
+        self.assertIsNone(parse_request_start("garbage"))
+        self.assertIsNone(parse_request_start(None))
+
+class TestAdmissionHooks(APITestCase):
+    def setUp(self):
+        super().setUp()
+        admission.initialize_admission({"max_in_flight": 0, "max_queue_time": 5.0})
+
+    def tearDown(self):
+        admission._controller = None
+        super().tearDown()
+
+    def test_overloaded_endpoint_returns_503(self):
+        """Requests are rejected with Retry-After once the budget is exhausted"""
+        response = self.client.post('/chat', data=json.dumps({"text": "halo"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_health_and_metrics_are_exempt(self):
+        """Health checks stay answerable while the worker sheds load"""
+        self.assertEqual(self.client.get('/health').status_code, 200)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('admission', json.loads(response.data))
+
+    def test_stale_request_is_shed(self):
+        """Requests stamped long ago by the proxy are shed without running"""
+        admission.initialize_admission({"max_in_flight": 4, "max_queue_time": 1.0})
+        response = self.client.post(
+            '/chat',
+            data=json.dumps({"text": "halo"}),
+            content_type='application/json',
+            headers={"X-Request-Start": f"t={time.time() - 10:.3f}"}
+        )
+        self.assertEqual(response.status_code, 503)
+
+    def test_concurrent_requests_are_shed_past_the_budget(self):
+        """Requests held by other threads count against the worker's budget"""
+        controller = admission.initialize_admission({"max_in_flight": 2, "max_queue_time": 5.0})
+        release = threading.Event()
+        statuses = []
+
+        def slow_chat(*args, **kwargs):
+            release.wait(5)
+            return {"response": "ok", "suggestions": [], "context": {}}
+
+        def post():
+            statuses.append(self.app.test_client().post('/chat', json={"text": "halo"}).status_code)
+
+        with patch('app.api.routes.get_chatbot_response', side_effect=slow_chat):
+            threads = [threading.Thread(target=post) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while controller.stats()["in_flight"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            response = self.client.post('/chat', json={"text": "halo"})
+            self.assertEqual(response.status_code, 503)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(controller.stats()["in_flight"], 0)
+        self.assertEqual(controller.stats()["endpoints"]["chat"]["shed_concurrency"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from app.core.attribution import tfidf_rows, attribute_terms, class_weights, feature_contributions
+from app.core.predictor import DiseasePredictor
+from app.tests.api_testcase import APITestCase
+
+class TestFeatureContributions(unittest.TestCase):
+    def test_matches_dense_product(self):
+        rng = np.random.default_rng(0)
+        X = sparse.random(6, 40, density=0.2, format="csr", random_state=1)
+        coef = rng.normal(size=(5, 40))
+        top = np.array([rng.permutation(5)[:3] for _ in range(6)])
+        contributions = feature_contributions(X.indptr, X.indices, X.data, coef, top)
+        for row in range(6):
+            start, end = X.indptr[row], X.indptr[row + 1]
+            for column in range(3):
+                expected = X[row].toarray().ravel() * coef[top[row, column]]
+                np.testing.assert_allclose(contributions[start:end, column], expected[X.indices[start:end]])
+                self.assertAlmostEqual(contributions[start:end, column].sum(), expected.sum())
+
+    def test_binary_weights_cover_both_classes(self):
+        clf = LogisticRegression().fit(np.array([[0.0, 1.0], [1.0, 0.0]]), ["a", "b"])
+        np.testing.assert_allclose(class_weights(clf), np.vstack([-clf.coef_, clf.coef_]))
+
+class TestAttributeTerms(unittest.TestCase):
+    def setUp(self):
+        data = pd.read_csv("data/symptom_disease_dataset.csv")
+        self.vectorizer = TfidfVectorizer().fit(data["symptoms"])
+        self.clf = LogisticRegression(max_iter=1000).fit(self.vectorizer.transform(data["symptoms"]), data["disease"])
+
+    def test_term_weights_sum_to_the_logit(self):
+        terms = ["sering haus", "sering kencing", "lemas"]
+        predictions = [[{"disease": "Diabetes", "confidence": 0.9, "symptoms": []}]]
+        attribute_terms(self.vectorizer, self.clf, [terms], predictions, limit=10)
+        entry = predictions[0][0]
+        self.assertEqual(set(entry["symptoms"]), set(terms))
+        self.assertEqual(entry["symptom_weights"], sorted(entry["symptom_weights"], reverse=True))
+        X = self.vectorizer.transform([", ".join(terms)])
+        index = list(self.clf.classes_).index("Diabetes")
+        logit = X @ self.clf.coef_[index]
+        self.assertAlmostEqual(sum(entry["symptom_weights"]), float(logit[0]))
+
+    def test_rows_match_the_vectorizer(self):
+        batch = [["sering haus", "sering kencing", "lemas"], ["demam", "demam tinggi", "xyzzy"], []]
+        indptr, indices, data, _ = tfidf_rows(self.vectorizer, batch)
+        X = sparse.csr_matrix((data, indices, indptr), shape=(len(batch), len(self.vectorizer.vocabulary_)))
+        expected = self.vectorizer.transform([", ".join(terms) for terms in batch])
+        np.testing.assert_allclose(X.toarray(), expected.toarray())
+
+    def test_unknown_terms_and_empty_predictions(self):
+        predictions = [[{"disease": "Flu", "confidence": 0.5, "symptoms": []}], []]
+        attribute_terms(self.vectorizer, self.clf, [["xyzzy"], ["batuk"]], predictions)
+        self.assertEqual(predictions[0][0]["symptoms"], [])
+        self.assertEqual(predictions[1], [])
+
+class TestExplainFlag(APITestCase):
+    def test_batch_and_single_explanations_agree(self):
+        predictor = DiseasePredictor("model/disease_classifier.pkl")
+        batch = [["sering haus", "sering kencing", "lemas"], ["demam", "batuk"]]
+        explained = predictor.predict_batch(batch, explain=True)
+        self.assertEqual(explained, [predictor.predict(terms, explain=True) for terms in batch])
+        self.assertEqual(explained[0][0]["symptoms"][:2], ["sering haus", "sering kencing"])
+        self.assertEqual(predictor.predict(batch[0])[0]["symptoms"], [])
+
+    @patch('app.api.routes.process_symptoms')
+    def test_api_flag(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["sering haus", "sering kencing"]}
+        response = self.client.post('/predict', json={"text": "sering haus dan sering kencing", "explain": True})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()["predictions"][0]["symptoms"])
+        response = self.client.post('/predict', json={"text": "sering haus dan sering kencing"})
+        self.assertEqual(response.get_json()["predictions"][0]["symptoms"], [])
+
+if __name__ == '__main__':
+    unittest.main()
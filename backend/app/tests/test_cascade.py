@@ -0,0 +1,122 @@
+import unittest
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core.cascade import Cascade, FirstStage
+from app.core.predictor import DiseasePredictor
+
+def symptom_subsets(data, per_row=30, seed=0):
+    """Random partial symptom lists of each dataset row, like real multi-term inputs"""
+    rng = np.random.default_rng(seed)
+    texts, labels = [], []
+    for symptoms, disease in zip(data["symptoms"], data["disease"]):
+        terms = [term.strip() for term in symptoms.split(",")]
+        for _ in range(per_row):
+            size = int(rng.integers(2, len(terms) + 1))
+            texts.append([str(t) for t in rng.choice(terms, size=size, replace=False)])
+            labels.append(disease)
+    return texts, labels
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        data = pd.read_csv("data/symptom_disease_dataset.csv")
+        inputs, labels = symptom_subsets(data)
+        texts = [", ".join(terms) for terms in inputs]
+        self.pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=1000))])
+        self.pipeline.fit(texts, labels)
+        self.stage = FirstStage.train(self.pipeline.named_steps["tfidf"], texts, labels)
+        # Calibrate on subsets the stage was not trained on
+        self.inputs, _ = symptom_subsets(data, seed=1)
+        self.reference = self.pipeline.predict_proba([", ".join(terms) for terms in self.inputs])
+        self.report = self.stage.calibrate(self.inputs, self.reference, 0.95)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def full_model(self, terms):
+        return self.pipeline.predict_proba([", ".join(terms)])[0]
+
+    def test_calibrated_threshold_meets_target(self):
+        self.assertLess(self.report["threshold"], float("inf"))
+        self.assertGreater(self.report["coverage"], 0.0)
+        self.assertGreaterEqual(self.report["agreement"], 0.95)
+
+    def test_temperature_tracks_full_model_confidence(self):
+        raw = FirstStage(self.stage.tokens, self.stage.log_prob, self.stage.log_prior, self.stage.classes,
+                         self.stage.analyzer)
+        self.assertGreater(self.stage.temperature, 1.0)
+
+        def fit(stage):
+            probabilities = np.array([stage.probabilities(terms) for terms in self.inputs])
+            cross_entropy = -(self.reference * np.log(probabilities)).sum(axis=1).mean()
+            return cross_entropy, abs(probabilities.max(axis=1).mean() - self.reference.max(axis=1).mean())
+
+        # Raw posteriors claim more confidence than the full model has; tempered ones track it
+        (tempered_loss, tempered_gap), (raw_loss, raw_gap) = fit(self.stage), fit(raw)
+        self.assertLess(tempered_loss, raw_loss)
+        self.assertLess(tempered_gap, raw_gap)
+
+    def test_unknown_terms_abstain(self):
+        self.assertIsNone(self.stage.probabilities(["tidak", "dikenal"]))
+        impossible = FirstStage.train(self.pipeline.named_steps["tfidf"], ["demam"], ["Flu"])
+        self.assertEqual(impossible.calibrate([["xyz"]], self.reference[:1], 0.95)["coverage"], 0.0)
+
+    def test_escalates_uncertain_inputs(self):
+        cascade = Cascade(self.stage, audit_rate=1.0)
+        calls = []
+
+        def full_model(terms):
+            calls.append(terms)
+            return self.full_model(terms)
+
+        for terms in self.inputs[:100] + [["tidak dikenal"]]:
+            probabilities, stage = cascade.probabilities(terms, full_model)
+            self.assertAlmostEqual(float(probabilities.sum()), 1.0)
+            self.assertIn(stage, ("first_stage", "full_model"))
+
+        stats = cascade.stats()
+        self.assertEqual(stats["requests"], 101)
+        self.assertEqual(stats["abstained"], 1)
+        answered = round(stats["first_stage_hit_rate"] * 101)
+        # Every escalation and, with audit_rate=1, every first-stage answer runs the full model
+        self.assertEqual(len(calls), 101)
+        self.assertEqual(stats["audited"], answered)
+        self.assertEqual(stats["escalated"] + stats["abstained"] + answered, 101)
+
+    def test_batch_matches_single(self):
+        cascade = Cascade(self.stage)
+        batch = self.inputs[:50]
+        rows, stages = cascade.probabilities_batch(batch, lambda b: self.pipeline.predict_proba([", ".join(t) for t in b]))
+        for terms, row, stage in zip(batch, rows, stages):
+            single, single_stage = cascade.probabilities(terms, self.full_model)
+            np.testing.assert_allclose(row, single)
+            self.assertEqual(stage, single_stage)
+
+    def test_predictor_loads_matching_stage_only(self):
+        model_path = os.path.join(self.test_dir, "model.pkl")
+        stage_path = os.path.join(self.test_dir, "stage.npz")
+        table_path = os.path.join(self.test_dir, "missing.npy")
+        joblib.dump(self.pipeline, model_path)
+        self.stage.save(stage_path, model_path)
+
+        predictor = DiseasePredictor(model_path, table_path, stage_path)
+        self.assertEqual(predictor.cascade.stage.threshold, self.stage.threshold)
+        self.assertEqual(predictor.cascade.stage.temperature, self.stage.temperature)
+        predictions = predictor.predict(["sering haus", "sering kencing", "lemas"])
+        self.assertEqual(predictions[0]["disease"], "Diabetes")
+        self.assertIn(predictions[0]["stage"], ("first_stage", "full_model"))
+        self.assertEqual(predictor.cascade_stats()["requests"], 1)
+
+        with open(model_path, "ab") as f:
+            f.write(b"retrained")
+        self.assertIsNone(DiseasePredictor(model_path, table_path, stage_path).cascade)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import json
+from app.core.chatbot import HealthAssistant, get_chatbot_responses
+from app.tests.api_testcase import APITestCase
+
+ITEMS = [
+    {"id": "628111", "text": "halo", "context": {}},
+    {"id": "628222", "text": "saya demam", "context": {"medical_terms": ["batuk"]}},
+    {"id": "628333", "text": ""},
+    "not an item",
+    {"id": "628444", "text": "perut mulas dan mencret"},
+]
+
+class TestBatchChat(unittest.TestCase):
+    def setUp(self):
+        self.chatbot = HealthAssistant()
+
+    def test_results_in_input_order_with_isolated_errors(self):
+        results = self.chatbot.get_responses(ITEMS)
+        self.assertEqual([r["id"] for r in results], ["628111", "628222", "628333", None, "628444"])
+        self.assertIn("Halo!", results[0]["response"])
+        self.assertEqual(set(results[1]["context"]["medical_terms"]), {"demam", "batuk"})
+        self.assertEqual(results[2]["error"], "No message provided")
+        self.assertEqual(results[3]["error"], "No message provided")
+        self.assertEqual(set(results[4]["context"]["medical_terms"]), {"sakit_perut", "diare"})
+
+    def test_global_chatbot_matches_instance(self):
+        items = [item for item in ITEMS if isinstance(item, dict)] * 20
+        self.assertEqual(get_chatbot_responses(items), self.chatbot.get_responses(items))
+
+    def test_batch_matches_single_responses(self):
+        for item in ITEMS[:2]:
+            single = self.chatbot.get_response(item["text"], item["context"])
+            batch = self.chatbot.get_responses([item])[0]
+            batch.pop("id")
+            self.assertEqual(sorted(batch.pop("context")["medical_terms"]),
+                             sorted(single.pop("context")["medical_terms"]))
+            self.assertEqual(batch, single)
+
+class TestChatBatchEndpoint(APITestCase):
+    def test_chat_batch_endpoint(self):
+        response = self.client.post('/chat/batch', data=json.dumps({
+            "items": [{"id": "a", "text": "halo"}, {"id": "b", "text": "tiba-tiba pingsan"}]
+        }), content_type='application/json')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["id"] for r in data["results"]], ["a", "b"])
+        self.assertEqual(data["results"][1]["urgent"]["red_flags"], ["pingsan"])
+
+    def test_chat_batch_requires_items(self):
+        response = self.client.post('/chat/batch', data=json.dumps({"items": []}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
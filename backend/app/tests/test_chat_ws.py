@@ -0,0 +1,120 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+from app.api import chat_ws, ratelimit
+from app.api.chat_ws import ChatServer, ChatSession, serve
+
+try:
+    from websockets.sync.client import connect
+except ImportError:
+    connect = None
+
+class TestChatSession(unittest.TestCase):
+    def test_context_is_kept_server_side(self):
+        """Later turns see the symptoms from earlier ones without a context echo"""
+        session = ChatSession()
+        first = session.handle({"text": "saya demam"})
+        self.assertEqual(first["turn"], 1)
+        self.assertIn("demam", first["medical_terms"])
+
+        second = session.handle({"text": "sekarang batuk juga"})
+        self.assertEqual(second["turn"], 2)
+        self.assertEqual(set(second["medical_terms"]), {"demam", "batuk"})
+
+        reset = session.handle({"text": "batuk", "reset": True})
+        self.assertEqual(reset["medical_terms"], ["batuk"])
+
+    def test_urgent_and_invalid_frames(self):
+        server = ChatServer()
+        session = ChatSession()
+        self.assertEqual(server.handle_frame(session, "not json")["error"], "Invalid JSON")
+        self.assertEqual(server.handle_frame(session, json.dumps({"text": ""}))["type"], "error")
+        reply = server.handle_frame(session, json.dumps({"text": "nyeri dada"}))
+        self.assertEqual(reply["urgent"]["red_flags"], ["nyeri_dada"])
+        self.assertEqual(server.snapshot()["turns"], 1)
+
+    @patch.dict(chat_ws.RATE_LIMIT_SETTINGS, {"enabled": False})
+    def test_connection_rate_limit(self):
+        server = ChatServer(turns_per_minute=2)
+        session = ChatSession()
+        self.assertIsNone(server.admit(session, "10.0.0.1", now=1000.0))
+        self.assertIsNone(server.admit(session, "10.0.0.1", now=1000.0))
+        self.assertEqual(server.admit(session, "10.0.0.1", now=1000.0)["retry_after"], 30)
+        # Another connection has its own bucket
+        self.assertIsNone(server.admit(ChatSession(), "10.0.0.1", now=1000.0))
+        self.assertIsNone(server.admit(session, "10.0.0.1", now=1030.0))
+        self.assertEqual(server.snapshot()["limited"], 1)
+
+    @patch.dict(chat_ws.RATE_LIMIT, {"chat": "1/minute"})
+    def test_shared_client_rate_limit(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            ratelimit.initialize_rate_limiter(os.path.join(test_dir, 'ratelimit.bin'), 64)
+            server = ChatServer()
+            self.assertIsNone(server.admit(ChatSession(), "10.0.0.1", now=1000.0))
+            # A new connection does not reset the client's HTTP chat bucket
+            self.assertEqual(server.admit(ChatSession(), "10.0.0.1", now=1000.0)["error"], "Rate limit exceeded")
+        finally:
+            ratelimit._limiter = None
+            shutil.rmtree(test_dir)
+
+@unittest.skipIf(connect is None, "websockets is not installed")
+@patch.dict(chat_ws.RATE_LIMIT_SETTINGS, {"enabled": False})
+class TestChatServer(unittest.TestCase):
+    def setUp(self):
+        self.server = ChatServer(max_sessions=2)
+        self.loop = asyncio.new_event_loop()
+        ready = self.loop.create_future()
+        self.task = self.loop.create_task(serve("127.0.0.1", 0, self.server, ready))
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.port = asyncio.run_coroutine_threadsafe(asyncio.wait_for(asyncio.shield(ready), 5), self.loop).result()
+
+    def tearDown(self):
+        async def stop():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def test_multiple_sessions_over_one_loop(self):
+        url = f"ws://127.0.0.1:{self.port}"
+        with connect(url) as first, connect(url) as second:
+            first_id = json.loads(first.recv())["session_id"]
+            second_id = json.loads(second.recv())["session_id"]
+            self.assertNotEqual(first_id, second_id)
+
+            first.send(json.dumps({"text": "saya demam"}))
+            second.send(json.dumps({"text": "saya mual"}))
+            self.assertIn("demam", json.loads(first.recv())["medical_terms"])
+            self.assertIn("mual", json.loads(second.recv())["medical_terms"])
+            self.assertEqual(self.server.snapshot()["active_sessions"], 2)
+
+    def test_turns_run_off_the_event_loop(self):
+        threads = []
+        handle = ChatSession.handle
+
+        def recording_handle(session, message):
+            threads.append(threading.current_thread())
+            return handle(session, message)
+
+        with patch.object(ChatSession, "handle", recording_handle), connect(f"ws://127.0.0.1:{self.port}") as ws:
+            ws.recv()
+            ws.send(json.dumps({"text": "saya demam", "predict": True}))
+            self.assertEqual(json.loads(ws.recv())["type"], "reply")
+        self.assertNotEqual(threads, [self.thread])
+        self.assertTrue(threads[0].name.startswith("chat-ws"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core.compact import CompactModel, accuracy_delta_report, export_compact_model
+from app.core.predictor import DiseasePredictor
+
+def train(data, vectorizer=None):
+    pipeline = Pipeline([("tfidf", vectorizer or TfidfVectorizer(sublinear_tf=True)),
+                         ("clf", LogisticRegression(max_iter=1000))])
+    return pipeline.fit(data["symptoms"], data["disease"])
+
+class TestCompactModel(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.data = pd.read_csv("data/symptom_disease_dataset.csv")
+        self.pipeline = train(self.data)
+        self.texts = list(self.data["symptoms"]) + ["Demam dan BATUK berdahak", "tidak ada yang dikenal", ""]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def export(self, dtype, prune=1e-3, pipeline=None):
+        path = os.path.join(self.test_dir, f"model.{dtype}.npz")
+        export_compact_model(pipeline or self.pipeline, path, dtype, prune)
+        return path, CompactModel.load(path)
+
+    def test_precision_levels_track_full_model(self):
+        for dtype, tolerance in [("float32", 1e-6), ("float16", 1e-3), ("int8", 1e-2)]:
+            _, compact = self.export(dtype, prune=0.0)
+            np.testing.assert_allclose(compact.predict_proba(self.texts), self.pipeline.predict_proba(self.texts),
+                                       atol=tolerance)
+            report = accuracy_delta_report(self.pipeline, compact, list(self.data["symptoms"]), list(self.data["disease"]))
+            self.assertEqual(report["top1_agreement"], 1.0)
+            self.assertLess(report["compact_weight_bytes"], report["full_weight_bytes"])
+
+    def test_pruning_drops_small_weights(self):
+        _, full = self.export("float32", prune=0.0)
+        _, pruned = self.export("float32", prune=0.2)
+        self.assertLess(len(pruned.data), len(full.data))
+        self.assertTrue(np.all(np.abs(pruned.data) > 0.2))
+
+    def test_binary_model(self):
+        data = self.data[self.data["disease"].isin(["Flu", "Diabetes"])]
+        pipeline = train(data)
+        _, compact = self.export("float32", prune=0.0, pipeline=pipeline)
+        np.testing.assert_allclose(compact.predict_proba(self.texts), pipeline.predict_proba(self.texts), atol=1e-6)
+
+    def test_rejects_unsupported_pipelines(self):
+        pipeline = train(self.data, TfidfVectorizer(ngram_range=(1, 2)))
+        with self.assertRaises(ValueError):
+            self.export("int8", pipeline=pipeline)
+
+    def test_predictor_serves_compact_artifact(self):
+        path, _ = self.export("int8")
+        model_path = os.path.join(self.test_dir, "model.pkl")
+        joblib.dump(self.pipeline, model_path)
+        compact = DiseasePredictor(path)
+        full = DiseasePredictor(model_path, os.path.join(self.test_dir, "none.npy"), os.path.join(self.test_dir, "none.npz"))
+        self.assertIsNone(compact.table)
+        self.assertIsNone(compact.new_incremental_state())
+
+        terms = ["sering haus", "sering kencing", "lemas"]
+        got, expected = compact.predict(terms), full.predict(terms)
+        self.assertEqual(got[0]["disease"], expected[0]["disease"])
+        self.assertAlmostEqual(got[0]["confidence"], expected[0]["confidence"], places=2)
+        self.assertEqual(compact.predict_batch([terms])[0], got)
+
+if __name__ == '__main__':
+    unittest.main()
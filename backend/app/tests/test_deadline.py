@@ -0,0 +1,101 @@
+import unittest
+import json
+import time
+from unittest.mock import patch
+from app.core import deadline as deadline_module
+from app.core.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    DeadlineStats,
+    check_deadline,
+    set_deadline
+)
+from app.core.predictor import predict_disease, predict_disease_batch
+from app.nlp.engine import NLPEngine
+from app.tests.api_testcase import APITestCase
+
+class TestDeadline(unittest.TestCase):
+    def tearDown(self):
+        set_deadline(None)
+
+    def test_no_deadline_is_a_noop(self):
+        """Code paths outside a request never raise"""
+        set_deadline(None)
+        check_deadline("predict")
+
+    def test_live_deadline_passes(self):
+        set_deadline(Deadline("predict", time.time() + 60))
+        check_deadline("predict")
+
+    def test_expired_deadline_abandons_and_counts(self):
+        """An expired deadline raises once per stage and is counted once"""
+        deadline_module._stats = DeadlineStats()
+        set_deadline(Deadline("predict", time.time() - 1))
+        with self.assertRaises(DeadlineExceeded) as ctx:
+            check_deadline("nlp.tokenize")
+        self.assertEqual(ctx.exception.stage, "nlp.tokenize")
+        with self.assertRaises(DeadlineExceeded):
+            check_deadline("predict")
+
+        stats = deadline_module.deadline_stats()
+        self.assertEqual(stats["predict"]["abandoned"], {"nlp.tokenize": 1})
+
+    def test_nlp_pipeline_stops_early(self):
+        """NLPEngine.process checks the deadline before its first stage"""
+        engine = NLPEngine()
+        set_deadline(Deadline("predict", time.time() - 1))
+        with self.assertRaises(DeadlineExceeded) as ctx:
+            engine.process("saya demam dan batuk")
+        self.assertEqual(ctx.exception.stage, "nlp.clean_text")
+
+class TestDeadlineHooks(APITestCase):
+    def tearDown(self):
+        set_deadline(None)
+        super().tearDown()
+
+    def test_expired_request_returns_504(self):
+        """A request the proxy accepted longer ago than its budget is abandoned"""
+        response = self.client.post(
+            '/chat',
+            data=json.dumps({"text": "halo"}),
+            content_type='application/json',
+            headers={"X-Request-Timeout": "1", "X-Request-Start": f"t={time.time() - 2:.3f}"}
+        )
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(json.loads(response.data)["stage"], "chat")
+
+    def test_invalid_timeouts_are_ignored(self):
+        """nan, inf and non-positive X-Request-Timeout values keep the endpoint default"""
+        for value in ("nan", "inf", "-inf", "0", "-5", "soon"):
+            response = self.client.post('/chat', data=json.dumps({"text": "halo"}),
+                                        content_type='application/json',
+                                        headers={"X-Request-Timeout": value, "X-Request-Start": "t=nan"})
+            self.assertEqual(response.status_code, 200, value)
+
+    def test_predict_checks_deadline_before_loading_model(self):
+        set_deadline(Deadline("predict", time.time() - 1))
+        with patch("app.core.predictor.get_predictor") as get_predictor:
+            with self.assertRaises(DeadlineExceeded):
+                predict_disease({"medical_terms": ["demam"]}, "pediatric")
+            with self.assertRaises(DeadlineExceeded):
+                predict_disease_batch([{"medical_terms": ["demam"]}], "pediatric")
+        get_predictor.assert_not_called()
+
+    def test_coalesced_wait_timeout_returns_504(self):
+        """A follower whose shared wait times out is abandoned even if the clock has not quite run out"""
+        deadline_module._stats = DeadlineStats()
+        with patch.dict("app.api.routes.COALESCING", {"enabled": True}), \
+                patch("app.api.routes._prediction_flight.do", side_effect=TimeoutError):
+            response = self.client.post('/predict', json={"text": "demam"}, headers={"X-Request-Timeout": "30"})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(json.loads(response.data)["stage"], "predict.coalesced")
+        self.assertEqual(deadline_module.deadline_stats()["predict"]["abandoned"], {"predict.coalesced": 1})
+
+    def test_default_deadline_allows_request(self):
+        response = self.client.post('/chat', data=json.dumps({"text": "halo"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("deadlines", json.loads(self.client.get('/metrics').data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest.mock import patch
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from app.core import drift
+from app.core.drift import (
+    CountMinSketch,
+    DriftMonitor,
+    SpaceSaving,
+    build_term_distribution,
+    load_term_distribution,
+    read_drift
+)
+from app.tests.api_testcase import APITestCase
+
+TRAINING = ["demam, sakit kepala, nyeri otot", "demam, batuk, pilek", "mual, muntah, diare", "batuk, sesak nafas"]
+
+class TestSketches(unittest.TestCase):
+    def test_count_min_never_undercounts(self):
+        rng = np.random.default_rng(0)
+        tokens = [f"t{i}" for i in rng.zipf(1.3, 20000) if i < 5000]
+        sketch = CountMinSketch(width=1024, depth=4)
+        sketch.add(tokens)
+        exact = Counter(tokens)
+        names = list(exact)
+        estimates = sketch.estimate(names)
+        self.assertTrue(np.all(estimates >= np.array([exact[n] for n in names])))
+        # The heavy hitters are estimated closely
+        top = [name for name, _ in exact.most_common(5)]
+        for name, estimate in zip(top, sketch.estimate(top)):
+            self.assertLess(estimate - exact[name], 0.05 * exact[name])
+
+    def test_space_saving_keeps_heavy_hitters(self):
+        rng = np.random.default_rng(1)
+        stream = [f"t{i}" for i in rng.zipf(1.5, 20000)]
+        summary = SpaceSaving(capacity=50)
+        for token in stream:
+            summary.add(token)
+        exact = Counter(stream)
+        self.assertEqual(len(summary.counts), 50)
+        top = summary.top(5)
+        self.assertEqual([entry["token"] for entry in top], [name for name, _ in exact.most_common(5)])
+        for entry in top:
+            self.assertGreaterEqual(entry["count"], exact[entry["token"]])
+            self.assertLessEqual(entry["count"] - entry["error"], exact[entry["token"]])
+
+class TestDriftMonitor(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        vectorizer = TfidfVectorizer().fit(TRAINING)
+        model_path = os.path.join(self.test_dir, "model.pkl")
+        with open(model_path, "wb") as f:
+            f.write(b"model")
+        path = os.path.join(self.test_dir, "terms.json")
+        build_term_distribution(vectorizer, TRAINING, path, model_path)
+        self.distribution = load_term_distribution(path)
+        self.snapshots = os.path.join(self.test_dir, "drift")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def monitor(self):
+        return DriftMonitor(self.distribution, self.snapshots, width=1024)
+
+    def test_unknown_tokens_and_drift(self):
+        monitor = self.monitor()
+        monitor.observe([["demam", "sakit_kepala"], ["batuk", "pilek"], ["sakit_kepala"]] * 10)
+        monitor.refresh()
+        report = read_drift(self.snapshots, self.distribution)
+        self.assertEqual(report["requests"], 30)
+        self.assertAlmostEqual(report["unknown_rate"], 20 / 50)
+        self.assertAlmostEqual(report["no_known_tokens_rate"], 1 / 3)
+        self.assertEqual(report["top_unknown"], [{"token": "sakit_kepala", "count": 20, "error": 0}])
+        shifted = report["drift"]["psi"]
+
+        # Traffic shaped like the training data barely drifts
+        monitor = self.monitor()
+        monitor.observe([[term for term in text.split(", ")] for text in TRAINING] * 10)
+        monitor.refresh()
+        report = read_drift(self.snapshots, self.distribution)
+        self.assertLess(report["drift"]["psi"], 0.01)
+        self.assertGreater(shifted, 1.0)
+
+    def test_workers_are_merged_and_decay(self):
+        monitor = self.monitor()
+        monitor.observe([["demam", "kejang"]] * 4)
+        monitor.refresh()
+        other = self.monitor()
+        other.observe([["kejang"], ["batuk"]])
+        with patch("app.core.drift.os.getpid", return_value=os.getpid() + 100000):
+            other.refresh()
+        report = read_drift(self.snapshots, self.distribution)
+        self.assertEqual(report["workers"], 2)
+        self.assertEqual(report["requests"], 6)
+        self.assertEqual(report["top_unknown"][0], {"token": "kejang", "count": 5, "error": 0})
+
+        monitor.decay()
+        self.assertEqual(monitor.counters["requests"], 2)
+        self.assertEqual(monitor.unknown.top(1)[0]["count"], 2)
+        self.assertEqual(int(monitor.sketch.estimate(["demam"])[0]), 2)
+
+class TestDriftEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = os.path.join(self.test_dir, "drift")
+        distribution = load_term_distribution("model/term_distribution.json")
+        drift._monitor = DriftMonitor(distribution, self.directory, flush_interval=0.01)
+
+    def tearDown(self):
+        drift._monitor = None
+        super().tearDown()
+
+    @patch('app.api.routes.process_symptoms')
+    def test_predict_feeds_the_monitor(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["demam", "sakit_kepala"]}
+        self.client.post('/predict', json={"text": "demam sakit kepala"})
+        drift._monitor.drain()
+
+        with patch.dict(drift.DRIFT, {"directory": self.directory}):
+            report = self.client.get('/drift?top=5').get_json()
+            self.assertEqual(self.client.get('/drift?top=0').status_code, 400)
+        self.assertEqual(report["requests"], 1)
+        self.assertEqual(report["top_unknown"][0]["token"], "sakit_kepala")
+        self.assertIsNotNone(report["drift"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from app.core import eventlog
+from app.core.eventlog import EventLog, labeled_predictions, read_events
+from app.tests.api_testcase import APITestCase
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def segments(self):
+        return sorted(os.listdir(self.test_dir))
+
+    def test_rotation_and_sealing(self):
+        log = EventLog(self.test_dir, batch_size=1, segment_bytes=100, fsync="always")
+        for i in range(5):
+            self.assertTrue(log.append({"type": "prediction", "prediction_id": f"p{i}", "text": "x" * 80}))
+        log.drain()
+        self.assertTrue(self.segments()[-1].endswith(".jsonl.open"))
+
+        log.close()
+        segments = self.segments()
+        self.assertEqual(len(segments), 5)
+        self.assertTrue(all(name.endswith(".jsonl") for name in segments))
+        self.assertEqual([r["prediction_id"] for r in read_events(self.test_dir)], [f"p{i}" for i in range(5)])
+        self.assertEqual(log.stats()["records_written"], 5)
+
+    def test_torn_last_line_is_skipped(self):
+        log = EventLog(self.test_dir, fsync="never")
+        log.append({"type": "prediction", "prediction_id": "a"})
+        log.close()
+        with open(os.path.join(self.test_dir, self.segments()[0]), "ab") as f:
+            f.write(b'{"type": "predic')
+        self.assertEqual([r["prediction_id"] for r in read_events(self.test_dir)], ["a"])
+
+    def test_fsync_policy_is_validated(self):
+        with self.assertRaises(ValueError):
+            EventLog(self.test_dir, fsync="sometimes")
+
+    def test_feedback_join(self):
+        log = EventLog(self.test_dir)
+        log.append({"type": "prediction", "prediction_id": "a", "ts": 1.0, "medical_terms": ["demam"]})
+        log.append({"type": "prediction", "prediction_id": "b", "ts": 2.0, "medical_terms": ["batuk"]})
+        log.append({"type": "feedback", "prediction_id": "a", "ts": 3.0, "diagnosis": "Flu"})
+        log.append({"type": "feedback", "prediction_id": "a", "ts": 4.0, "diagnosis": "Tifus"})
+        log.append({"type": "feedback", "prediction_id": "c", "ts": 4.0, "diagnosis": "Flu"})
+        log.close()
+
+        rows = list(labeled_predictions(self.test_dir))
+        self.assertEqual([(r["prediction_id"], r["diagnosis"]) for r in rows], [("a", "Tifus")])
+        self.assertEqual(list(labeled_predictions(self.test_dir, since=1.5)), [])
+
+class TestFeedbackEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        eventlog._event_log = EventLog(os.path.join(self.test_dir, "events"))
+        keys = patch('app.api.routes.CLINICIAN_API_KEYS', ["clinician-key"])
+        keys.start()
+        self.addCleanup(keys.stop)
+
+    def post_feedback(self, body, key="clinician-key"):
+        return self.client.post('/feedback', json=body, headers={"X-API-Key": key})
+
+    def tearDown(self):
+        eventlog._event_log.close()
+        eventlog._event_log = None
+        super().tearDown()
+
+    @patch('app.api.routes.process_symptoms')
+    def test_prediction_and_feedback_are_logged(self, mock_process):
+        mock_process.return_value = {"original_text": "demam", "medical_terms": ["demam", "sakit kepala"]}
+        prediction_id = self.client.post('/predict', json={"text": "demam"}).get_json()["prediction_id"]
+
+        response = self.post_feedback({"prediction_id": prediction_id, "diagnosis": "Demam Berdarah"})
+        self.assertEqual(response.status_code, 202)
+        eventlog._event_log.close()
+        rows = list(labeled_predictions(os.path.join(self.test_dir, "events")))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["medical_terms"], ["demam", "sakit kepala"])
+        self.assertEqual(rows[0]["diagnosis"], "Demam Berdarah")
+
+    def test_invalid_feedback(self):
+        for body in ({}, {"prediction_id": "abc", "diagnosis": "Flu"},
+                     {"prediction_id": "0" * 32, "diagnosis": " "},
+                     {"prediction_id": "0" * 32, "diagnosis": "Flu", "note": 5},
+                     {"prediction_id": "0" * 32, "diagnosis": "Tifus"}):
+            self.assertEqual(self.post_feedback(body).status_code, 400)
+
+        with patch.object(eventlog, "_event_log", None), patch.dict(eventlog.EVENT_LOG, {"enabled": False}):
+            response = self.post_feedback({"prediction_id": "0" * 32, "diagnosis": "Flu"})
+            self.assertEqual(response.status_code, 503)
+
+    def test_feedback_needs_clinician_or_admin_key(self):
+        body = {"prediction_id": "0" * 32, "diagnosis": "Flu"}
+        self.assertEqual(self.client.post('/feedback', json=body).status_code, 401)
+        self.assertEqual(self.post_feedback(body, key="wrong").status_code, 401)
+        with patch('app.api.routes.ADMIN_API_KEYS', ["admin-key"]):
+            self.assertEqual(self.post_feedback(body, key="admin-key").status_code, 202)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from app.core.hierarchy import HierarchicalClassifier
+from app.core.predictor import DiseasePredictor
+from app.core.topk import top_k_indices
+
+class TestTopK(unittest.TestCase):
+    def test_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        scores = rng.random((20, 500))
+        expected = np.argsort(-scores, axis=1)[:, :3]
+        np.testing.assert_array_equal(top_k_indices(scores, 3), expected)
+        np.testing.assert_array_equal(top_k_indices(scores[0], 3), expected[0])
+        np.testing.assert_array_equal(top_k_indices(scores[0, :2], 3), np.argsort(-scores[0, :2]))
+
+def synthetic_icd_dataset(n_groups=8, per_group=6, rows=20, seed=0):
+    """Diseases sharing group-level symptoms plus a few of their own"""
+    rng = np.random.default_rng(seed)
+    texts, labels, groups = [], [], {}
+    for g in range(n_groups):
+        for d in range(per_group):
+            disease = f"D{g:02d}{d}"
+            groups[disease] = f"G{g}"
+            shared = [f"grup{g}gejala{i}" for i in range(4)]
+            own = [f"khas{g}x{d}y{i}" for i in range(3)]
+            for _ in range(rows):
+                terms = list(rng.choice(shared, 2, replace=False)) + list(rng.choice(own, 2, replace=False))
+                texts.append(", ".join(terms))
+                labels.append(disease)
+    return texts, labels, groups
+
+class TestHierarchicalClassifier(unittest.TestCase):
+    def setUp(self):
+        self.texts, self.labels, self.groups = synthetic_icd_dataset()
+
+    def fit(self, **params):
+        pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", HierarchicalClassifier(**params))])
+        return pipeline.fit(self.texts, self.labels)
+
+    def test_top_k_matches_dense_probabilities_with_full_beam(self):
+        pipeline = self.fit(groups=self.groups, beam=8)
+        X = pipeline[:-1].transform(self.texts[:40])
+        dense = pipeline.predict_proba(self.texts[:40])
+        np.testing.assert_allclose(dense.sum(axis=1), 1.0)
+        indices, probabilities = pipeline.named_steps["clf"].top_k(X, 3)
+        for row, top, p in zip(dense, indices, probabilities):
+            np.testing.assert_array_equal(top, top_k_indices(row, 3))
+            np.testing.assert_allclose(p, row[top])
+
+    def test_narrow_beam_and_clustered_groups(self):
+        for params in [{"groups": self.groups, "beam": 1}, {"n_groups": 8, "beam": 2, "random_state": 0}]:
+            pipeline = self.fit(**params)
+            self.assertGreater((pipeline.predict(self.texts) == np.array(self.labels)).mean(), 0.9)
+
+    def test_missing_group_is_rejected(self):
+        groups = dict(self.groups)
+        groups.pop("D000")
+        with self.assertRaises(ValueError):
+            self.fit(groups=groups)
+
+    def test_predictor_keeps_response_format(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            data = pd.read_csv("data/symptom_disease_dataset.csv")
+            groups = pd.read_csv("data/disease_groups.csv")
+            pipeline = Pipeline([
+                ("tfidf", TfidfVectorizer()),
+                ("clf", HierarchicalClassifier(groups=dict(zip(groups["disease"], groups["group"])), beam=5))
+            ]).fit(data["symptoms"], data["disease"])
+            model_path = os.path.join(test_dir, "model.pkl")
+            joblib.dump(pipeline, model_path)
+            missing = os.path.join(test_dir, "missing")
+            predictor = DiseasePredictor(model_path, missing + ".npy", missing + ".npz")
+
+            terms = ["sering haus", "sering kencing", "lemas"]
+            predictions = predictor.predict(terms)
+            self.assertEqual(predictions[0]["disease"], "Diabetes")
+            self.assertEqual(set(predictions[0]), {"disease", "confidence", "symptoms", "stage"})
+            self.assertEqual(predictor.predict_batch([terms])[0], predictions)
+            self.assertIsNone(predictor.new_incremental_state())
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core.incremental import ConversationPredictions, IncrementalPrediction, supports_incremental
+from app.core.predictor import DiseasePredictor
+
+def train_pipeline(vectorizer, data):
+    pipeline = Pipeline([("tfidf", vectorizer), ("clf", LogisticRegression(max_iter=1000))])
+    pipeline.fit(data["symptoms"], data["disease"])
+    return pipeline
+
+class TestIncrementalPrediction(unittest.TestCase):
+    def setUp(self):
+        self.data = pd.read_csv("data/symptom_disease_dataset.csv")
+        self.pipeline = train_pipeline(TfidfVectorizer(), self.data)
+
+    def assert_matches(self, pipeline, state, terms):
+        expected = pipeline.predict_proba([", ".join(terms)])[0]
+        np.testing.assert_allclose(state.probabilities(), expected, rtol=1e-9, atol=1e-12)
+
+    def test_matches_full_pipeline_across_turns(self):
+        """Adding and removing terms gives the same probabilities as a full run"""
+        state = IncrementalPrediction(self.pipeline.named_steps["tfidf"], self.pipeline.named_steps["clf"])
+        self.assert_matches(self.pipeline, state, [])
+        turns = [
+            ["demam"],
+            ["demam", "sakit kepala"],
+            ["demam", "sakit kepala", "nyeri otot", "tidak dikenal"],
+            ["sakit kepala", "nyeri otot"],
+            ["batuk", "sesak napas"],
+            [],
+        ]
+        for terms in turns:
+            state.update(terms)
+            self.assert_matches(self.pipeline, state, terms)
+
+    def test_repeated_tokens_and_sublinear_tf(self):
+        """Tokens shared between terms accumulate counts like the vectorizer does"""
+        for vectorizer in [TfidfVectorizer(), TfidfVectorizer(sublinear_tf=True), TfidfVectorizer(binary=True)]:
+            pipeline = train_pipeline(vectorizer, self.data)
+            state = IncrementalPrediction(pipeline.named_steps["tfidf"], pipeline.named_steps["clf"])
+            for terms in [["sakit kepala", "sakit perut"], ["sakit perut"], ["sakit perut", "mual", "sakit kepala"]]:
+                state.update(terms)
+                self.assert_matches(pipeline, state, terms)
+
+    def test_binary_classes(self):
+        data = self.data[self.data["disease"].isin(["Flu", "Diabetes"])]
+        pipeline = train_pipeline(TfidfVectorizer(), data)
+        state = IncrementalPrediction(pipeline.named_steps["tfidf"], pipeline.named_steps["clf"])
+        state.update(["demam", "batuk"])
+        self.assert_matches(pipeline, state, ["demam", "batuk"])
+
+    def test_rejects_non_additive_vectorizers(self):
+        clf = self.pipeline.named_steps["clf"]
+        self.assertTrue(supports_incremental(self.pipeline.named_steps["tfidf"], clf))
+        self.assertFalse(supports_incremental(TfidfVectorizer(ngram_range=(1, 2)), clf))
+        self.assertFalse(supports_incremental(TfidfVectorizer(analyzer="char"), clf))
+
+    def test_predictor_formats_incremental_results(self):
+        predictor = DiseasePredictor.__new__(DiseasePredictor)
+        predictor.model = self.pipeline
+        predictor.table = None
+        predictor.cascade = None
+        state = predictor.new_incremental_state()
+        terms = ["demam", "batuk", "pilek"]
+        incremental = predictor.predict_incremental(state, terms)
+        full = predictor.predict(terms)
+        self.assertEqual([p["disease"] for p in incremental], [p["disease"] for p in full])
+        for got, expected in zip(incremental, full):
+            self.assertAlmostEqual(got["confidence"], expected["confidence"], places=12)
+
+class TestConversationPredictions(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        store = ConversationPredictions(object, max_conversations=2, ttl=60.0)
+        first = store.get("a")
+        self.assertIs(store.get("a"), first)
+        store.get("b")
+        store.get("c")
+        self.assertEqual(len(store), 2)
+        self.assertIsNot(store.get("a"), first)
+
+        expired = ConversationPredictions(object, ttl=-1.0)
+        state = expired.get("a")
+        self.assertIsNot(expired.get("a"), state)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import threading
+import time
+from unittest.mock import patch
+from app.core import predictor as predictor_module
+from app.core.models import ModelManager, UnknownModel
+from app.tests.api_testcase import APITestCase
+
+class FakePredictor:
+    def __init__(self, path, nbytes):
+        self.path = path
+        self.nbytes = nbytes
+
+class TestModelManager(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def loader(self, path, table, cascade):
+        self.loads.append(path)
+        self.release.wait(5)
+        return FakePredictor(path, 40)
+
+    def manager(self, budget=100, **models):
+        models = models or {"a": "a.pkl", "b": {"path": "b.pkl"}, "c": "c.pkl"}
+        return ModelManager(models, budget, self.loader, lambda p: p.nbytes)
+
+    def test_lazy_load_and_lru_eviction(self):
+        manager = self.manager()
+        self.assertEqual(manager.stats()["resident"], [])
+        a = manager.get("a")
+        self.assertIs(manager.get("a"), a)
+        manager.get("b")
+        manager.get("a")  # b is now least recently used
+        manager.get("c")
+        stats = manager.stats()
+        self.assertEqual(stats["resident"], ["a", "c"])
+        self.assertEqual(stats["resident_bytes"], 80)
+        self.assertEqual(stats["models"]["b"]["evictions"], 1)
+        self.assertFalse(stats["models"]["b"]["resident"])
+
+        manager.get("b")
+        self.assertEqual(self.loads, ["a.pkl", "b.pkl", "c.pkl", "b.pkl"])
+        self.assertEqual(manager.stats()["models"]["b"]["loads"], 2)
+        self.assertEqual(manager.stats()["models"]["a"]["hits"], 2)
+        self.assertIsNotNone(manager.stats()["models"]["a"]["last_load_ms"])
+
+    def test_oversized_model_stays_resident_alone(self):
+        manager = self.manager(budget=10)
+        manager.get("a")
+        manager.get("b")
+        self.assertEqual(manager.stats()["resident"], ["b"])
+
+    def test_concurrent_first_requests_load_once(self):
+        manager = self.manager()
+        self.release.clear()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.get("a"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while not self.loads:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.loads, ["a.pkl"])
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_unknown_model_and_load_errors(self):
+        manager = self.manager()
+        with self.assertRaises(UnknownModel):
+            manager.get("missing")
+        failing = ModelManager({"bad": "bad.pkl"}, 100, lambda *args: 1 / 0, len)
+        with self.assertRaises(ZeroDivisionError):
+            failing.get("bad")
+        self.assertEqual(failing.stats()["models"]["bad"]["load_errors"], 1)
+        with self.assertRaises(ValueError):
+            ModelManager({"nopath": {}}, 100, self.loader, len)
+
+class TestModelRouting(APITestCase):
+    def setUp(self):
+        super().setUp()
+        missing = os.path.join(self.test_dir, "missing")
+        predictor_module._models = ModelManager(
+            {"pediatric": {"path": "model/disease_classifier.pkl", "table": missing + ".npy",
+                           "cascade": missing + ".npz"}},
+            1 << 30, predictor_module.DiseasePredictor, lambda p: p.memory_bytes()
+        )
+
+    def tearDown(self):
+        predictor_module._models = None
+        super().tearDown()
+
+    @patch('app.api.routes.process_symptoms')
+    def test_named_model_is_loaded_on_first_request(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["sering haus", "sering kencing"]}
+        self.assertFalse(self.client.get('/metrics').get_json()["models"]["models"]["pediatric"]["resident"])
+
+        response = self.client.post('/predict', json={"text": "sering haus", "model": "pediatric"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["predictions"][0]["disease"], "Diabetes")
+
+        models = self.client.get('/metrics').get_json()["models"]
+        self.assertEqual(models["resident"], ["pediatric"])
+        self.assertGreater(models["resident_bytes"], 0)
+
+        response = self.client.post('/predict', json={"text": "sering haus", "model": "geriatric"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/predict/stream?model=geriatric', data='"demam"\n',
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
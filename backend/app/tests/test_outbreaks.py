@@ -0,0 +1,169 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from unittest.mock import patch
+from app.core import outbreaks, rollups
+from app.core.outbreaks import OutbreakDetector, OutbreakMonitor, read_outbreaks
+from app.core.rollups import RollupStore
+from app.tests.api_testcase import APITestCase
+
+HOUR = 3600
+
+def replay(detector, counts, disease="Demam Berdarah", region="Jakarta", start=0):
+    """Feed counts[i] predictions spread over hour i"""
+    for hour, count in enumerate(counts):
+        for i in range(count):
+            detector.observe(disease, region, start + (hour + i / max(count, 1)) * HOUR)
+
+class TestOutbreakDetector(unittest.TestCase):
+    def test_spike_alerts_after_warmup(self):
+        detector = OutbreakDetector(warmup=24)
+        baseline = np.random.default_rng(0).poisson(10, 72).tolist()
+        replay(detector, baseline + [40, 45, 12])
+        detector.advance(len(baseline) * HOUR + 3 * HOUR)
+
+        # One alert per outbreak hour, none once counts are back near the baseline
+        alerts = list(detector.alerts)
+        self.assertEqual([a["bucket_start"] for a in alerts], [72 * HOUR, 73 * HOUR])
+        self.assertEqual(alerts[0]["observed"], 40)
+        self.assertAlmostEqual(alerts[0]["expected"], 10, delta=2)
+        # The outbreak buckets did not drag the baseline up
+        self.assertLess(detector.series[("Demam Berdarah", "Jakarta")].mean, 12)
+
+    def test_rise_stays_out_of_baseline(self):
+        detector = OutbreakDetector(warmup=24)
+        replay(detector, [10] * 48 + [25])
+        state = detector.series[("Demam Berdarah", "Jakarta")]
+        before = (state.mean, state.var)
+        for hour in range(49, 60):
+            replay(detector, [25], start=hour * HOUR)
+        detector.advance(60 * HOUR)
+
+        self.assertGreater(len(detector.alerts), 1)
+        self.assertEqual((state.mean, state.var), before)
+
+    def test_moderate_surge_alerts(self):
+        detector = OutbreakDetector(warmup=24)
+        replay(detector, [10] * 48 + [16] * 12)
+        detector.advance(60 * HOUR)
+        self.assertTrue(detector.alerts)
+        self.assertAlmostEqual(detector.series[("Demam Berdarah", "Jakarta")].mean, 10)
+
+    def test_noise_joins_baseline_once_cusum_resets(self):
+        detector = OutbreakDetector(warmup=2)
+        replay(detector, [10, 10, 10, 13, 7, 7, 7, 7])
+        detector.advance(8 * HOUR)
+        state = detector.series[("Demam Berdarah", "Jakarta")]
+        self.assertEqual(state.held, [])
+        self.assertEqual(state.buckets, 8)
+
+    def test_steady_traffic_and_warmup_do_not_alert(self):
+        detector = OutbreakDetector(warmup=24)
+        replay(detector, [0] * 5 + [30] + np.random.default_rng(1).poisson(10, 200).tolist())
+        self.assertEqual(list(detector.alerts), [])
+
+    def test_gaps_and_fixed_series(self):
+        detector = OutbreakDetector(warmup=2, max_series=2)
+        replay(detector, [10, 10, 10])
+        detector.observe("Demam Berdarah", "Jakarta", 10_000 * HOUR)
+        state = detector.series[("Demam Berdarah", "Jakarta")]
+        self.assertLessEqual(detector.stats["buckets"], 3 + detector.max_gap)
+        self.assertLess(state.mean, 0.1)
+
+        detector.observe("Flu", None, 0)
+        detector.observe("Campak", "Bandung", 0)
+        self.assertEqual(len(detector.series), 2)
+        self.assertIn(("Flu", "unknown"), detector.series)
+        self.assertEqual(detector.stats["overflow"], 1)
+
+class TestOutbreakMonitor(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.rollups = RollupStore(os.path.join(self.test_dir, "rollups"), retention_seconds=72 * HOUR,
+                                   regions=["Jakarta"])
+        self.directory = os.path.join(self.test_dir, "outbreaks")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_counts_are_summed_across_workers(self):
+        base = (int(time.time() // HOUR) - 62) * HOUR
+        counts = [10] * 48 + [16] * 12
+        # Two workers share every hour: neither one alone sees the surge clearly
+        for hour, count in enumerate(counts):
+            for i in range(count // 2):
+                self.rollups.record("Flu", "Jakarta", 0.9, now=base + hour * HOUR + i)
+        os.rename(os.path.join(self.rollups.directory, f"worker-{os.getpid()}"),
+                  os.path.join(self.rollups.directory, "worker-1"))
+        other = RollupStore(self.rollups.directory, retention_seconds=72 * HOUR, regions=["Jakarta"])
+        for hour, count in enumerate(counts):
+            for i in range(count - count // 2):
+                other.record("Flu", "Jakarta", 0.9, now=base + hour * HOUR + i)
+
+        monitor = OutbreakMonitor(OutbreakDetector(), self.rollups, self.directory)
+        with monitor._lock:
+            monitor._score(base + 60 * HOUR + 120)
+        summed = OutbreakDetector()
+        replay(summed, counts, disease="Flu", start=base)
+        summed.advance(base + 60 * HOUR)
+
+        self.assertTrue(summed.alerts)
+        self.assertEqual([a["bucket_start"] for a in monitor.detector.alerts],
+                         [a["bucket_start"] for a in summed.alerts])
+        self.assertEqual(monitor.detector.series[("Flu", "Jakarta")].mean, summed.series[("Flu", "Jakarta")].mean)
+        # Nothing new is due until the next bucket has closed and settled
+        self.assertFalse(monitor.tick(base + 60 * HOUR + 180))
+
+    def test_snapshots_are_merged(self):
+        self.rollups.record("Flu", "Jakarta", 0.9)
+        monitor = OutbreakMonitor(OutbreakDetector(), self.rollups, self.directory)
+        monitor.refresh()
+
+        # A snapshot left by an exited worker: its alerts stay, its scores do not
+        alert = {"disease": "Campak", "region": "Bogor", "bucket_start": 0}
+        exited = {"pid": 2 ** 22 + 1, "published": 0, "bucket_seconds": HOUR, "scored_until": 2 ** 40,
+                  "series": [{"disease": "Flu", "region": "Jakarta", "cusum": 9.0, "current_z": 0.0}],
+                  "alerts": [alert]}
+        with open(os.path.join(self.directory, "worker-0.json"), "w") as f:
+            json.dump(exited, f)
+        # Workers raise the same alert; it is listed once
+        with open(os.path.join(self.directory, "worker-1.json"), "w") as f:
+            json.dump(dict(exited, pid=os.getpid(), published=time.time(), scored_until=0), f)
+        result = read_outbreaks(self.directory)
+        self.assertEqual(result["workers"], 2)
+        self.assertEqual([s["current_count"] for s in result["series"]], [1])
+        self.assertEqual(result["alerts"], [alert])
+
+        read_outbreaks(self.directory, max_age=60)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "worker-0.json")))
+
+class TestOutbreakEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = os.path.join(self.test_dir, "outbreaks")
+        rollups._rollups = RollupStore(os.path.join(self.test_dir, "rollups"), regions=["Medan"])
+        outbreaks._monitor = OutbreakMonitor(OutbreakDetector(), rollups._rollups, self.directory)
+
+    def tearDown(self):
+        outbreaks._monitor = None
+        rollups._rollups = None
+        super().tearDown()
+
+    @patch('app.api.routes.process_symptoms')
+    def test_predictions_are_observed(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["sering haus", "sering kencing"]}
+        body = self.client.post('/predict', json={"text": "sering haus", "region": "Medan"}).get_json()
+        outbreaks._monitor.drain()
+
+        with patch.dict(outbreaks.OUTBREAKS, {"directory": self.directory}):
+            result = self.client.get('/outbreaks?region=Medan').get_json()
+        self.assertEqual(len(result["series"]), 1)
+        self.assertEqual(result["series"][0]["disease"], body["predictions"][0]["disease"].strip())
+        self.assertEqual(result["series"][0]["current_count"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+import shutil
+import tempfile
+import itertools
+import joblib
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core.predictor import DiseasePredictor
+from app.core.prediction_table import (
+    PredictionTable,
+    build_prediction_table,
+    model_fingerprint,
+    save_prediction_table
+)
+
+class TestPredictionTable(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        data = pd.read_csv("data/symptom_disease_dataset.csv")
+        self.pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=1000))])
+        self.pipeline.fit(data["symptoms"], data["disease"])
+        self.model_path = os.path.join(self.test_dir, "model.pkl")
+        self.table_path = os.path.join(self.test_dir, "table.npy")
+        joblib.dump(self.pipeline, self.model_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def build(self, max_terms=2):
+        table = build_prediction_table(self.pipeline, max_terms, batch_size=50)
+        save_prediction_table(self.table_path, table, {
+            "model_sha256": model_fingerprint(self.model_path),
+            "classes": [str(c) for c in self.pipeline.classes_],
+            "max_terms": max_terms,
+        })
+        return table
+
+    def assert_same_predictions(self, got, expected):
+        self.assertEqual([p["disease"] for p in got], [p["disease"] for p in expected])
+        for a, b in zip(got, expected):
+            self.assertAlmostEqual(a["confidence"], b["confidence"], places=6)
+
+    def test_table_matches_model(self):
+        """Every tabulated symptom set answers like the model, with inference skipped"""
+        self.build(max_terms=2)
+        predictor = DiseasePredictor(self.model_path, self.table_path)
+        model_only = DiseasePredictor(self.model_path, os.path.join(self.test_dir, "missing.npy"))
+        self.assertIsNone(model_only.table)
+
+        terms = ["demam", "batuk", "sakit kepala", "mual", "tidak dikenal"]
+        cases = [list(c) for size in range(3) for c in itertools.combinations(terms, size)]
+        for case in cases:
+            self.assert_same_predictions(predictor.predict(case), model_only.predict(case))
+        for got, expected in zip(predictor.predict_batch(cases), model_only.predict_batch(cases)):
+            self.assert_same_predictions(got, expected)
+
+        stats = predictor.table_stats()
+        self.assertGreater(stats["hits"], 0)
+        self.assertGreater(stats["uncovered"], 0)  # "sakit kepala" plus another term is 3 tokens
+        self.assertEqual(stats["hits"] + stats["uncovered"] + stats["misses"], 2 * len(cases))
+
+    def test_uncovered_sets_fall_back(self):
+        self.build(max_terms=2)
+        table = PredictionTable.load(self.table_path, self.pipeline, self.model_path)
+        self.assertIsNone(table.lookup(["demam", "batuk", "pilek"]))
+        self.assertIsNone(table.lookup(["sakit kepala", "sakit perut"]))  # "sakit" counted twice
+        self.assertIsNotNone(table.lookup(["DEMAM"]))
+        self.assertEqual(table.stats()["uncovered"], 2)
+
+    def test_terms_and_row_limit(self):
+        """Only the configured terms are combined, and oversized builds are refused"""
+        table = build_prediction_table(self.pipeline, 2, terms=["demam", "batuk", "sakit kepala"])
+        # {}, demam, batuk, sakit kepala, demam + batuk; "sakit kepala" fills both token slots alone
+        self.assertEqual(len(table), 5)
+        with self.assertRaises(ValueError):
+            build_prediction_table(self.pipeline, 2, terms=["demam", "batuk", "sakit kepala"], max_rows=4)
+
+    def test_stale_table_is_ignored(self):
+        self.build(max_terms=1)
+        with open(self.model_path, "ab") as f:
+            f.write(b"retrained")
+        self.assertIsNone(PredictionTable.load(self.table_path, self.pipeline, self.model_path))
+
+if __name__ == '__main__':
+    unittest.main()
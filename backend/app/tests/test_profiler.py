@@ -0,0 +1,137 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from app.core import profiler
+from app.core.profiler import ProfilerControl, RequestProfiler, live_workers, read_job, sample_stacks, submit_job
+from app.tests.api_testcase import APITestCase
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.control = ProfilerControl(self.test_dir)
+        # Tests drive poll() themselves instead of the control thread
+        self.control._pid = os.getpid()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def wait_for(self, job_id, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.control.poll()
+            result = read_job(self.test_dir, job_id)
+            if result["status"] == "done":
+                return result
+            time.sleep(0.02)
+        self.fail(f"profiling job {job_id} did not finish")
+
+    def test_sample_stacks(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        worker.start()
+        try:
+            result = sample_stacks(0.2, 0.005)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertGreater(result["samples"], 5)
+        busy = [line for line in result["output"].splitlines() if line.startswith("thread:busy;")]
+        self.assertTrue(busy)
+        self.assertIn(f"{__name__}:busy_loop", busy[0])
+
+    def test_request_profiler(self):
+        requests = RequestProfiler()
+        self.assertIsNone(requests.start("predict"))
+        requests.arm({"requests": 1, "endpoints": ["predict"]})
+        self.assertIsNone(requests.start("chat"))
+        profile = requests.start("predict")
+        busy_loop(type("Stop", (), {"is_set": lambda self: True})())
+        requests.finish(profile)
+        self.assertIsNone(requests.start("predict"))
+        self.assertTrue(requests.done())
+
+        result = requests.collect()
+        self.assertEqual(result["requests"], 1)
+        self.assertIn("busy_loop", result["output"])
+        self.assertFalse(requests.armed)
+
+    def test_sample_job(self):
+        job = submit_job(self.test_dir, os.getpid(), "sample", 0.1, interval_ms=5)
+        with self.assertRaises(FileExistsError):
+            submit_job(self.test_dir, os.getpid(), "sample", 0.1)
+        self.assertEqual(read_job(self.test_dir, job["id"])["status"], "running")
+
+        result = self.wait_for(job["id"])
+        self.assertEqual(result["format"], "collapsed")
+        self.assertEqual(result["pid"], os.getpid())
+        self.assertGreater(result["samples"], 0)
+        self.assertEqual(live_workers(self.test_dir, 10), [os.getpid()])
+        self.assertIsNone(read_job(self.test_dir, "0" * 16))
+
+    def test_request_job_times_out(self):
+        job = submit_job(self.test_dir, os.getpid(), "requests", 0.05, requests=5, endpoints=["predict"])
+        self.control.poll()
+        self.assertTrue(self.control.requests.armed)
+        result = self.wait_for(job["id"])
+        self.assertEqual(result["requests"], 0)
+        self.assertFalse(self.control.requests.armed)
+
+class TestProfileEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        profiler._control = ProfilerControl(os.path.join(self.test_dir, "profiler"))
+        profiler._control._pid = os.getpid()
+        self.headers = {"X-API-Key": "secret"}
+
+    def tearDown(self):
+        profiler._control = None
+        super().tearDown()
+
+    @patch('app.api.routes.ADMIN_API_KEYS', ["secret"])
+    @patch('app.api.routes.process_symptoms')
+    def test_profile_next_requests(self, mock_process):
+        mock_process.return_value = {"original_text": "demam", "medical_terms": ["demam"]}
+        response = self.client.post('/admin/profile', json={"mode": "requests", "requests": 2,
+                                                            "endpoints": ["predict"]}, headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["id"]
+        self.assertEqual(self.client.get(f'/admin/profile/{job_id}', headers=self.headers).status_code, 202)
+        self.assertEqual(self.client.post('/admin/profile', json={"mode": "sample"},
+                                          headers=self.headers).status_code, 409)
+
+        profiler._control.poll()
+        for _ in range(3):
+            self.client.post('/predict', json={"text": "demam"})
+        profiler._control.poll()
+
+        result = self.client.get(f'/admin/profile/{job_id}', headers=self.headers).get_json()
+        self.assertEqual(result["status"], "done")
+        self.assertEqual(result["format"], "pstats")
+        self.assertEqual(result["requests"], 2)
+        self.assertIn("predict_disease", result["output"])
+        raw = self.client.get(f'/admin/profile/{job_id}?raw=1', headers=self.headers)
+        self.assertEqual(raw.mimetype, "text/plain")
+
+    @patch('app.api.routes.ADMIN_API_KEYS', ["secret"])
+    def test_invalid_jobs(self):
+        self.assertEqual(self.client.post('/admin/profile', json={"mode": "sample"}).status_code, 401)
+        for body in ({}, {"mode": "trace"}, {"mode": "sample", "seconds": 0},
+                     {"mode": "sample", "seconds": 10 ** 6}, {"mode": "requests", "requests": 1.5},
+                     {"mode": "requests", "endpoints": ["feedback"]}, {"mode": "sample", "pid": "1"}):
+            self.assertEqual(self.client.post('/admin/profile', json=body, headers=self.headers).status_code, 400)
+        response = self.client.post('/admin/profile', json={"mode": "sample", "pid": 2 ** 22 + 1},
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/admin/profile/zzz', headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.get('/admin/profile', headers=self.headers).get_json()["pid"], os.getpid())
+
+if __name__ == '__main__':
+    unittest.main()
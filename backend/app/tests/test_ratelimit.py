@@ -0,0 +1,93 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from flask import request
+from app.api import ratelimit
+from app.api.ratelimit import SharedRateLimiter, parse_rate_limit
+from app.utils.helpers import get_client_address
+from app.tests.api_testcase import APITestCase
+
+class TestSharedRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, 'ratelimit.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_parse_rate_limit(self):
+        """Rate limits from settings are parsed into (count, seconds)"""
+        self.assertEqual(parse_rate_limit('50/hour'), (50, 3600))
+        self.assertEqual(parse_rate_limit('200/minute'), (200, 60))
+        with self.assertRaises(ValueError):
+            parse_rate_limit('fifty per hour')
+
+    def test_bucket_exhaustion_and_refill(self):
+        """Tokens run out after the limit and refill over the period"""
+        limiter = SharedRateLimiter(self.path, slots=64)
+        for i in range(3):
+            state = limiter.hit('10.0.0.1:predict', 3, 60, now=1000.0)
+            self.assertTrue(state['allowed'])
+            self.assertEqual(state['remaining'], 2 - i)
+
+        state = limiter.hit('10.0.0.1:predict', 3, 60, now=1000.0)
+        self.assertFalse(state['allowed'])
+        self.assertAlmostEqual(state['retry_after'], 20.0)
+
+        # One token comes back every 20 seconds
+        self.assertTrue(limiter.hit('10.0.0.1:predict', 3, 60, now=1020.0)['allowed'])
+        # Other clients have their own bucket
+        self.assertTrue(limiter.hit('10.0.0.2:predict', 3, 60, now=1020.0)['allowed'])
+
+    def test_state_is_shared_between_instances(self):
+        """Separate limiter instances (one per worker) see the same buckets"""
+        first = SharedRateLimiter(self.path, slots=64)
+        second = SharedRateLimiter(self.path, slots=64)
+        first.hit('10.0.0.1:chat', 2, 60, now=1000.0)
+        first.hit('10.0.0.1:chat', 2, 60, now=1000.0)
+        self.assertFalse(second.hit('10.0.0.1:chat', 2, 60, now=1000.0)['allowed'])
+
+    def test_full_probe_window_evicts(self):
+        """A full table evicts old buckets instead of failing"""
+        limiter = SharedRateLimiter(self.path, slots=4)
+        for i in range(20):
+            self.assertTrue(limiter.hit(f'client-{i}:chat', 1, 60, now=1000.0 + i)['allowed'])
+
+class TestRateLimitHooks(APITestCase):
+    def test_headers_and_429(self):
+        """Responses carry X-RateLimit-* headers and exhausted clients get 429"""
+        limit, _ = parse_rate_limit(ratelimit.RATE_LIMIT['chat'])
+        for _ in range(limit):
+            response = self.client.post('/chat', data=json.dumps({"text": "halo"}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-RateLimit-Limit'], str(limit))
+        self.assertEqual(response.headers['X-RateLimit-Remaining'], '0')
+
+        response = self.client.post('/chat', data=json.dumps({"text": "halo"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(self.client.get('/health').status_code, 200)
+
+    @patch.dict(ratelimit.RATE_LIMIT, {'chat': '2/minute'})
+    def test_forwarded_for_cannot_reset_the_bucket(self):
+        """A client-supplied X-Forwarded-For does not give a fresh bucket"""
+        for _ in range(2):
+            self.client.post('/chat', json={"text": "halo"})
+        response = self.client.post('/chat', json={"text": "halo"}, headers={'X-Forwarded-For': '203.0.113.9'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_trusted_proxy_hops(self):
+        """Behind trusted proxies, the entry the outermost one appended is the client"""
+        with self.app.test_request_context(headers={'X-Forwarded-For': 'forged, 198.51.100.4, 10.0.0.2'},
+                                           environ_base={'REMOTE_ADDR': '10.0.0.3'}):
+            self.assertEqual(get_client_address(request), '10.0.0.3')
+            self.assertEqual(get_client_address(request, 2), '198.51.100.4')
+            self.assertEqual(get_client_address(request, 5), '10.0.0.3')
+
+if __name__ == '__main__':
+    unittest.main()
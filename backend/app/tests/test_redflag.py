@@ -0,0 +1,125 @@
+import unittest
+import json
+import threading
+import time
+from unittest.mock import patch
+from app.api import admission
+from app.api.admission import AdmissionController
+from app.core.chatbot import HealthAssistant
+from app.core.redflag import RedFlagDetector
+from app.tests.api_testcase import APITestCase
+
+class TestRedFlagDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = RedFlagDetector()
+
+    def test_detects_emergency_phrases(self):
+        flags = self.detector.detect("Ayah saya SESAK  nafas, nyeri dada lalu pingsan")
+        self.assertEqual(flags, ["sesak_nafas", "nyeri_dada", "pingsan"])
+        self.assertEqual(self.detector.detect("anak kejang-kejang"), ["kejang"])
+
+    def test_ignores_routine_messages(self):
+        self.assertEqual(self.detector.detect("halo, saya demam dan batuk"), [])
+        self.assertEqual(self.detector.detect(""), [])
+
+    def test_covers_when_to_see_a_doctor_answer(self):
+        """Every sign the assistant tells users to see a doctor for is a red flag"""
+        answer = HealthAssistant().qa_pairs[r"kapan harus ke dokter"]
+        for sign in ["sesak nafas", "nyeri dada", "kejang", "pingsan"]:
+            self.assertIn(sign, answer)
+            self.assertTrue(self.detector.detect(sign))
+
+class TestPriorityLane(unittest.TestCase):
+    def test_reserved_slots(self):
+        """Reserved slots are only available to the priority lane"""
+        controller = AdmissionController(max_in_flight=3, reserved_priority=1)
+        self.assertTrue(controller.try_acquire("chat")[0])
+        self.assertTrue(controller.try_acquire("chat")[0])
+        self.assertFalse(controller.try_acquire("chat")[0])
+        self.assertTrue(controller.try_acquire("chat", priority=True)[0])
+        self.assertFalse(controller.try_acquire("chat", priority=True)[0])
+
+        stats = controller.stats()["endpoints"]["chat"]
+        self.assertEqual(stats["priority_accepted"], 1)
+        self.assertEqual(stats["priority_shed"], 1)
+
+    def test_priority_skips_queue_time_budget(self):
+        controller = AdmissionController(max_in_flight=2, max_queue_time=1.0)
+        self.assertFalse(controller.try_acquire("predict", waited=5.0)[0])
+        self.assertTrue(controller.try_acquire("predict", waited=5.0, priority=True)[0])
+
+class TestRedFlagHooks(APITestCase):
+    def tearDown(self):
+        admission._controller = None
+        super().tearDown()
+
+    def post_chat(self, text):
+        return self.client.post('/chat', data=json.dumps({"text": text}),
+                                content_type='application/json')
+
+    def test_urgent_chat_carries_safety_response(self):
+        response = self.post_chat("saya sesak nafas")
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["urgent"]["red_flags"], ["sesak_nafas"])
+        self.assertIn("response", data)
+
+    def test_saturated_worker_still_answers_urgent(self):
+        """Without any capacity, urgent messages get safety advice instead of 503"""
+        admission.initialize_admission({"max_in_flight": 0, "max_queue_time": 5.0})
+        self.assertEqual(self.post_chat("halo").status_code, 503)
+
+        response = self.post_chat("tolong, adik saya kejang")
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data["degraded"])
+        self.assertEqual(data["urgent"]["red_flags"], ["kejang"])
+
+    def test_only_trusted_clients_get_the_priority_lane(self):
+        """An emergency word alone does not get a request past the budgets"""
+        controller = admission.initialize_admission({"max_in_flight": 2, "max_queue_time": 5.0,
+                                                     "reserved_priority": 1})
+        with patch.dict(admission.ADMISSION_CONTROL, {"priority_api_keys": ["triage"]}):
+            self.post_chat("saya sesak nafas")
+            stats = controller.stats()["endpoints"]["chat"]
+            self.assertEqual(stats["priority_accepted"], 0)
+            self.assertEqual(stats["accepted"], 1)
+            response = self.client.post('/chat', json={"text": "saya sesak nafas"}, headers={"X-API-Key": "triage"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(controller.stats()["endpoints"]["chat"]["priority_accepted"], 1)
+
+    def test_reserved_slots_admit_urgent_requests_under_load(self):
+        """Routine requests held by other threads leave the reserved slots to trusted urgent ones"""
+        controller = admission.initialize_admission({"max_in_flight": 2, "max_queue_time": 5.0,
+                                                     "reserved_priority": 1})
+        release = threading.Event()
+
+        def slow_chat(text, **kwargs):
+            if text == "halo":
+                release.wait(5)
+            return {"response": "ok", "suggestions": [], "context": {}}
+
+        with patch('app.api.routes.get_chatbot_response', side_effect=slow_chat), \
+                patch.dict(admission.ADMISSION_CONTROL, {"priority_api_keys": ["triage"]}):
+            routine = threading.Thread(target=lambda: self.app.test_client().post('/chat', json={"text": "halo"}))
+            routine.start()
+            deadline = time.monotonic() + 5
+            while controller.stats()["in_flight"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.post_chat("halo").status_code, 503)
+
+            response = self.client.post('/chat', json={"text": "saya sesak nafas"}, headers={"X-API-Key": "triage"})
+            release.set()
+            routine.join()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("degraded", json.loads(response.data))
+        self.assertEqual(controller.stats()["endpoints"]["chat"]["priority_accepted"], 1)
+
+    def test_stream_body_is_not_parsed(self):
+        with patch('app.api.admission.request_text') as text:
+            self.client.post('/predict/stream', data='{"text": "kejang"}\n', content_type='application/x-ndjson')
+            self.post_chat("halo")
+        self.assertEqual(text.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
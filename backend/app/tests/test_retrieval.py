@@ -0,0 +1,100 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core import predictor as predictor_module
+from app.core.retrieval import CaseIndex, build_case_index
+from app.tests.api_testcase import APITestCase
+
+def synthetic_cases(count=3000, vocabulary=300, seed=0):
+    """Zipf-distributed symptom tokens, so some posting lists are long and others short"""
+    rng = np.random.default_rng(seed)
+    tokens = [f"gejala{i}" for i in range(vocabulary)]
+    p = 1.0 / np.arange(1, vocabulary + 1)
+    p /= p.sum()
+    texts = [", ".join(rng.choice(tokens, size=int(rng.integers(2, 7)), replace=False, p=p)) for _ in range(count)]
+    labels = [f"D{i % 7}" for i in range(count)]
+    return texts, labels, tokens
+
+class TestCaseIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.texts, self.labels, self.tokens = synthetic_cases()
+        self.pipeline = Pipeline([
+            ("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=200))
+        ]).fit(self.texts, self.labels)
+        self.model_path = os.path.join(self.test_dir, "model.pkl")
+        joblib.dump(self.pipeline, self.model_path)
+        self.index_path = os.path.join(self.test_dir, "cases")
+        build_case_index(self.pipeline.named_steps["tfidf"], self.texts, self.labels,
+                         self.pipeline.classes_, self.index_path, self.model_path)
+        self.index = CaseIndex.load(self.index_path, self.pipeline, self.model_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_matches_brute_force(self):
+        vectorizer = self.pipeline.named_steps["tfidf"]
+        matrix = vectorizer.transform(self.texts)
+        rng = np.random.default_rng(1)
+        for _ in range(30):
+            terms = [str(t) for t in rng.choice(self.tokens[:60], size=int(rng.integers(1, 5)), replace=False)]
+            scores = (matrix @ vectorizer.transform([", ".join(terms)]).T).toarray().ravel()
+            expected = np.sort(scores)[::-1][:5]
+            result = self.index.search(terms, 5)
+            self.assertFalse(result["partial"])
+            np.testing.assert_allclose([c["similarity"] for c in result["cases"]], expected, atol=1e-5)
+            best = result["cases"][0]
+            self.assertEqual(best["symptoms"], self.texts[best["case_id"]])
+            self.assertEqual(best["disease"], self.labels[best["case_id"]])
+        self.assertLess(self.index.stats()["scored_ratio"], 1.0)
+
+    def test_unknown_terms_and_budget(self):
+        self.assertEqual(self.index.search(["xyzzy"], 5)["cases"], [])
+        result = self.index.search(["gejala0", "gejala1", "gejala2"], len(self.texts), budget=0.0)
+        self.assertTrue(result["partial"])
+        self.assertLess(len(result["cases"]), len(self.texts))
+
+    def test_stale_index_is_ignored(self):
+        joblib.dump(self.pipeline, self.model_path, compress=3)
+        self.assertIsNone(CaseIndex.load(self.index_path, self.pipeline, self.model_path))
+        self.assertIsNone(CaseIndex.load(os.path.join(self.test_dir, "missing"), self.pipeline, self.model_path))
+
+class TestSimilarEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        data = pd.read_csv("data/symptom_disease_dataset.csv")
+        model_path = "model/disease_classifier.pkl"
+        self.predictor = predictor_module.DiseasePredictor(model_path)
+        cases = os.path.join(self.test_dir, "cases")
+        build_case_index(self.predictor.model.named_steps["tfidf"], data["symptoms"], data["disease"],
+                         self.predictor.model.classes_, cases, model_path)
+        self.predictor.cases = CaseIndex.load(cases, self.predictor.model, model_path)
+
+    @patch('app.api.routes.process_symptoms')
+    def test_similar_and_predict_section(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["sering haus", "sering kencing"]}
+        with patch.object(predictor_module, "_predictor", self.predictor):
+            response = self.client.post('/similar', json={"text": "sering haus", "k": 2})
+            self.assertEqual(response.status_code, 200)
+            body = response.get_json()
+            self.assertEqual(len(body["cases"]), 2)
+            self.assertEqual(body["cases"][0]["disease"], "Diabetes")
+            self.assertFalse(body["partial"])
+
+            response = self.client.post('/predict', json={"text": "sering haus", "similar_cases": True})
+            self.assertEqual(response.get_json()["similar_cases"]["cases"][0]["disease"], "Diabetes")
+            self.assertEqual(self.client.post('/similar', json={"text": "x", "k": 0}).status_code, 400)
+
+            self.predictor.cases = None
+            self.assertEqual(self.client.post('/similar', json={"text": "sering haus"}).status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from app.core import rollups
+from app.core.rollups import RollupStore
+from app.tests.api_testcase import APITestCase
+
+HOUR = 3600
+NOW = 1_000 * 24 * HOUR + 30 * 60  # half past an hour
+
+class TestRollupStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = RollupStore(self.test_dir, bucket_seconds=300, retention_seconds=6 * HOUR,
+                                 max_diseases=4, regions=["Jakarta", "Bandung"])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_tumbling_and_sliding_windows(self):
+        self.store.record("Flu", "Jakarta", 0.9, now=NOW - HOUR)
+        self.store.record("Flu", "Bandung", 0.8, now=NOW - 10 * 60)
+        self.store.record("Tifus", None, 0.35, now=NOW)
+
+        result = self.store.query(HOUR, windows=3, now=NOW)
+        self.assertEqual([w["total"] for w in result["windows"]], [0, 1, 2])
+        self.assertEqual(result["windows"][2]["diseases"], {"Flu": 1, "Tifus": 1})
+        self.assertEqual(result["windows"][2]["regions"], {"Bandung": 1, "unknown": 1})
+        self.assertEqual(result["windows"][2]["start"] % HOUR, 0)
+        # The sliding hour ending now still includes the record from 30 minutes before the hour
+        self.assertEqual(result["sliding"]["total"], 2)
+        self.assertAlmostEqual(result["confidence"]["Flu"]["mean"], 0.85)
+        self.assertEqual(result["confidence"]["Tifus"]["histogram"][3], 1)
+
+        filtered = self.store.query(HOUR, windows=3, region="Jakarta", now=NOW)
+        self.assertEqual([w["total"] for w in filtered["windows"]], [0, 1, 0])
+
+    def test_retention_and_overflow(self):
+        self.store.record("Flu", "Jakarta", 0.9, now=NOW - 6 * HOUR)
+        self.store.record("Flu", "Jakarta", 0.9, now=NOW)  # reuses the expired bucket's slot
+        self.assertEqual(self.store.query(6 * HOUR, now=NOW)["windows"][0]["total"], 1)
+        with self.assertRaises(ValueError):
+            self.store.query(7 * HOUR, now=NOW)
+        with self.assertRaises(ValueError):
+            self.store.query(1000, now=NOW)
+
+        for disease in ("A", "B", "C", "D"):
+            self.store.record(disease, "Jakarta", 0.5, now=NOW)
+        self.assertEqual(self.store.query(HOUR, now=NOW)["windows"][0]["diseases"]["other"], 2)
+        self.assertEqual(self.store.stats()["overflow"], 2)
+
+    def test_regions_outside_the_allowlist_are_unknown(self):
+        self.store.record("Flu", " jakarta ", 0.9, now=NOW)
+        for i in range(100):
+            self.store.record("Flu", f"junk {i}", 0.9, now=NOW)
+        result = self.store.query(HOUR, now=NOW)
+        self.assertEqual(result["windows"][0]["regions"], {"Jakarta": 1, "unknown": 100})
+        self.assertEqual(self.store.query(HOUR, region="JAKARTA", now=NOW)["windows"][0]["total"], 1)
+        self.assertEqual(self.store.query(HOUR, region="junk 1", now=NOW)["windows"][0]["total"], 0)
+        self.assertEqual(self.store.stats()["unknown_regions"], 100)
+        self.assertEqual(self.store.max_regions, 4)
+
+    def test_workers_are_merged(self):
+        self.store.record("Flu", "Jakarta", 0.9, now=NOW)
+        # Another worker writing to the same directory under a different pid
+        other = RollupStore(self.test_dir, bucket_seconds=300, retention_seconds=6 * HOUR,
+                            max_diseases=4, regions=["Jakarta", "Bandung"])
+        with patch("app.core.rollups.os.getpid", return_value=os.getpid() + 100000):
+            other.record("Flu", "Jakarta", 0.7, now=NOW)
+            other.record("Campak", "Jakarta", 0.6, now=NOW)
+        result = self.store.query(HOUR, now=NOW)
+        self.assertEqual(result["workers"], 2)
+        self.assertEqual(result["windows"][0]["diseases"], {"Flu": 2, "Campak": 1})
+
+        self.assertEqual(self.store.maybe_prune(now=NOW + 7 * HOUR), 1)
+        self.assertEqual(self.store.query(HOUR, now=NOW)["workers"], 1)
+        # Until the interval has passed, pruning is not attempted again
+        with patch.object(self.store, "prune") as prune:
+            self.store.maybe_prune(now=NOW + 7 * HOUR + 60)
+            prune.assert_not_called()
+
+class TestRollupEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        rollups._rollups = RollupStore(os.path.join(self.test_dir, "rollups"), regions=["Surabaya"])
+
+    def tearDown(self):
+        rollups._rollups = None
+        super().tearDown()
+
+    @patch('app.api.routes.process_symptoms')
+    def test_predictions_are_counted(self, mock_process):
+        mock_process.return_value = {"original_text": "x", "medical_terms": ["sering haus", "sering kencing"]}
+        body = self.client.post('/predict', json={"text": "sering haus", "region": "Surabaya"}).get_json()
+        disease = body["predictions"][0]["disease"].strip()
+
+        response = self.client.get('/rollups?window=3600&windows=2')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["windows"][-1]["diseases"], {disease: 1})
+        self.assertEqual(result["sliding"]["regions"], {"Surabaya": 1})
+        self.assertEqual(self.client.get('/rollups?window=100').status_code, 400)
+        self.assertEqual(self.client.post('/predict', json={"text": "x", "region": 5}).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
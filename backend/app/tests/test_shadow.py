@@ -0,0 +1,86 @@
+import unittest
+import os
+import threading
+from functools import partial
+from unittest.mock import patch
+from app.core import predictor as predictor_module
+from app.core.background import BackgroundBatcher
+from app.core.shadow import ShadowEvaluator
+
+def prediction(*diseases):
+    return [{"disease": d, "confidence": c, "symptoms": []} for d, c in diseases]
+
+class FakeCandidate:
+    def predict(self, terms):
+        return prediction(("Flu", 0.6)) if "batuk" in terms else prediction(("Diabetes", 0.9), ("Flu", 0.1))
+
+def broken_candidate():
+    # Loaders run in the candidate process, so they must be importable
+    raise FileNotFoundError("candidate.pkl")
+
+class TestBackgroundBatcher(unittest.TestCase):
+    def test_batches_and_drops_when_full(self):
+        release = threading.Event()
+        batches = []
+
+        def process(batch):
+            release.wait(5)
+            batches.append(list(batch))
+
+        batcher = BackgroundBatcher(process, max_queue=2, batch_size=1, flush_interval=0.01, name="test")
+        accepted = [batcher.submit(i) for i in range(20)]
+        self.assertFalse(all(accepted))
+        self.assertGreater(batcher.stats()["dropped"], 0)
+        release.set()
+        self.assertTrue(batcher.drain())
+        stats = batcher.stats()
+        self.assertEqual(stats["processed"], stats["submitted"])
+        self.assertEqual(sum(len(b) for b in batches), stats["submitted"])
+        self.assertEqual(stats["submitted"] + stats["dropped"], 20)
+
+    def test_errors_are_counted(self):
+        batcher = BackgroundBatcher(lambda batch: 1 / 0, 8, 4, 0.01, "test")
+        batcher.submit(1)
+        self.assertTrue(batcher.drain())
+        self.assertEqual(batcher.stats()["errors"], 1)
+
+class TestShadowEvaluator(unittest.TestCase):
+    def test_agreement_statistics(self):
+        shadow = ShadowEvaluator(FakeCandidate, batch_size=8, flush_interval=0.01)
+        shadow.submit(["sering haus"], prediction(("Diabetes", 0.8), ("Flu", 0.1)), 2.0)
+        shadow.submit(["batuk"], prediction(("Pneumonia", 0.5)), 4.0)
+        self.assertTrue(shadow.drain())
+        stats = shadow.stats()
+        self.assertEqual(stats["compared"], 2)
+        self.assertEqual(stats["top1_agreement"], 0.5)
+        self.assertAlmostEqual(stats["mean_top3_overlap"], 0.5)
+        self.assertAlmostEqual(stats["mean_confidence_delta"], (0.1 + 0.5) / 2)
+        self.assertEqual(stats["top_disagreements"], {"Pneumonia -> Flu": 1})
+        self.assertEqual(stats["primary_latency"]["max_ms"], 4.0)
+        self.assertIsNotNone(stats["candidate_latency"])
+        # The candidate ran in its own process
+        self.assertNotIn(stats["candidate_pid"], (None, os.getpid()))
+
+    def test_failed_candidate_load_disables_shadowing(self):
+        shadow = ShadowEvaluator(broken_candidate, flush_interval=0.01)
+        self.assertTrue(shadow.submit(["demam"], [], 1.0))
+        self.assertTrue(shadow.drain())
+        self.assertIn("candidate.pkl", shadow.stats()["load_error"])
+        self.assertFalse(shadow.submit(["demam"], [], 1.0))
+
+    def test_predict_disease_feeds_the_shadow(self):
+        shadow = ShadowEvaluator(
+            partial(predictor_module.DiseasePredictor, "model/disease_classifier.pkl"), flush_interval=0.01
+        )
+        with patch.object(predictor_module, "_shadow", shadow):
+            processed = {"medical_terms": ["sering haus", "sering kencing", "lemas"]}
+            primary = predictor_module.predict_disease(processed)
+            predictor_module.predict_disease_batch([processed, {"medical_terms": ["demam", "batuk"]}])
+            self.assertTrue(shadow.drain())
+        stats = shadow.stats()
+        self.assertEqual(primary[0]["disease"], "Diabetes")
+        self.assertEqual(stats["compared"], 3)
+        self.assertEqual(stats["top1_agreement"], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
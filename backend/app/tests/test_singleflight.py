@@ -0,0 +1,79 @@
+import unittest
+import threading
+import time
+from app.core.singleflight import SingleFlight
+
+class PrivateError(Exception):
+    pass
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(private_errors=(PrivateError,))
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, value):
+        def fn():
+            self.calls += 1
+            self.release.wait(5)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return fn
+
+    def run_concurrently(self, key, fn, count=5):
+        results = [None] * count
+
+        def worker(i):
+            try:
+                results[i] = self.flight.do(key, fn)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        # Wait until every caller has joined the in-flight call
+        while self.flight.stats()["leaders"] + self.flight.stats()["followers"] < count:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_execution(self):
+        results = self.run_concurrently("demam batuk", self.slow(["Flu"]))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == ["Flu"] for result in results))
+        stats = self.flight.stats()
+        self.assertEqual((stats["leaders"], stats["followers"], stats["in_flight"]), (1, 4, 0))
+
+    def test_errors_propagate_to_every_caller(self):
+        results = self.run_concurrently("demam", self.slow(ValueError("boom")))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_private_errors_are_retried_by_followers(self):
+        """A leader-specific failure is not handed to the other callers"""
+        results = self.run_concurrently("demam", self.slow(PrivateError()), count=3)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.flight.stats()["follower_retries"], 2)
+        self.assertTrue(all(isinstance(result, PrivateError) for result in results))
+
+    def test_no_sharing_after_completion(self):
+        self.release.set()
+        self.assertEqual(self.flight.do("demam", lambda: 1), 1)
+        self.assertEqual(self.flight.do("demam", lambda: 2), 2)
+
+    def test_follower_timeout(self):
+        leader = threading.Thread(target=self.flight.do, args=("demam", self.slow(1)))
+        leader.start()
+        while not self.flight.stats()["in_flight"]:
+            time.sleep(0.001)
+        with self.assertRaises(TimeoutError):
+            self.flight.do("demam", lambda: 2, timeout=0.01)
+        self.release.set()
+        leader.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from app.core import slowlog
+from app.core.slowlog import SlowRequestBuffer, read_slow_requests, redact_text, trace_stages
+from app.core.tracing import end_trace, span, start_trace
+from app.tests.api_testcase import APITestCase
+
+class TestSlowRequestBuffer(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.buffer = SlowRequestBuffer(self.test_dir, {"default": 100.0, "predict": 50.0}, capacity=3,
+                                        window_seconds=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_thresholds(self):
+        self.assertFalse(self.buffer.is_slow("predict", 49))
+        self.assertTrue(self.buffer.is_slow("predict", 50))
+        self.assertFalse(self.buffer.is_slow("chat", 99))
+
+    def test_keeps_slowest_per_endpoint(self):
+        built = []
+        def build():
+            built.append(1)
+            return {}
+        now = time.time()
+        for duration in (60, 90, 70, 80, 55):
+            self.buffer.capture("predict", duration, build, now=now)
+        self.buffer.capture("chat", 500, build, now=now)
+
+        self.assertEqual([e["duration_ms"] for e in self.buffer.entries(now)], [500, 90, 80, 70])
+        # The 55 ms request ranked below the buffer and was never built
+        self.assertEqual(len(built), 5)
+        self.assertEqual(self.buffer.stats()["displaced"], 1)
+
+    def test_window_and_workers(self):
+        now = time.time()
+        self.buffer.capture("predict", 90, dict, now=now - 120)
+        self.buffer.capture("predict", 60, dict, now=now)
+        self.assertEqual([e["duration_ms"] for e in self.buffer.entries(now)], [60])
+
+        other = os.path.join(self.test_dir, "worker-1.json")
+        with open(other, "w") as f:
+            f.write('{"pid": 1, "published": %f, "entries": [{"endpoint": "chat", "duration_ms": 700, '
+                    '"timestamp": %f}]}' % (now, now))
+        merged = read_slow_requests(self.test_dir, 60, now=now)
+        self.assertEqual([e["duration_ms"] for e in merged["requests"]], [700, 60])
+        self.assertEqual(merged["workers"], 2)
+        self.assertEqual(len(read_slow_requests(self.test_dir, 60, endpoint="chat", now=now)["requests"]), 1)
+
+        read_slow_requests(self.test_dir, 60, now=now + 120)
+        self.assertFalse(os.path.exists(other))
+
+    def test_redaction(self):
+        self.assertEqual(redact_text("demam tinggi", "drop"), {})
+        digest = redact_text("demam tinggi", "hash")["text_hmac"]
+        self.assertEqual(len(digest), 16)
+        self.assertEqual(redact_text("demam tinggi", "hash")["text_hmac"], digest)
+        self.assertNotEqual(redact_text("demam tinggi", "hash", key=b"other deployment")["text_hmac"], digest)
+        self.assertNotEqual(hashlib.sha256(b"demam tinggi").hexdigest()[:16], digest)
+        self.assertEqual(redact_text("demam tinggi", "full", max_chars=5), {"text": "demam"})
+
+    def test_trace_stages(self):
+        root = start_trace("POST /predict")
+        with span("process_symptoms"):
+            pass
+        stages = trace_stages(end_trace(root))
+        self.assertEqual([s["name"] for s in stages], ["process_symptoms"])
+        self.assertGreaterEqual(stages[0]["start_ms"], 0)
+
+class TestSlowRequestEndpoint(APITestCase):
+    def setUp(self):
+        super().setUp()
+        slowlog._buffer = SlowRequestBuffer(self.test_dir, {"default": 0.0}, window_seconds=60)
+
+    def tearDown(self):
+        slowlog._buffer = None
+        super().tearDown()
+
+    @patch('app.api.routes.ADMIN_API_KEYS', ["secret"])
+    @patch('app.api.routes.process_symptoms')
+    def test_slow_predict_is_captured(self, mock_process):
+        mock_process.return_value = {"original_text": "demam", "medical_terms": ["demam"]}
+        with patch.dict(slowlog.SLOW_REQUESTS, {"redact": "drop"}):
+            self.client.post('/predict', json={"text": "demam"}, headers={"X-Request-ID": "req-7"})
+
+        self.assertEqual(self.client.get('/admin/slow-requests').status_code, 401)
+        self.assertEqual(self.client.get('/admin/slow-requests', headers={"X-API-Key": "wrong"}).status_code, 401)
+        response = self.client.get('/admin/slow-requests?endpoint=predict', headers={"X-API-Key": "secret"})
+        self.assertEqual(response.status_code, 200)
+        entry = response.get_json()["requests"][0]
+        self.assertEqual(entry["request_id"], "req-7")
+        self.assertEqual(entry["input_chars"], 5)
+        self.assertEqual(entry["pid"], os.getpid())
+        self.assertNotIn("text", entry)
+        self.assertNotIn("text_hmac", entry)
+        self.assertIn("predict_disease", [stage["name"] for stage in entry["stages"]])
+        self.assertIsNotNone(entry["model_version"])
+
+    @patch('app.api.routes.ADMIN_API_KEYS', ["secret"])
+    def test_invalid_limit(self):
+        response = self.client.get('/admin/slow-requests?limit=0', headers={"X-API-Key": "secret"})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+import json
+from app.tests.api_testcase import APITestCase
+
+def fake_process(text):
+    return {"original_text": text, "medical_terms": text.split()}
+
+def fake_batch(processed_texts, model=None, explain=False):
+    return [[{"disease": p["medical_terms"][0], "confidence": 1.0, "symptoms": []}]
+            for p in processed_texts]
+
+class TestPredictStream(APITestCase):
+    def post(self, body, content_type='application/x-ndjson'):
+        response = self.client.post('/predict/stream', data=body, content_type=content_type)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        return response, lines
+
+    @patch('app.api.routes.predict_disease_batch', side_effect=fake_batch)
+    @patch('app.api.routes.process_symptoms', side_effect=fake_process)
+    @patch.dict('app.api.routes.STREAMING', {"chunk_size": 2})
+    def test_results_stream_in_order_and_bounded_chunks(self, mock_process, mock_batch):
+        body = "\n".join(json.dumps({"id": f"v{i}", "text": f"gejala{i} demam"}) for i in range(5))
+        response, lines = self.post(body)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([line["id"] for line in lines], ["v0", "v1", "v2", "v3", "v4"])
+        self.assertEqual(lines[3]["predictions"][0]["disease"], "gejala3")
+        self.assertEqual([len(call.args[0]) for call in mock_batch.call_args_list], [2, 2, 1])
+
+    @patch('app.api.routes.predict_disease_batch', side_effect=fake_batch)
+    @patch('app.api.routes.process_symptoms', side_effect=fake_process)
+    def test_bad_lines_are_isolated(self, mock_process, mock_batch):
+        body = '"demam batuk"\nnot json\n\n{"id": 9}\n{"id": 10, "text": "mual"}\n'
+        _, lines = self.post(body)
+
+        self.assertEqual(lines[0], {"id": 1, "predictions": fake_batch([fake_process("demam batuk")])[0],
+                                    "medical_terms": ["demam", "batuk"]})
+        self.assertEqual(lines[1], {"id": 2, "error": "Invalid JSON"})
+        self.assertEqual(lines[2], {"id": 4, "error": "No symptoms provided"})
+        self.assertEqual(lines[3]["id"], 10)
+
+    @patch('app.api.routes.predict_disease_batch', side_effect=fake_batch)
+    @patch('app.api.routes.process_symptoms', side_effect=fake_process)
+    @patch.dict('app.api.routes.STREAMING', {"max_line_bytes": 16})
+    def test_plain_text_and_oversized_lines(self, mock_process, mock_batch):
+        body = "demam\n" + "x" * 100 + "\nbatuk\n"
+        _, lines = self.post(body, content_type='text/plain')
+
+        self.assertEqual(lines[0]["medical_terms"], ["demam"])
+        self.assertEqual(lines[1], {"id": 2, "error": "Line too long"})
+        self.assertEqual(lines[2]["medical_terms"], ["batuk"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import json
+import logging
+import os
+from unittest.mock import patch
+from app.core import tracing
+from app.core.tracing import (
+    RequestIdFilter,
+    TraceExporter,
+    end_trace,
+    export_trace,
+    otlp_request,
+    span,
+    start_trace
+)
+from app.tests.api_testcase import APITestCase
+
+class TestSpans(unittest.TestCase):
+    def test_span_is_noop_outside_a_trace(self):
+        with span("nlp.tokenize") as s:
+            self.assertIsNone(s)
+
+    def test_span_tree(self):
+        root = start_trace("POST /predict")
+        with span("process_symptoms"):
+            with span("nlp.tokenize", tokens=3):
+                pass
+        with self.assertRaises(ValueError):
+            with span("predict_disease"):
+                raise ValueError("boom")
+        trace = end_trace(root)
+
+        self.assertIsNone(tracing.current_trace())
+        by_name = {s.name: s for s in trace.spans}
+        self.assertEqual(by_name["process_symptoms"].parent_id, root.span_id)
+        self.assertEqual(by_name["nlp.tokenize"].parent_id, by_name["process_symptoms"].span_id)
+        self.assertEqual(by_name["predict_disease"].error, "ValueError: boom")
+        self.assertTrue(all(s.end_ns >= s.start_ns for s in trace.spans))
+        self.assertEqual(trace.request_id, trace.trace_id)
+
+    def test_traceparent_is_continued(self):
+        parent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        trace = end_trace(start_trace("GET /health", traceparent=parent, request_id="req-1"))
+        self.assertEqual(trace.trace_id, "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertEqual(trace.root.parent_id, 0x00f067aa0ba902b7)
+        self.assertTrue(trace.sampled)
+        self.assertEqual(trace.request_id, "req-1")
+
+        trace = end_trace(start_trace("GET /health", traceparent="garbage", request_id="bad id\n"))
+        self.assertIsNone(trace.root.parent_id)
+        self.assertFalse(trace.sampled)
+        self.assertEqual(trace.request_id, trace.trace_id)
+
+    def test_span_limit(self):
+        root = start_trace("POST /predict", max_spans=3)
+        for _ in range(5):
+            with span("stage"):
+                pass
+        trace = end_trace(root)
+        self.assertEqual(len(trace.spans), 3)
+        self.assertEqual(trace.dropped_spans, 3)
+
+    def test_otlp_format(self):
+        root = start_trace("POST /predict", attributes={"http.method": "POST"})
+        with span("predict_disease", model="default", top=3):
+            pass
+        spans = otlp_request([end_trace(root)], "svc")["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual([s["name"] for s in spans], ["POST /predict", "predict_disease"])
+        self.assertEqual(spans[0]["kind"], tracing.KIND_SERVER)
+        self.assertEqual(spans[1]["attributes"], [
+            {"key": "model", "value": {"stringValue": "default"}},
+            {"key": "top", "value": {"intValue": "3"}}
+        ])
+        self.assertIn({"key": "request.id", "value": {"stringValue": root.trace.request_id}}, spans[0]["attributes"])
+
+    def test_request_id_filter(self):
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+        RequestIdFilter().filter(record)
+        self.assertEqual(record.request_id, "-")
+        root = start_trace("GET /health", request_id="abc")
+        RequestIdFilter().filter(record)
+        end_trace(root)
+        self.assertEqual(record.request_id, "abc")
+
+class TestTraceExport(APITestCase):
+    def setUp(self):
+        super().setUp()
+        tracing._exporter = TraceExporter("file", directory=self.test_dir, batch_size=1)
+
+    def tearDown(self):
+        tracing._exporter = None
+        super().tearDown()
+
+    def exported(self):
+        tracing._exporter.drain()
+        spans = []
+        for name in sorted(os.listdir(self.test_dir)):
+            if name.startswith("traces-"):
+                with open(os.path.join(self.test_dir, name)) as f:
+                    for line in f:
+                        spans.extend(json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"])
+        return spans
+
+    def test_sampling(self):
+        with patch.dict(tracing.TRACING, {"slow_ms": 1e9}):
+            self.assertFalse(export_trace(end_trace(start_trace("fast"))))
+            self.assertTrue(export_trace(end_trace(start_trace("sampled", sample_rate=1.0))))
+            self.assertTrue(export_trace(end_trace(start_trace("failed")), error=True))
+        with patch.dict(tracing.TRACING, {"slow_ms": 0}):
+            self.assertTrue(export_trace(end_trace(start_trace("slow"))))
+        self.assertEqual([s["name"] for s in self.exported()], ["sampled", "failed", "slow"])
+
+    @patch('app.api.routes.process_symptoms')
+    def test_predict_request_is_traced(self, mock_process):
+        mock_process.return_value = {"original_text": "demam", "medical_terms": ["demam", "sakit kepala"]}
+        parent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        response = self.client.post('/predict', json={"text": "demam"},
+                                          headers={"traceparent": parent, "X-Request-ID": "req-42"})
+
+        self.assertEqual(response.headers["X-Request-ID"], "req-42")
+        self.assertTrue(response.headers["traceresponse"].startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-"))
+        spans = {s["name"]: s for s in self.exported()}
+        self.assertIn("POST /predict", spans)
+        self.assertIn("predict_disease", spans)
+        self.assertIn("json.encode", spans)
+        root = spans["POST /predict"]
+        self.assertEqual(root["parentSpanId"], "00f067aa0ba902b7")
+        self.assertIn({"key": "http.status_code", "value": {"intValue": "200"}}, root["attributes"])
+        self.assertTrue(all(s["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736" for s in spans.values()))
+
+if __name__ == '__main__':
+    unittest.main()
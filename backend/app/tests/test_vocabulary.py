@@ -0,0 +1,72 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from app.core.compact import CompactModel, export_compact_model
+from app.core.vocabulary import (
+    CompactVocabulary, build_vocabulary_index, detached_vocabulary, load_pipeline, save_vocabulary_index
+)
+
+class TestCompactVocabulary(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.vocabulary = {"demam": 3, "batuk": 0, "pusing": 2, "mual": 1, "nyeri": 5, "kéju": 4}
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_matches_dict(self):
+        index = CompactVocabulary(build_vocabulary_index(self.vocabulary))
+        self.assertEqual(dict(index), self.vocabulary)
+        self.assertEqual(len(index), len(self.vocabulary))
+        self.assertIsNone(index.get("flu"))
+        self.assertNotIn(7, index)
+        with self.assertRaises(KeyError):
+            index["flu"]
+
+    def test_file_index_pickles_by_path(self):
+        path = os.path.join(self.test_dir, "vocabulary.idx")
+        digest = save_vocabulary_index(self.vocabulary, path)
+        index = CompactVocabulary.open(path)
+        self.assertEqual(index.digest, digest)
+        self.assertLess(len(pickle.dumps(index)), 200)
+        self.assertEqual(dict(pickle.loads(pickle.dumps(index))), self.vocabulary)
+        in_memory = CompactVocabulary(build_vocabulary_index(self.vocabulary))
+        self.assertEqual(dict(pickle.loads(pickle.dumps(in_memory))), self.vocabulary)
+
+    def test_detached_pipeline_predicts_identically(self):
+        data = pd.read_csv("data/symptom_disease_dataset.csv")
+        pipeline = Pipeline([
+            ("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=1000))
+        ]).fit(data["symptoms"], data["disease"])
+        model_path = os.path.join(self.test_dir, "model.pkl")
+        with detached_vocabulary(pipeline.named_steps["tfidf"], os.path.join(self.test_dir, "vocabulary.idx")):
+            joblib.dump(pipeline, model_path)
+        self.assertIsInstance(pipeline.named_steps["tfidf"].vocabulary_, dict)
+
+        loaded = load_pipeline(model_path)
+        self.assertIsInstance(loaded.named_steps["tfidf"].vocabulary_, CompactVocabulary)
+        texts = ["demam tinggi, nyeri sendi", "sering haus, sering kencing", "tidak ada"]
+        np.testing.assert_array_equal(loaded.predict_proba(texts), pipeline.predict_proba(texts))
+
+        compact_path = os.path.join(self.test_dir, "model.npz")
+        export_compact_model(loaded, compact_path, "float32", 0.0)
+        np.testing.assert_allclose(CompactModel.load(compact_path).predict_proba(texts),
+                                   pipeline.predict_proba(texts), atol=1e-5)
+
+        save_vocabulary_index({"lain": 0}, os.path.join(self.test_dir, "vocabulary.idx"))
+        with self.assertRaisesRegex(ValueError, "does not belong"):
+            load_pipeline(model_path)
+        os.remove(os.path.join(self.test_dir, "vocabulary.idx"))
+        with self.assertRaisesRegex(FileNotFoundError, "saved without its vocabulary"):
+            load_pipeline(model_path)
+
+if __name__ == '__main__':
+    unittest.main()
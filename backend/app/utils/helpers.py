@@ -127,4 +127,18 @@ def get_client_ip(request) -> str:
     x_forwarded_for = request.headers.get('X-Forwarded-For')
     if x_forwarded_for:
         return x_forwarded_for.split(',')[0]
-    return request.remote_addr 
\ No newline at end of file
+    return request.remote_addr
+
+def get_client_address(request, trusted_proxies: int = 0) -> str:
+    """Client address safe to key limits on: the peer, or the X-Forwarded-For entry added by the
+    outermost of trusted_proxies proxies (entries further left are whatever the client sent)"""
+    return forwarded_client(request.headers.get('X-Forwarded-For', ''), request.remote_addr, trusted_proxies)
+
+def forwarded_client(x_forwarded_for: str, peer: Optional[str], trusted_proxies: int = 0) -> str:
+    """get_client_address() from the raw header and peer address, for servers other than Flask"""
+    if trusted_proxies > 0:
+        forwarded = [entry.strip() for entry in (x_forwarded_for or '').split(',')]
+        forwarded = [entry for entry in forwarded if entry]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return peer or 'unknown'
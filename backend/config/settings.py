@@ -1,4 +1,6 @@
 import os
+import json
+import tempfile
 from pathlib import Path
 
 # Base directory of the project
@@ -16,6 +18,8 @@ API_VERSION = 'v1'
 # Model settings
 MODEL_DIR = os.path.join(BASE_DIR, 'models')
 DEFAULT_MODEL_PATH = os.path.join(MODEL_DIR, 'disease_model.joblib')
+# Model served by the API: the pickled pipeline or a compact .npz export
+PREDICTOR_MODEL_PATH = os.getenv('PREDICTOR_MODEL_PATH', 'model/disease_classifier.pkl')
 
 # NLP settings
 NLP_SETTINGS = {
@@ -23,13 +27,37 @@ NLP_SETTINGS = {
     'min_token_length': 2,
     'max_tokens': 100
 }
+# Common medical terms in Indonesian and their normalized form (NLPEngine, prediction table)
+MEDICAL_TERMS = {
+    "demam": "demam",
+    "sakit kepala": "sakit_kepala",
+    "batuk": "batuk",
+    "pilek": "pilek",
+    "mual": "mual",
+    "muntah": "muntah",
+    "diare": "diare",
+    "sakit perut": "sakit_perut",
+    "sesak nafas": "sesak_nafas",
+    "nyeri": "nyeri",
+    "pusing": "pusing",
+    "lemas": "lemas",
+    "meriang": "meriang",
+    "gatal": "gatal",
+    "ruam": "ruam",
+}
 
 # Logging settings
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'  # needs RequestIdFilter
 LOG_FILE = os.path.join(LOG_DIR, 'app.log')
 
+# Host-local state shared by the gunicorn workers (tmpfs when available)
+RUNTIME_DIR = os.getenv(
+    'RUNTIME_DIR',
+    '/dev/shm/bluecare' if os.path.isdir('/dev/shm') else os.path.join(tempfile.gettempdir(), 'bluecare')
+)
+
 # Ensure required directories exist
 for directory in [MODEL_DIR, LOG_DIR]:
     os.makedirs(directory, exist_ok=True)
@@ -37,7 +65,7 @@ for directory in [MODEL_DIR, LOG_DIR]:
 # CORS settings
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 CORS_METHODS = ['GET', 'POST', 'OPTIONS']
-CORS_HEADERS = ['Content-Type', 'Authorization']
+CORS_HEADERS = ['Content-Type', 'Authorization', 'X-Request-ID', 'traceparent']
 
 # Rate limiting
 RATE_LIMIT = {
@@ -45,6 +73,246 @@ RATE_LIMIT = {
     'predict': '50/hour',
     'chat': '200/hour'
 }
+RATE_LIMIT_SETTINGS = {
+    'enabled': os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true',
+    'storage': os.path.join(RUNTIME_DIR, 'ratelimit.bin'),
+    'slots': int(os.getenv('RATE_LIMIT_SLOTS', 65536)),
+    # Proxies in front of the app that append to X-Forwarded-For; 0 keys clients on the peer address
+    'trusted_proxies': int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0)),
+    'exempt_endpoints': ['health_check', 'metrics']
+}
+
+# Admission control (budgets are per worker process)
+ADMISSION_CONTROL = {
+    'enabled': os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true',
+    'max_in_flight': int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 8)),
+    'endpoint_max_in_flight': {
+        'predict': int(os.getenv('ADMISSION_PREDICT_MAX_IN_FLIGHT', 4)),
+        'chat': int(os.getenv('ADMISSION_CHAT_MAX_IN_FLIGHT', 8))
+    },
+    'max_queue_time': float(os.getenv('ADMISSION_MAX_QUEUE_TIME', 5.0)),  # seconds
+    'ewma_alpha': 0.2,
+    'reserved_priority': int(os.getenv('ADMISSION_RESERVED_PRIORITY', 2)),
+    # X-API-Key values of trusted clients (e.g. a triage front end) whose red-flag requests use the priority lane
+    'priority_api_keys': [key for key in os.getenv('ADMISSION_PRIORITY_API_KEYS', '').split(',') if key],
+    'exempt_endpoints': ['health_check', 'metrics', 'slow_request_dump', 'profile_start', 'profile_workers',
+                         'profile_result']
+}
+
+# Red-flag fast path for emergency symptoms
+RED_FLAG = {
+    'enabled': os.getenv('RED_FLAG_ENABLED', 'True').lower() == 'true',
+    # Answer urgent messages with the safety response only, skipping the pipeline
+    'short_circuit': os.getenv('RED_FLAG_SHORT_CIRCUIT', 'False').lower() == 'true',
+    # Only these endpoints' JSON bodies are parsed for the scan
+    'endpoints': ['predict', 'chat']
+}
+
+# Request deadlines in seconds, counted from X-Request-Start when the proxy sets it.
+# Clients may ask for a different budget with X-Request-Timeout, capped at 'max'
+# (or at the endpoint default when that is larger).
+REQUEST_DEADLINES = {
+    'default': float(os.getenv('REQUEST_DEADLINE_DEFAULT', 30.0)),
+    'predict': float(os.getenv('REQUEST_DEADLINE_PREDICT', 10.0)),
+    'chat': float(os.getenv('REQUEST_DEADLINE_CHAT', 5.0)),
+    'predict_stream': float(os.getenv('REQUEST_DEADLINE_PREDICT_STREAM', 600.0)),
+    'similar': float(os.getenv('REQUEST_DEADLINE_SIMILAR', 2.0)),
+    'max': float(os.getenv('REQUEST_DEADLINE_MAX', 60.0))
+}
+
+# Coalescing of identical in-flight prediction requests (per worker process)
+COALESCING = {
+    'enabled': os.getenv('COALESCING_ENABLED', 'True').lower() == 'true'
+}
+
+# Streaming batch prediction (/api/predict/stream)
+STREAMING = {
+    'chunk_size': int(os.getenv('STREAMING_CHUNK_SIZE', 256)),
+    'max_line_bytes': int(os.getenv('STREAMING_MAX_LINE_BYTES', 65536))
+}
+
+# Batch chat for gateway ingestion (/api/chat/batch)
+CHAT_BATCH = {
+    'max_items': int(os.getenv('CHAT_BATCH_MAX_ITEMS', 5000))
+}
+
+# WebSocket chat channel (scripts/run_chat_ws.py)
+CHAT_WS = {
+    'host': os.getenv('CHAT_WS_HOST', '0.0.0.0'),
+    'port': int(os.getenv('CHAT_WS_PORT', 5001)),
+    'max_sessions': int(os.getenv('CHAT_WS_MAX_SESSIONS', 10000)),
+    'idle_timeout': float(os.getenv('CHAT_WS_IDLE_TIMEOUT', 300.0)),  # seconds
+    'max_message_bytes': int(os.getenv('CHAT_WS_MAX_MESSAGE_BYTES', 4096)),
+    'turns_per_minute': float(os.getenv('CHAT_WS_TURNS_PER_MINUTE', 30)),  # per connection, on top of RATE_LIMIT
+    'workers': int(os.getenv('CHAT_WS_WORKERS', 4)),  # threads running turns off the event loop
+    'max_pending': int(os.getenv('CHAT_WS_MAX_PENDING', 64))  # queued turns beyond this are shed
+}
+
+# Incremental per-conversation prediction (linear TF-IDF models only)
+INCREMENTAL_PREDICTION = {
+    'max_conversations': int(os.getenv('INCREMENTAL_MAX_CONVERSATIONS', 10000)),
+    'ttl': float(os.getenv('INCREMENTAL_TTL', 3600.0))  # seconds since last turn
+}
+
+# Precomputed predictions for small symptom sets (scripts/build_prediction_table.py)
+PREDICTION_TABLE = {
+    'enabled': os.getenv('PREDICTION_TABLE_ENABLED', 'True').lower() == 'true',
+    'path': os.getenv('PREDICTION_TABLE_PATH', 'model/prediction_table.npy'),
+    'max_terms': int(os.getenv('PREDICTION_TABLE_MAX_TERMS', 4)),
+    'batch_size': int(os.getenv('PREDICTION_TABLE_BATCH_SIZE', 4096)),
+    # Symptom terms whose combinations are tabulated (comma-separated); empty uses MEDICAL_TERMS
+    'terms': [term.strip() for term in os.getenv('PREDICTION_TABLE_TERMS', '').split(',') if term.strip()],
+    'max_rows': int(os.getenv('PREDICTION_TABLE_MAX_ROWS', 1000000))  # larger builds are refused
+}
+
+# Confidence-gated cascade: a naive Bayes first stage trained by scripts/train_model.py
+CASCADE = {
+    'enabled': os.getenv('CASCADE_ENABLED', 'True').lower() == 'true',
+    'path': os.getenv('CASCADE_PATH', 'model/cascade_stage1.npz'),
+    'target_agreement': float(os.getenv('CASCADE_TARGET_AGREEMENT', 0.99)),  # used when calibrating
+    'audit_rate': float(os.getenv('CASCADE_AUDIT_RATE', 0.01))  # share of first-stage answers re-checked
+}
+
+# Similar past cases: inverted index over the labeled dataset, built by scripts/train_model.py
+CASE_INDEX = {
+    'enabled': os.getenv('CASE_INDEX_ENABLED', 'True').lower() == 'true',
+    'path': os.getenv('CASE_INDEX_PATH', 'model/cases'),
+    'top_k': int(os.getenv('CASE_INDEX_TOP_K', 5)),
+    'max_k': int(os.getenv('CASE_INDEX_MAX_K', 50)),
+    'budget_ms': float(os.getenv('CASE_INDEX_BUDGET_MS', 50.0))  # search stops early (partial) past this
+}
+
+# Append-only log of predictions and clinician feedback (scripts/export_training_data.py reads it)
+EVENT_LOG = {
+    'enabled': os.getenv('EVENT_LOG_ENABLED', 'True').lower() == 'true',
+    'directory': os.getenv('EVENT_LOG_DIR', os.path.join(BASE_DIR, 'data', 'events')),
+    'queue_size': int(os.getenv('EVENT_LOG_QUEUE_SIZE', 10000)),  # records beyond this are dropped
+    'batch_size': int(os.getenv('EVENT_LOG_BATCH_SIZE', 256)),
+    'flush_interval': float(os.getenv('EVENT_LOG_FLUSH_INTERVAL', 0.2)),  # seconds to fill a batch
+    'segment_bytes': int(os.getenv('EVENT_LOG_SEGMENT_BYTES', 64 * 1024 * 1024)),
+    'segment_seconds': float(os.getenv('EVENT_LOG_SEGMENT_SECONDS', 3600.0)),
+    'fsync': os.getenv('EVENT_LOG_FSYNC', 'interval'),  # always, interval or never
+    'fsync_interval': float(os.getenv('EVENT_LOG_FSYNC_INTERVAL', 1.0))
+}
+
+# Live prediction counts per disease, region and time bucket (ring buffers on RUNTIME_DIR, per worker)
+ROLLUPS = {
+    'enabled': os.getenv('ROLLUPS_ENABLED', 'True').lower() == 'true',
+    'directory': os.path.join(RUNTIME_DIR, 'rollups'),
+    'bucket_seconds': int(os.getenv('ROLLUP_BUCKET_SECONDS', 300)),
+    'retention_hours': int(os.getenv('ROLLUP_RETENTION_HOURS', 48)),  # older buckets are overwritten
+    'max_diseases': int(os.getenv('ROLLUP_MAX_DISEASES', 64)),  # further keys are counted as "other"
+    # Regions clients may report; any other region is counted as "unknown"
+    'regions': [region.strip() for region in os.getenv('ROLLUP_REGIONS', '').split(',') if region.strip()],
+    'confidence_bins': int(os.getenv('ROLLUP_CONFIDENCE_BINS', 10)),
+    'prune_interval': float(os.getenv('ROLLUP_PRUNE_INTERVAL', 3600))  # seconds between exited-worker cleanups
+}
+
+# Outbreak detection: EWMA baseline + CUSUM on top-prediction counts per disease and region (from ROLLUPS)
+OUTBREAKS = {
+    'enabled': os.getenv('OUTBREAKS_ENABLED', 'True').lower() == 'true',
+    'directory': os.path.join(RUNTIME_DIR, 'outbreaks'),
+    'bucket_seconds': int(os.getenv('OUTBREAK_BUCKET_SECONDS', 3600)),
+    'alpha': float(os.getenv('OUTBREAK_EWMA_ALPHA', 0.02)),  # baseline smoothing per bucket (~4 days of hours)
+    'k': float(os.getenv('OUTBREAK_CUSUM_K', 0.5)),  # allowed drift, in standard deviations
+    'h': float(os.getenv('OUTBREAK_CUSUM_H', 8.0)),  # alert threshold
+    'warmup_buckets': int(os.getenv('OUTBREAK_WARMUP_BUCKETS', 24)),
+    'min_count': int(os.getenv('OUTBREAK_MIN_COUNT', 5)),  # no alerts for buckets with fewer predictions
+    'max_series': int(os.getenv('OUTBREAK_MAX_SERIES', 2048)),
+    'max_alerts': int(os.getenv('OUTBREAK_MAX_ALERTS', 100)),  # recent alerts kept per worker
+    'settle_seconds': float(os.getenv('OUTBREAK_SETTLE_SECONDS', 60)),  # wait after a bucket ends before scoring it
+    'flush_interval': float(os.getenv('OUTBREAK_FLUSH_INTERVAL', 0.5)),
+    'snapshot_max_age': float(os.getenv('OUTBREAK_SNAPSHOT_MAX_AGE', 7 * 86400))  # exited workers' alerts
+}
+
+# Input drift: live token counts (count-min sketch) and unseen tokens (space-saving) vs training data
+DRIFT = {
+    'enabled': os.getenv('DRIFT_ENABLED', 'True').lower() == 'true',
+    'directory': os.path.join(RUNTIME_DIR, 'drift'),
+    'distribution_path': os.getenv('DRIFT_DISTRIBUTION_PATH', 'model/term_distribution.json'),  # train_model.py
+    'sketch_width': int(os.getenv('DRIFT_SKETCH_WIDTH', 16384)),
+    'sketch_depth': int(os.getenv('DRIFT_SKETCH_DEPTH', 4)),
+    'unknown_capacity': int(os.getenv('DRIFT_UNKNOWN_CAPACITY', 200)),  # unseen tokens tracked per worker
+    'queue_size': int(os.getenv('DRIFT_QUEUE_SIZE', 10000)),
+    'batch_size': int(os.getenv('DRIFT_BATCH_SIZE', 512)),
+    'flush_interval': float(os.getenv('DRIFT_FLUSH_INTERVAL', 0.5)),
+    'publish_interval': float(os.getenv('DRIFT_PUBLISH_INTERVAL', 10.0)),
+    'decay_hours': float(os.getenv('DRIFT_DECAY_HOURS', 24.0)),  # all counts are halved this often
+    'snapshot_max_age': float(os.getenv('DRIFT_SNAPSHOT_MAX_AGE', 86400.0))  # exited workers' snapshots
+}
+
+# Request tracing: every API request gets a request id and per-stage spans; a trace is exported
+# (OTLP/JSON, to files or a collector) when head-sampled, slower than slow_ms, or failed with a 5xx
+TRACING = {
+    'enabled': os.getenv('TRACING_ENABLED', 'True').lower() == 'true',
+    'sample_rate': float(os.getenv('TRACING_SAMPLE_RATE', 0.01)),
+    'slow_ms': float(os.getenv('TRACING_SLOW_MS', 1000)),
+    'exporter': os.getenv('TRACING_EXPORTER', 'file'),  # file, otlp or none
+    'directory': os.getenv('TRACING_DIR', os.path.join(LOG_DIR, 'traces')),
+    'endpoint': os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'),
+    'service_name': os.getenv('TRACING_SERVICE_NAME', 'bluecare-api'),
+    'max_spans': int(os.getenv('TRACING_MAX_SPANS', 256)),  # per request
+    'max_file_bytes': int(os.getenv('TRACING_MAX_FILE_BYTES', 50 * 1024 * 1024)),
+    'queue_size': int(os.getenv('TRACING_QUEUE_SIZE', 1000)),
+    'batch_size': int(os.getenv('TRACING_BATCH_SIZE', 64)),
+    'flush_interval': float(os.getenv('TRACING_FLUSH_INTERVAL', 1.0))
+}
+
+# Slowest requests per endpoint over a rolling window, with their trace's stage timings (needs TRACING).
+# redact: drop (no patient text), hash (SHA-256 prefix, to spot repeated inputs) or full (truncated text)
+SLOW_REQUESTS = {
+    'enabled': os.getenv('SLOW_REQUESTS_ENABLED', 'True').lower() == 'true',
+    'directory': os.path.join(RUNTIME_DIR, 'slow_requests'),
+    'thresholds_ms': {
+        'default': float(os.getenv('SLOW_REQUEST_MS_DEFAULT', 1000)),
+        'predict': float(os.getenv('SLOW_REQUEST_MS_PREDICT', 500)),
+        'chat': float(os.getenv('SLOW_REQUEST_MS_CHAT', 500)),
+        'similar': float(os.getenv('SLOW_REQUEST_MS_SIMILAR', 500))
+    },
+    'capacity': int(os.getenv('SLOW_REQUESTS_CAPACITY', 20)),  # per endpoint and worker
+    'window_seconds': float(os.getenv('SLOW_REQUESTS_WINDOW', 3600)),
+    'redact': os.getenv('SLOW_REQUESTS_REDACT', 'hash'),
+    'max_text_chars': int(os.getenv('SLOW_REQUESTS_MAX_TEXT_CHARS', 200)),
+    'exempt_endpoints': ['predict_stream', 'slow_request_dump', 'profile_start', 'profile_workers', 'profile_result']
+}
+
+# Admin profiling of live workers (/api/admin/profile): a stack sampler for N seconds, or cProfile
+# of the next K requests. Workers poll directory for jobs addressed to their pid.
+PROFILER = {
+    'enabled': os.getenv('PROFILER_ENABLED', 'True').lower() == 'true',
+    'directory': os.path.join(RUNTIME_DIR, 'profiler'),
+    'poll_interval': float(os.getenv('PROFILER_POLL_INTERVAL', 1.0)),
+    'interval_ms': float(os.getenv('PROFILER_INTERVAL_MS', 10)),  # sampling period
+    'max_seconds': float(os.getenv('PROFILER_MAX_SECONDS', 120)),
+    'max_requests': int(os.getenv('PROFILER_MAX_REQUESTS', 1000)),
+    'endpoints': ['predict', 'chat'],  # endpoints request profiles may select
+    'top': int(os.getenv('PROFILER_TOP', 50)),  # pstats lines per report
+    'worker_max_age': float(os.getenv('PROFILER_WORKER_MAX_AGE', 10)),  # heartbeat age of a live worker
+    'result_max_age': float(os.getenv('PROFILER_RESULT_MAX_AGE', 3600))
+}
+
+# Keys accepted in X-API-Key by the /api/admin endpoints (comma separated; none configured disables them)
+ADMIN_API_KEYS = [key for key in os.getenv('ADMIN_API_KEYS', '').split(',') if key]
+# Keys accepted in X-API-Key by /api/feedback, next to ADMIN_API_KEYS (comma separated)
+CLINICIAN_API_KEYS = [key for key in os.getenv('CLINICIAN_API_KEYS', '').split(',') if key]
+
+# Named models served next to the default one (e.g. pediatric, regional), loaded on first use.
+# MODELS is JSON: {"pediatric": "model/pediatric.pkl", "endemic": {"path": ..., "table": ..., "cascade": ...}}
+MODEL_REGISTRY = {
+    'models': json.loads(os.getenv('MODELS', '{}')),
+    'memory_budget_mb': float(os.getenv('MODEL_MEMORY_BUDGET_MB', 1024))  # per worker, named models only
+}
+
+# Shadow evaluation: a candidate model scores sampled live inputs on a background thread
+SHADOW = {
+    'model_path': os.getenv('SHADOW_MODEL_PATH', ''),  # empty disables shadowing
+    'table_path': os.getenv('SHADOW_TABLE_PATH', ''),
+    'cascade_path': os.getenv('SHADOW_CASCADE_PATH', ''),
+    'sample_rate': float(os.getenv('SHADOW_SAMPLE_RATE', 0.1)),  # the candidate costs CPU time on the node
+    'queue_size': int(os.getenv('SHADOW_QUEUE_SIZE', 1024)),  # samples beyond this are dropped
+    'batch_size': int(os.getenv('SHADOW_BATCH_SIZE', 64)),
+    'flush_interval': float(os.getenv('SHADOW_FLUSH_INTERVAL', 0.05))  # seconds to fill a batch
+}
 
 # Cache settings
 CACHE_TYPE = 'simple'
@@ -0,0 +1,36 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import CASE_INDEX
+from app.core.retrieval import build_case_index
+from app.core.vocabulary import load_pipeline
+
+BASE_DIR = Path(__file__).parent.parent
+MODEL_PATH = BASE_DIR / "model" / "disease_classifier.pkl"
+DATA_PATH = BASE_DIR / "data" / "symptom_disease_dataset.csv"
+INDEX_PATH = BASE_DIR / CASE_INDEX["path"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Index labeled cases for similar-case retrieval (train_model.py does this too)")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--data", default=str(DATA_PATH), help="CSV with symptoms,disease columns")
+    parser.add_argument("--output", default=str(INDEX_PATH))
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.model)
+    cases = pd.read_csv(args.data)
+    start = time.perf_counter()
+    meta = build_case_index(pipeline.named_steps["tfidf"], cases["symptoms"], cases["disease"],
+                            pipeline.classes_, args.output, args.model)
+    print(f"Indexed {meta['cases']} cases ({meta['postings']} postings) in {time.perf_counter() - start:.2f}s")
+    print(f"Case index saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
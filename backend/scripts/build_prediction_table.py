@@ -0,0 +1,46 @@
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import PREDICTION_TABLE
+from app.core.prediction_table import build_prediction_table, model_fingerprint, save_prediction_table
+from app.core.vocabulary import load_pipeline
+
+BASE_DIR = Path(__file__).parent.parent
+MODEL_PATH = BASE_DIR / "model" / "disease_classifier.pkl"
+TABLE_PATH = BASE_DIR / PREDICTION_TABLE["path"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute predictions for small symptom sets (run after train_model.py)")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--output", default=str(TABLE_PATH))
+    parser.add_argument("--max-terms", type=int, default=PREDICTION_TABLE["max_terms"])
+    parser.add_argument("--batch-size", type=int, default=PREDICTION_TABLE["batch_size"])
+    parser.add_argument("--terms", default=",".join(PREDICTION_TABLE["terms"]),
+                        help="comma-separated symptom terms to combine (default: the canonical medical terms)")
+    parser.add_argument("--max-rows", type=int, default=PREDICTION_TABLE["max_rows"])
+    args = parser.parse_args()
+    terms = [term.strip() for term in args.terms.split(",") if term.strip()] or None
+
+    pipeline = load_pipeline(args.model)
+    start = time.perf_counter()
+    table = build_prediction_table(pipeline, args.max_terms, args.batch_size, terms, args.max_rows)
+    elapsed = time.perf_counter() - start
+
+    save_prediction_table(args.output, table, {
+        "model_sha256": model_fingerprint(args.model),
+        "classes": [str(c) for c in pipeline.classes_],
+        "max_terms": args.max_terms,
+        "vocabulary_size": len(pipeline.named_steps["tfidf"].vocabulary_),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    })
+    print(f"Scored {len(table)} symptom sets in {elapsed:.2f}s")
+    print(f"Prediction table saved to {args.output} ({table.nbytes / 1024:.1f} KiB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import DRIFT
+from app.core.drift import build_term_distribution
+from app.core.vocabulary import load_pipeline
+
+BASE_DIR = Path(__file__).parent.parent
+MODEL_PATH = BASE_DIR / "model" / "disease_classifier.pkl"
+DATA_PATH = BASE_DIR / "data" / "symptom_disease_dataset.csv"
+OUTPUT_PATH = BASE_DIR / DRIFT["distribution_path"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Save training token counts for drift monitoring (train_model.py does this too)")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--data", default=str(DATA_PATH), help="CSV with a symptoms column")
+    parser.add_argument("--output", default=str(OUTPUT_PATH))
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.model)
+    distribution = build_term_distribution(pipeline.named_steps["tfidf"], pd.read_csv(args.data)["symptoms"],
+                                           args.output, args.model)
+    print(f"{len(distribution['tokens'])} tokens from {distribution['documents']} rows saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import EVENT_LOG
+from app.core.eventlog import labeled_predictions
+
+BASE_DIR = Path(__file__).parent.parent
+OUTPUT_PATH = BASE_DIR / "data" / "feedback_dataset.csv"
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Turn predictions with clinician feedback into a symptoms,disease CSV "
+                    "(train with scripts/train_model.py --extra-data)")
+    parser.add_argument("--log-dir", default=EVENT_LOG["directory"])
+    parser.add_argument("--output", default=str(OUTPUT_PATH))
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="Only predictions made at or after this ISO date/time")
+    args = parser.parse_args()
+
+    since = args.since.timestamp() if args.since else None
+    rows = [
+        {"symptoms": ", ".join(record["medical_terms"]), "disease": record["diagnosis"]}
+        for record in labeled_predictions(args.log_dir, since)
+        if record.get("medical_terms")
+    ]
+    pd.DataFrame(rows, columns=["symptoms", "disease"]).to_csv(args.output, index=False, quoting=csv.QUOTE_ALL)
+    print(f"Exported {len(rows)} labeled cases to {args.output}")
+
+if __name__ == "__main__":
+    main()
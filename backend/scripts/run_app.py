@@ -18,14 +18,19 @@ from config.settings import (
 # Add the parent directory to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-# Configure logging
+from app.core.tracing import RequestIdFilter
+
+# Configure logging; every line carries the id of the request it was written for
+handlers = [
+    logging.FileHandler(LOG_FILE),
+    logging.StreamHandler()
+]
+for handler in handlers:
+    handler.addFilter(RequestIdFilter())
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL),
     format=LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
+    handlers=handlers
 )
 logger = logging.getLogger(__name__)
 
@@ -44,7 +49,8 @@ def create_app():
         resources={r"/*": {
             "origins": CORS_ORIGINS,
             "methods": CORS_METHODS,
-            "allow_headers": CORS_HEADERS
+            "allow_headers": CORS_HEADERS,
+            "expose_headers": ["X-Request-ID"]
         }}
     )
     
@@ -0,0 +1,716 @@
+import sys
+import time
+import logging
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Benchmarks registered by name, run in registration order
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark function returning a dict of results"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def measure(func, repeat=3):
+    """Best wall-clock time of several runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+CHAT_MESSAGES = [
+    "halo",
+    "saya demam sudah tiga hari",
+    "batuk berdahak dan pilek",
+    "kapan harus ke dokter",
+    "perut mulas dan mencret",
+    "terima kasih",
+    "sering haus dan sering kencing",
+    "apa gejala dbd",
+]
+
+@benchmark("chat_batch")
+def benchmark_chat_batch(count=5000):
+    """Messages/sec for per-message get_response versus the batch API"""
+    from app.core.chatbot import HealthAssistant, get_chatbot_responses, initialize_chatbot
+
+    initialize_chatbot()
+    assistant = HealthAssistant()
+    items = [
+        {"id": str(i), "text": CHAT_MESSAGES[i % len(CHAT_MESSAGES)], "context": {}}
+        for i in range(count)
+    ]
+
+    single = measure(lambda: [assistant.get_response(item["text"], item["context"]) for item in items])
+    batch = measure(lambda: get_chatbot_responses(items))
+    return {
+        "messages": count,
+        "single_messages_per_sec": count / single,
+        "batch_messages_per_sec": count / batch,
+    }
+
+@benchmark("incremental_prediction")
+def benchmark_incremental_prediction(conversations=2000):
+    """Per-turn re-prediction cost: full pipeline run versus incremental state"""
+    from app.core.predictor import initialize_predictor
+
+    predictor = initialize_predictor()
+    turns = [["demam"], ["demam", "sakit kepala"], ["demam", "sakit kepala", "nyeri otot"],
+             ["demam", "sakit kepala", "nyeri otot", "ruam"]]
+
+    def full():
+        for _ in range(conversations):
+            for terms in turns:
+                predictor.model.predict_proba([", ".join(terms)])
+
+    def incremental():
+        for _ in range(conversations):
+            state = predictor.new_incremental_state()
+            for terms in turns:
+                state.update(terms)
+                state.probabilities()
+
+    count = conversations * len(turns)
+    return {
+        "turns": count,
+        "full_turns_per_sec": count / measure(full),
+        "incremental_turns_per_sec": count / measure(incremental),
+    }
+
+@benchmark("prediction_table")
+def benchmark_prediction_table(count=5000):
+    """Predictions/sec for common small symptom sets: table lookup versus the model"""
+    from app.core.predictor import initialize_predictor
+
+    predictor = initialize_predictor()
+    if predictor.table is None:
+        return {"error": "no prediction table, run scripts/build_prediction_table.py first"}
+    sets = [["demam"], ["demam", "batuk"], ["sakit", "kepala", "mual"], ["batuk", "pilek", "demam", "lemas"]]
+    cases = [sets[i % len(sets)] for i in range(count)]
+
+    model = measure(lambda: [predictor.model.predict_proba([", ".join(terms)]) for terms in cases])
+    table = measure(lambda: [predictor.table.lookup(terms) for terms in cases])
+    return {
+        "predictions": count,
+        "model_predictions_per_sec": count / model,
+        "table_predictions_per_sec": count / table,
+        "hit_rate": predictor.table.stats()["hit_rate"],
+    }
+
+@benchmark("cascade")
+def benchmark_cascade(repeat_rows=200):
+    """Full model versus the confidence-gated cascade on the dataset's symptom lists"""
+    import numpy as np
+    import pandas as pd
+    from app.core.cascade import Cascade
+    from app.core.predictor import initialize_predictor
+
+    predictor = initialize_predictor()
+    if predictor.cascade is None:
+        return {"error": "no cascade first stage, run scripts/train_model.py first"}
+    data = pd.read_csv(Path(__file__).resolve().parent.parent / "data" / "symptom_disease_dataset.csv")
+    rows = [[term.strip() for term in text.split(",")] for text in data["symptoms"]]
+    cases = rows * repeat_rows
+    cascade = Cascade(predictor.cascade.stage)
+
+    full = measure(lambda: [predictor._model_probabilities(terms) for terms in cases])
+    gated = measure(lambda: [cascade.probabilities(terms, predictor._model_probabilities) for terms in cases])
+    answers = [(cascade.probabilities(terms, predictor._model_probabilities), predictor._model_probabilities(terms))
+               for terms in rows]
+    agreement = sum(gated_row.argmax() == full_row.argmax() for (gated_row, _), full_row in answers) / len(rows)
+    # Reported confidence of first-stage answers versus what the full model would have reported
+    gaps = [abs(gated_row.max() - full_row.max()) for (gated_row, stage), full_row in answers if stage == "first_stage"]
+    stats = cascade.stats()
+    return {
+        "predictions": len(cases),
+        "full_model_predictions_per_sec": len(cases) / full,
+        "cascade_predictions_per_sec": len(cases) / gated,
+        "first_stage_hit_rate": stats["first_stage_hit_rate"],
+        "agreement_with_full_model": agreement,
+        "first_stage_confidence_gap": float(np.mean(gaps)) if gaps else None,
+        "threshold": stats["threshold"],
+        "temperature": stats["temperature"],
+    }
+
+@benchmark("hierarchy")
+def benchmark_hierarchy(n_groups=32, per_group=32, rows=5, requests=500):
+    """Per-request cost of flat versus hierarchical models on a synthetic 1k-class label set"""
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from app.core.hierarchy import HierarchicalClassifier, linear_probabilities
+    from app.core.topk import top_k_indices
+
+    rng = np.random.default_rng(0)
+    texts, labels = [], []
+    for g in range(n_groups):
+        for d in range(per_group):
+            shared = [f"grup{g}gejala{i}" for i in range(6)]
+            own = [f"khas{g}x{d}y{i}" for i in range(3)]
+            for _ in range(rows):
+                texts.append(", ".join(list(rng.choice(shared, 2, replace=False)) + list(rng.choice(own, 2, replace=False))))
+                labels.append(f"D{g}-{d}")
+
+    flat = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=200))]).fit(texts, labels)
+    hierarchical = Pipeline([("tfidf", TfidfVectorizer()),
+                             ("clf", HierarchicalClassifier(n_groups=n_groups, max_iter=200, random_state=0))]).fit(texts, labels)
+    # Both models share the TF-IDF step, so only the classifier cost is compared
+    rows_flat = flat[:-1].transform([texts[i] for i in rng.choice(len(texts), requests)])
+    rows_hierarchical = hierarchical[:-1].transform([texts[i] for i in rng.choice(len(texts), requests)])
+    flat_clf = flat.named_steps["clf"]
+    hierarchical_clf = hierarchical.named_steps["clf"]
+
+    def run_flat():
+        for i in range(requests):
+            top_k_indices(linear_probabilities(flat_clf, rows_flat[i])[0], 3)
+
+    def run_hierarchical():
+        for i in range(requests):
+            hierarchical_clf.top_k(rows_hierarchical[i], 3)
+
+    return {
+        "classes": len(flat.classes_),
+        "flat_class_weights_per_request": len(flat.classes_),
+        "hierarchical_class_weights_per_request": n_groups + hierarchical_clf.beam * per_group,
+        "flat_requests_per_sec": requests / measure(run_flat),
+        "hierarchical_requests_per_sec": requests / measure(run_hierarchical),
+        "flat_accuracy": float((flat.predict(texts) == np.array(labels)).mean()),
+        "hierarchical_accuracy": float((hierarchical.predict(texts) == np.array(labels)).mean()),
+    }
+
+@benchmark("compact_model")
+def benchmark_compact_model(requests=2000):
+    """Per-request scoring and weight memory: pickled pipeline versus compact exports"""
+    import os
+    import tempfile
+    from app.core.compact import WEIGHT_DTYPES, CompactModel, dense_model_bytes, export_compact_model
+    from app.core.vocabulary import load_pipeline
+
+    pipeline = load_pipeline(Path(__file__).resolve().parent.parent / "model" / "disease_classifier.pkl")
+    texts = [", ".join(terms) for terms in [["demam", "batuk"], ["sakit kepala", "mual", "lemas"], ["sering haus"]]]
+    cases = [texts[i % len(texts)] for i in range(requests)]
+
+    results = {
+        "pipeline_requests_per_sec": requests / measure(lambda: [pipeline.predict_proba([t]) for t in cases]),
+        "pipeline_bytes": dense_model_bytes(pipeline),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in WEIGHT_DTYPES:
+            path = os.path.join(tmp, f"model.{dtype}.npz")
+            export_compact_model(pipeline, path, dtype)
+            compact = CompactModel.load(path)
+            results[f"{dtype}_requests_per_sec"] = requests / measure(lambda: [compact.predict_proba([t]) for t in cases])
+            results[f"{dtype}_bytes"] = compact.memory_bytes()
+    return results
+
+@benchmark("vocabulary_index")
+def benchmark_vocabulary_index(terms=300000, lookups=200000):
+    """Load time, RSS and lookup cost of a pickled vocabulary dict versus the mmap index"""
+    import os
+    import subprocess
+    import tempfile
+    import joblib
+    from app.core.vocabulary import CompactVocabulary, save_vocabulary_index
+
+    vocabulary = {f"gejala{i}x{i % 97}": i for i in range(terms)}
+    probe = [f"gejala{i * 7 % (2 * terms)}x{i * 7 % 97}" for i in range(lookups)]
+    # Each variant loads in a fresh interpreter so RSS reflects only what it maps or builds
+    child = (
+        "import sys, time, joblib\n"
+        "sys.path.insert(0, sys.argv[3])\n"
+        "from app.core.vocabulary import CompactVocabulary\n"
+        "rss = lambda: int(open('/proc/self/statm').read().split()[1]) * 4096\n"
+        "before = rss(); start = time.perf_counter()\n"
+        "v = joblib.load(sys.argv[2]) if sys.argv[1] == 'dict' else CompactVocabulary.open(sys.argv[2])\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, rss() - before)\n"
+    )
+    results = {"terms": terms}
+    root = str(Path(__file__).resolve().parent.parent)
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, "vocabulary.pkl")
+        index_path = os.path.join(tmp, "vocabulary.idx")
+        joblib.dump(vocabulary, pickle_path)
+        save_vocabulary_index(vocabulary, index_path)
+        index = CompactVocabulary.open(index_path)
+        for name, path in [("dict", pickle_path), ("index", index_path)]:
+            output = subprocess.run([sys.executable, "-c", child, name, path, root],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            results[f"{name}_load_ms"] = float(output[0]) * 1000
+            results[f"{name}_rss_bytes"] = int(output[1])
+            results[f"{name}_file_bytes"] = os.path.getsize(path)
+        results["dict_lookups_per_sec"] = lookups / measure(lambda: [vocabulary.get(t) for t in probe])
+        results["index_lookups_per_sec"] = lookups / measure(lambda: [index.get(t) for t in probe])
+    return results
+
+@benchmark("shadow")
+def benchmark_shadow(requests=3000):
+    """Primary request latency with and without a shadow candidate scoring SHADOW_SAMPLE_RATE of the requests"""
+    import numpy as np
+    from functools import partial
+    from unittest.mock import patch
+    from app.core import predictor as predictor_module
+    from app.core.shadow import ShadowEvaluator
+    from config.settings import SHADOW
+
+    predictor_module.initialize_predictor()
+    cases = [{"medical_terms": terms} for terms in [["demam", "batuk", "pilek", "lemas", "mual"],
+                                                      ["sakit kepala", "mual", "muntah", "diare", "pusing"]]]
+
+    def latencies():
+        samples = []
+        for i in range(requests):
+            start = time.perf_counter()
+            predictor_module.predict_disease(cases[i % len(cases)])
+            samples.append((time.perf_counter() - start) * 1000)
+        return np.array(samples)
+
+    baseline = latencies()
+    shadow = ShadowEvaluator(partial(predictor_module.DiseasePredictor, "model/disease_classifier.pkl"),
+                             max_queue=256, batch_size=64, flush_interval=0.01, sample_rate=SHADOW["sample_rate"])
+    # The candidate process starts and loads its model once; time the steady state
+    while shadow.stats()["compared"] == 0:
+        shadow.submit(cases[0]["medical_terms"], [])
+        shadow.drain(60)
+    with patch.object(predictor_module, "_shadow", shadow):
+        shadowed = latencies()
+        shadow.drain(30)
+    stats = shadow.stats()
+    return {
+        "baseline_p50_ms": float(np.percentile(baseline, 50)),
+        "baseline_p99_ms": float(np.percentile(baseline, 99)),
+        "shadowed_p50_ms": float(np.percentile(shadowed, 50)),
+        "shadowed_p99_ms": float(np.percentile(shadowed, 99)),
+        "compared": stats["compared"],
+        "dropped": stats["queue"]["dropped"],
+        "top1_agreement": stats["top1_agreement"],
+        "candidate_p50_ms": stats["candidate_latency"]["p50_ms"],
+    }
+
+@benchmark("attribution")
+def benchmark_attribution(requests=2000, batch_size=256):
+    """Extra cost of filling "symptoms": single requests and one batch"""
+    from app.core.predictor import initialize_predictor
+
+    predictor = initialize_predictor()
+    cases = [["demam", "batuk", "pilek", "lemas", "mual"], ["sakit kepala", "mual", "muntah", "diare"]]
+    single = [cases[i % len(cases)] for i in range(requests)]
+    batch = [cases[i % len(cases)] for i in range(batch_size)]
+
+    plain = measure(lambda: [predictor.predict(terms) for terms in single])
+    explained = measure(lambda: [predictor.predict(terms, explain=True) for terms in single])
+    plain_batch = measure(lambda: predictor.predict_batch(batch))
+    explained_batch = measure(lambda: predictor.predict_batch(batch, explain=True))
+    return {
+        "predict_us": plain / requests * 1e6,
+        "predict_explain_us": explained / requests * 1e6,
+        "batch_item_us": plain_batch / batch_size * 1e6,
+        "batch_item_explain_us": explained_batch / batch_size * 1e6,
+    }
+
+@benchmark("similar_cases")
+def benchmark_similar_cases(cases=300000, vocabulary=5000, queries=200):
+    """Top-5 similar-case latency: pruned inverted index versus brute-force sparse cosine"""
+    import os
+    import tempfile
+    import joblib
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from app.core.retrieval import CaseIndex, build_case_index
+
+    rng = np.random.default_rng(0)
+    tokens = np.array([f"gejala{i}" for i in range(vocabulary)])
+    p = 1.0 / np.arange(1, vocabulary + 1)
+    p /= p.sum()
+    sizes = rng.integers(2, 8, size=cases)
+    drawn = tokens[rng.choice(vocabulary, size=int(sizes.sum()), p=p)]
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    texts = [", ".join(drawn[bounds[i]:bounds[i + 1]]) for i in range(cases)]
+    labels = [f"D{i % 100}" for i in range(cases)]
+    vectorizer = TfidfVectorizer().fit(texts)
+    classifier = LogisticRegression()
+    classifier.classes_ = np.array(sorted(set(labels)))
+    pipeline = Pipeline([("tfidf", vectorizer), ("clf", classifier)])
+    probes = [[str(t) for t in tokens[rng.choice(vocabulary, size=int(rng.integers(2, 6)), p=p)]]
+              for _ in range(queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.pkl")
+        joblib.dump(pipeline, model_path)
+        start = time.perf_counter()
+        build_case_index(vectorizer, texts, labels, classifier.classes_, os.path.join(tmp, "cases"), model_path)
+        build_seconds = time.perf_counter() - start
+        index = CaseIndex.load(os.path.join(tmp, "cases"), pipeline, model_path)
+        matrix = vectorizer.transform(texts)
+
+        def brute(terms):
+            scores = (matrix @ vectorizer.transform([", ".join(terms)]).T).toarray().ravel()
+            return np.argsort(-scores, kind="stable")[:5]
+
+        def timed(func):
+            samples = []
+            for terms in probes:
+                begin = time.perf_counter()
+                func(terms)
+                samples.append((time.perf_counter() - begin) * 1000)
+            return np.array(samples)
+
+        indexed = timed(lambda terms: index.search(terms, 5))
+        exhaustive = timed(brute)
+        stats = index.stats()
+    return {
+        "cases": cases,
+        "build_seconds": build_seconds,
+        "index_p50_ms": float(np.percentile(indexed, 50)),
+        "index_p99_ms": float(np.percentile(indexed, 99)),
+        "brute_p50_ms": float(np.percentile(exhaustive, 50)),
+        "brute_p99_ms": float(np.percentile(exhaustive, 99)),
+        "scored_ratio": stats["scored_ratio"],
+    }
+
+@benchmark("event_log")
+def benchmark_event_log(records=20000):
+    """Request-path cost of logging a prediction: queued append vs a synchronous write with fsync"""
+    import json
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+    from app.core.eventlog import EventLog, new_prediction_id
+
+    record = {"type": "prediction", "ts": time.time(), "model": None, "text": "saya demam dan batuk sejak kemarin",
+              "medical_terms": ["demam", "batuk"], "predictions": [{"disease": "Flu", "confidence": 0.62}]}
+    directory = tempfile.mkdtemp()
+    try:
+        log = EventLog(os.path.join(directory, "events"), max_queue=records)
+        queued = []
+        for _ in range(records):
+            start = time.perf_counter()
+            log.append(dict(record, prediction_id=new_prediction_id()))
+            queued.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        log.close(60)
+        drain_seconds = time.perf_counter() - start
+
+        synchronous = []
+        with open(os.path.join(directory, "sync.jsonl"), "ab") as f:
+            for _ in range(min(records, 500)):
+                start = time.perf_counter()
+                f.write(json.dumps(dict(record, prediction_id=new_prediction_id())).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+                synchronous.append((time.perf_counter() - start) * 1000)
+        stats = log.stats()
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "queued_p50_ms": float(np.percentile(queued, 50)),
+        "queued_p99_ms": float(np.percentile(queued, 99)),
+        "sync_fsync_p50_ms": float(np.percentile(synchronous, 50)),
+        "sync_fsync_p99_ms": float(np.percentile(synchronous, 99)),
+        "records_written": stats["records_written"],
+        "dropped": stats["queue"]["dropped"],
+        "fsyncs": stats["fsyncs"],
+        "drain_seconds": drain_seconds,
+    }
+
+@benchmark("rollups")
+def benchmark_rollups(records=50000, workers=8):
+    """Per-request cost of counting a prediction, and query latency over full retention for several workers"""
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+    from unittest.mock import patch
+    from app.core.rollups import RollupStore
+
+    diseases = [f"Penyakit {i}" for i in range(40)]
+    regions = [f"Wilayah {i}" for i in range(20)]
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    try:
+        now = time.time()
+        query = RollupStore(directory, regions=regions)
+        for worker in range(workers):
+            store = query if worker == 0 else RollupStore(directory, regions=regions)
+            # Spread the records over the whole retention period
+            offsets = rng.uniform(0, store.retention_seconds - store.bucket_seconds, records // workers)
+            pid = os.getpid() if worker == 0 else 10_000_000 + worker
+            with patch("app.core.rollups.os.getpid", return_value=pid):
+                for i, offset in enumerate(offsets):
+                    store.record(diseases[i % len(diseases)], regions[i % len(regions)], 0.7, now=now - offset)
+        start = time.perf_counter()
+        for i in range(records):
+            query.record(diseases[i % len(diseases)], regions[i % len(regions)], 0.7)
+        record_us = (time.perf_counter() - start) * 1e6 / records
+        day = measure(lambda: query.query(3600, 24, now=now), repeat=5)
+        week_buckets = measure(lambda: query.query(query.bucket_seconds, query.buckets, now=now), repeat=3)
+        result = query.query(3600, 48, now=now)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "record_us": record_us,
+        "query_24h_hourly_ms": day * 1000,
+        "query_all_buckets_ms": week_buckets * 1000,
+        "workers": result["workers"],
+        "counted": sum(w["total"] for w in result["windows"]),
+    }
+
+@benchmark("outbreaks")
+def benchmark_outbreaks(days=30, per_hour=600, ticks=100000):
+    """Replay a month of predictions through the outbreak detector, with one injected outbreak, then time the
+    monitor's clock check per request and its scoring pass over two days of rollups"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from app.core.outbreaks import OutbreakDetector, OutbreakMonitor
+    from app.core.rollups import RollupStore
+
+    rng = np.random.default_rng(0)
+    diseases = [f"Penyakit {i}" for i in range(40)]
+    regions = [f"Wilayah {i}" for i in range(20)]
+    hours = days * 24
+    events = []
+    for hour in range(hours):
+        count = rng.poisson(per_hour)
+        times = hour * 3600 + np.sort(rng.uniform(0, 3600, count))
+        events.extend(zip(rng.integers(0, len(diseases), count).tolist(),
+                          rng.integers(0, len(regions), count).tolist(), times.tolist()))
+    # Three hours of extra cases of one disease in one region in the last week
+    outbreak_start = (hours - 100) * 3600
+    extra = outbreak_start + np.sort(rng.uniform(0, 3 * 3600, 60))
+    events.extend((0, 0, t) for t in extra.tolist())
+    events.sort(key=lambda event: event[2])
+    events = [(diseases[d], regions[r], t) for d, r, t in events]
+
+    detector = OutbreakDetector()
+    start = time.perf_counter()
+    for disease, region, timestamp in events:
+        detector.observe(disease, region, timestamp)
+    detector.advance(hours * 3600)
+    elapsed = time.perf_counter() - start
+    detected = [a for a in detector.alerts if (a["disease"], a["region"]) == (diseases[0], regions[0])
+                and outbreak_start <= a["bucket_start"] < outbreak_start + 3 * 3600]
+
+    # The monitor scores the rollups' counts: load the last two days into a store, then time a full pass
+    directory = tempfile.mkdtemp()
+    try:
+        rollups = RollupStore(directory, retention_seconds=48 * 3600, regions=regions)
+        shift = (int(time.time() // 3600) - hours) * 3600
+        for disease, region, timestamp in events:
+            if timestamp >= (hours - 47) * 3600:
+                rollups.record(disease, region, 0.9, now=shift + timestamp)
+        monitor = OutbreakMonitor(OutbreakDetector(), rollups, directory)
+        monitor.tick()
+        start = time.perf_counter()
+        for _ in range(ticks):
+            monitor.tick()
+        tick_us = (time.perf_counter() - start) / ticks * 1e6
+        monitor.drain(60)
+        start = time.perf_counter()
+        monitor.refresh()
+        refresh_ms = (time.perf_counter() - start) * 1000
+        monitor = OutbreakMonitor(OutbreakDetector(), rollups, directory)
+        start = time.perf_counter()
+        monitor.refresh()
+        score_ms = (time.perf_counter() - start) * 1000
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "predictions": len(events),
+        "series": len(detector.series),
+        "replay_per_second": len(events) / elapsed,
+        "outbreak_detected": bool(detected),
+        "false_alerts": detector.stats["alerts"] - len(detected),
+        "tick_us": tick_us,
+        "score_48h_ms": score_ms,
+        "refresh_ms": refresh_ms,
+    }
+
+@benchmark("drift")
+def benchmark_drift(requests=50000):
+    """Request-path cost of drift monitoring and the background thread's throughput"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from app.core.drift import DriftMonitor, load_term_distribution
+
+    distribution = load_term_distribution("model/term_distribution.json")
+    rng = np.random.default_rng(0)
+    known = list(distribution["tokens"]) if distribution else ["demam", "batuk"]
+    unknown = [f"istilah{i}" for i in range(5000)]
+    batches = [[known[i] for i in rng.integers(0, len(known), 4)] + [unknown[int(rng.zipf(1.3)) % len(unknown)]]
+               for _ in range(requests)]
+    directory = tempfile.mkdtemp()
+    try:
+        monitor = DriftMonitor(distribution, directory, max_queue=requests)
+        submit = []
+        start = time.perf_counter()
+        for terms in batches:
+            t = time.perf_counter()
+            monitor.submit(terms)
+            submit.append((time.perf_counter() - t) * 1e6)
+        monitor.drain(60)
+        elapsed = time.perf_counter() - start
+        monitor.refresh()
+        stats = monitor.stats()
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "submit_p50_us": float(np.percentile(submit, 50)),
+        "submit_p99_us": float(np.percentile(submit, 99)),
+        "requests_per_second": requests / elapsed,
+        "dropped": stats["queue"]["dropped"],
+        "sketch_bytes": monitor.sketch.table.nbytes,
+        "tracked_unknown": stats["tracked_unknown"],
+    }
+
+@benchmark("tracing")
+def benchmark_tracing(requests=20000):
+    """Per-request cost of a trace with the /predict pipeline's spans, and of exporting it"""
+    import shutil
+    import tempfile
+    from app.core.tracing import TraceExporter, end_trace, span, start_trace
+
+    stages = ["process_symptoms", "nlp.clean_text", "nlp.tokenize", "nlp.remove_stopwords",
+              "nlp.stem_words", "nlp.extract_medical_terms", "predict_disease", "json.encode"]
+
+    def untraced():
+        for _ in range(requests):
+            for name in stages:
+                with span(name):
+                    pass
+
+    traces = []
+
+    def traced():
+        traces.clear()
+        for _ in range(requests):
+            root = start_trace("POST /predict")
+            for name in stages:
+                with span(name):
+                    pass
+            traces.append(end_trace(root))
+
+    noop = measure(untraced)
+    recorded = measure(traced)
+    directory = tempfile.mkdtemp()
+    try:
+        exporter = TraceExporter("file", directory=directory, max_queue=requests)
+        start = time.perf_counter()
+        for trace in traces:
+            exporter.submit(trace)
+        exporter.drain(60)
+        exported = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+    return {
+        "untraced_us_per_request": noop / requests * 1e6,
+        "traced_us_per_request": recorded / requests * 1e6,
+        "export_traces_per_second": requests / exported,
+    }
+
+@benchmark("slow_requests")
+def benchmark_slow_requests(requests=100000):
+    """Cost of the slow-request check for fast requests, and of capturing slow ones"""
+    import shutil
+    import tempfile
+    from app.core import slowlog
+    from app.core.tracing import end_trace, span, start_trace
+
+    root = start_trace("POST /predict")
+    for name in ("process_symptoms", "predict_disease", "json.encode"):
+        with span(name):
+            pass
+    trace = end_trace(root)
+    directory = tempfile.mkdtemp()
+    try:
+        slowlog._buffer = slowlog.SlowRequestBuffer(directory, {"default": 1e9}, capacity=20)
+        fast = measure(lambda: [slowlog.capture_slow_request(trace, "predict", 200, lambda: "demam")
+                                for _ in range(requests)])
+        # Ever slower requests, so each one enters the buffer and rewrites the snapshot
+        buffer = slowlog.SlowRequestBuffer(directory, {"default": 0.0}, capacity=20)
+        captures = 1000
+        slow = measure(lambda: [buffer.capture("predict", float(i), lambda: {"stages": slowlog.trace_stages(trace)})
+                                for i in range(captures)], repeat=1)
+    finally:
+        slowlog._buffer = None
+        shutil.rmtree(directory)
+    return {
+        "fast_request_ns": fast / requests * 1e9,
+        "capture_us": slow / captures * 1e6,
+    }
+
+@benchmark("profiler")
+def benchmark_profiler(iterations=200000):
+    """Slowdown of a CPU-bound request thread while the stack sampler runs, and the unarmed hook cost"""
+    import threading
+    from app.core.profiler import RequestProfiler, sample_stacks
+
+    def work():
+        for i in range(iterations):
+            str(i).encode("utf-8")
+
+    baseline = measure(work)
+    stop = threading.Event()
+
+    def sampler():
+        while not stop.is_set():
+            sample_stacks(0.5, 0.01)
+
+    thread = threading.Thread(target=sampler, daemon=True)
+    thread.start()
+    try:
+        sampled = measure(work)
+    finally:
+        stop.set()
+        thread.join()
+    requests = RequestProfiler()
+    checks = 1000000
+    unarmed = measure(lambda: [requests.armed for _ in range(checks)])
+    return {
+        "sampler_slowdown_pct": (sampled / baseline - 1) * 100,
+        "unarmed_check_ns": unarmed / checks * 1e9,
+    }
+
+def run_benchmarks(names=None):
+    """Run the selected (default: all) benchmarks and log their results"""
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        logger.error(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        return 1
+
+    for name in names:
+        logger.info(f"Running benchmark {name}...")
+        results = BENCHMARKS[name]()
+        for key, value in results.items():
+            if isinstance(value, float):
+                value = f"{value:,.3f}"
+            logger.info(f"{name}.{key}: {value}")
+    return 0
+
+if __name__ == '__main__':
+    try:
+        sys.exit(run_benchmarks(sys.argv[1:]))
+    except Exception as e:
+        logger.error(f"Error running benchmarks: {str(e)}")
+        sys.exit(1)
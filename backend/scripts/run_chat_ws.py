@@ -0,0 +1,34 @@
+import asyncio
+import sys
+import logging
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import CHAT_WS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def run_chat_ws():
+    """Run the WebSocket chat server"""
+    from app.api.chat_ws import serve
+    from app.core.chatbot import initialize_chatbot
+
+    try:
+        initialize_chatbot()
+        logger.info(f"Starting WebSocket chat on {CHAT_WS['host']}:{CHAT_WS['port']}")
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        logger.info("Received keyboard interrupt, shutting down...")
+    except Exception as e:
+        logger.error(f"Error running WebSocket chat: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_chat_ws()
@@ -7,6 +7,8 @@ from pathlib import Path
 # Add the parent directory to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from config.settings import ADMISSION_CONTROL
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,6 +24,15 @@ def run_gunicorn():
         port = int(os.getenv('PORT', 5000))
         workers = int(os.getenv('GUNICORN_WORKERS', 4))
         timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+        # The admission controller counts requests in flight inside one worker, so the
+        # worker needs more threads than ADMISSION_MAX_IN_FLIGHT: the spare threads
+        # answer 503 while the budget is full instead of leaving requests in the backlog
+        max_in_flight = ADMISSION_CONTROL['max_in_flight']
+        threads = int(os.getenv('GUNICORN_THREADS', max_in_flight + 2))
+        if ADMISSION_CONTROL['enabled'] and threads <= max_in_flight:
+            logger.warning(f"GUNICORN_THREADS={threads} does not exceed ADMISSION_MAX_IN_FLIGHT={max_in_flight}; "
+                           "the admission budgets will never shed load")
+        worker_class = 'gthread'
         
         # Build gunicorn command
         cmd = [
@@ -32,12 +43,13 @@ def run_gunicorn():
             '--access-logfile=-',
             '--error-logfile=-',
             '--log-level=info',
-            '--worker-class=sync',
+            f'--worker-class={worker_class}',
+            f'--threads={threads}',
             '--preload',
             'scripts.run_app:create_app()'
         ]
         
-        logger.info(f"Starting gunicorn with {workers} workers on {host}:{port}")
+        logger.info(f"Starting gunicorn with {workers} workers x {threads} threads on {host}:{port}")
         logger.info(f"Command: {' '.join(cmd)}")
         
         # Run gunicorn
@@ -5,29 +5,111 @@ from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import joblib
+import numpy as np
 from pathlib import Path
+import argparse
+import json
 import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import CASCADE, CASE_INDEX, DRIFT
+from app.core.cascade import FirstStage
+from app.core.drift import build_term_distribution
+from app.core.compact import WEIGHT_DTYPES, CompactModel, accuracy_delta_report, export_compact_model
+from app.core.hierarchy import HierarchicalClassifier
+from app.core.retrieval import build_case_index
+from app.core.vocabulary import detached_vocabulary
 
 DATA_PATH = Path(__file__).parent.parent / "data" / "symptom_disease_dataset.csv"
 MODEL_DIR = Path(__file__).parent.parent / "model"
 MODEL_PATH = MODEL_DIR / "disease_classifier.pkl"
 VECTORIZER_PATH = MODEL_DIR / "vectorizer.pkl"
+CASCADE_PATH = Path(__file__).parent.parent / CASCADE["path"]
+CASE_INDEX_PATH = Path(__file__).parent.parent / CASE_INDEX["path"]
+COMPACT_REPORT_PATH = MODEL_DIR / "compact_report.json"
+VOCABULARY_INDEX_PATH = MODEL_DIR / "vocabulary.idx"
+TERM_DISTRIBUTION_PATH = Path(__file__).parent.parent / DRIFT["distribution_path"]
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+def calibration_inputs(vectorizer, texts, samples=5000, max_terms=4, seed=42):
+    """Dataset rows plus random small token sets, shaped like predictor input"""
+    inputs = [[term.strip() for term in text.split(",") if term.strip()] for text in texts]
+    tokens = sorted(vectorizer.vocabulary_)
+    rng = np.random.default_rng(seed)
+    for _ in range(samples):
+        size = int(rng.integers(1, min(max_terms, len(tokens)) + 1))
+        inputs.append([str(token) for token in rng.choice(tokens, size=size, replace=False)])
+    return inputs
+
+def train_cascade(pipeline, X_train, y_train, X_held_out):
+    """Fit the first stage, then calibrate its temperature and margin threshold against the
+    full model on inputs it was not trained on"""
+    stage = FirstStage.train(pipeline.named_steps["tfidf"], X_train, y_train)
+    inputs = calibration_inputs(pipeline.named_steps["tfidf"], X_held_out)
+    reference = pipeline.predict_proba([", ".join(terms) for terms in inputs])
+    report = stage.calibrate(inputs, reference, CASCADE["target_agreement"])
+    print(f"Cascade first stage: threshold={report['threshold']:.3f} temperature={report['temperature']:.2f} "
+          f"coverage={report['coverage']:.1%} agreement={report['agreement']}")
+    return stage
+
+def load_groups(path):
+    """disease -> group mapping (e.g. ICD chapter) from a CSV with disease,group columns"""
+    groups = pd.read_csv(path)
+    return {str(d): str(g) for d, g in zip(groups["disease"], groups["group"])}
+
+def build_classifier(args):
+    """Flat LogisticRegression, or the group -> disease hierarchy for large label sets"""
+    if not args.hierarchical:
+        return LogisticRegression(max_iter=1000, random_state=42)
+    groups = load_groups(args.groups) if args.groups else None
+    return HierarchicalClassifier(groups=groups, n_groups=args.n_groups, beam=args.beam, random_state=42)
+
+def export_compact(pipeline, dtype, prune, X, y):
+    """Export the compact model and report its accuracy delta against the full pipeline"""
+    path = MODEL_DIR / f"disease_classifier.{dtype}.npz"
+    export_compact_model(pipeline, path, dtype, prune)
+    report = accuracy_delta_report(pipeline, CompactModel.load(path), list(X), list(y))
+    COMPACT_REPORT_PATH.write_text(json.dumps(report, indent=2))
+    print(f"Compact model saved to {path}")
+    print("Accuracy delta vs full precision:\n", json.dumps(report, indent=2))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the disease classifier pipeline")
+    parser.add_argument("--hierarchical", action="store_true",
+                        help="Predict a disease group first, then a disease within it")
+    parser.add_argument("--groups", help="CSV with disease,group columns (default: cluster the classes)")
+    parser.add_argument("--n-groups", type=int, help="Number of clustered groups (default: sqrt of class count)")
+    parser.add_argument("--beam", type=int, default=2, help="Groups scored per request")
+    parser.add_argument("--export-compact", choices=WEIGHT_DTYPES,
+                        help="Also export a pruned, quantized model (serve it via PREDICTOR_MODEL_PATH)")
+    parser.add_argument("--prune", type=float, default=1e-3, help="Drop weights with |w| at or below this")
+    parser.add_argument("--vocabulary-index", action="store_true",
+                        help="Pickle the pipeline without its vocabulary dict and write a memory-mapped "
+                             "model/vocabulary.idx, which must be deployed with the model file")
+    parser.add_argument("--no-case-index", action="store_true", help="Skip the similar-case index")
+    parser.add_argument("--extra-data", action="append", default=[],
+                        help="Additional symptoms,disease CSV (e.g. from export_training_data.py); repeatable")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     # Load dataset
-    df = pd.read_csv(DATA_PATH)
+    df = pd.concat([pd.read_csv(path) for path in [DATA_PATH, *args.extra_data]], ignore_index=True)
     X = df["symptoms"]
     y = df["disease"]
 
     # Split for evaluation (optional)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    # Create pipeline: TF-IDF + Logistic Regression
+    # Create pipeline: TF-IDF + Logistic Regression (flat or hierarchical)
     pipeline = Pipeline([
         ("tfidf", TfidfVectorizer()),
-        ("clf", LogisticRegression(max_iter=1000, random_state=42))
+        ("clf", build_classifier(args))
     ])
 
     # Train
@@ -37,13 +119,44 @@ def main():
     y_pred = pipeline.predict(X_test)
     print("Classification Report:\n", classification_report(y_test, y_pred))
 
-    # Save the full pipeline (recommended)
-    joblib.dump(pipeline, MODEL_PATH)
+    # Save the full pipeline (recommended); optionally the vocabulary goes to a memory-mappable index
+    if args.vocabulary_index:
+        with detached_vocabulary(pipeline.named_steps["tfidf"], VOCABULARY_INDEX_PATH):
+            joblib.dump(pipeline, MODEL_PATH)
+        print(f"Vocabulary index saved to {VOCABULARY_INDEX_PATH} (the model does not load without it)")
+    else:
+        joblib.dump(pipeline, MODEL_PATH)
     print(f"Model saved to {MODEL_PATH}")
 
     # Optionally, save vectorizer separately
     joblib.dump(pipeline.named_steps["tfidf"], VECTORIZER_PATH)
     print(f"Vectorizer saved to {VECTORIZER_PATH}")
 
+    if args.export_compact:
+        if args.hierarchical:
+            print("Compact export only supports the flat model; skipping")
+        else:
+            export_compact(pipeline, args.export_compact, args.prune, X, y)
+
+    # Token counts of the training data, the baseline for input drift monitoring
+    build_term_distribution(pipeline.named_steps["tfidf"], X, TERM_DISTRIBUTION_PATH, MODEL_PATH)
+    print(f"Term distribution saved to {TERM_DISTRIBUTION_PATH}")
+
+    if not args.no_case_index:
+        # Every labeled row is a retrievable past case, indexed with this model's vectorizer
+        meta = build_case_index(pipeline.named_steps["tfidf"], X, y, pipeline.classes_, CASE_INDEX_PATH, MODEL_PATH)
+        print(f"Case index saved to {CASE_INDEX_PATH} ({meta['cases']} cases, {meta['postings']} postings)")
+
+    if args.hierarchical:
+        # Hierarchical models already avoid scoring every class; the cascade is not used
+        if CASCADE_PATH.exists():
+            CASCADE_PATH.unlink()
+        return
+
+    # Cheap first stage for the confidence-gated cascade, tied to this model file
+    stage = train_cascade(pipeline, X_train, y_train, X_test)
+    stage.save(CASCADE_PATH, MODEL_PATH)
+    print(f"Cascade first stage saved to {CASCADE_PATH}")
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file